@@ -0,0 +1,235 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Grouped reductions over coded keys. The key columns are factorized to integer
+# codes, the rows are sorted once by group (stably, so every group keeps its row
+# order) and every statistic is a reduction over the contiguous segments of that
+# order: segment sums and maxima with reduceat, first values from the segment starts,
+# percentiles from one sort by (group, value). Float sums and means use the same
+# compensated summation in row order as pandas, and percentiles its linear
+# interpolation, so the results are bit-identical to the groupby they replace.
+#
+# An aggregation is a list of (output column, how, source column):
+#   size       rows in the group (source None)
+#   count      non-null values; with source None, the same as size
+#   sum, mean  NaN skipped; an all-NaN sum is 0
+#   max        NaN skipped
+#   first_row  value of the group's first row
+#   first      first non-null value
+#   median     NaN skipped, the mean of the two middle values for even counts
+#   pNN        NN-th percentile, linear interpolation (p95)
+#   nunique    distinct non-null values
+
+AGGREGATIONS = ("size", "count", "sum", "mean", "max", "first_row", "first", "median", "nunique")
+# Reductions that take their column in row order
+ROW_ORDER = ("first_row", "first", "nunique")
+PERCENTILE = re.compile(r"p(\d{1,2}(?:\.\d+)?)$")
+# Mean group size from which percentiles sort group by group instead of all at once
+SORT_LOOP_ROWS = 8
+
+
+class Grouping:
+    # codes: group of every row, -1 for rows in no group. Group g owns the rows
+    # order[starts[g]:starts[g] + sizes[g]], and has at least one.
+    def __init__(self, codes, n_groups):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        order = _stable_argsort(self.codes + 1)
+        self.order = order[np.count_nonzero(self.codes < 0):]
+        self.sizes = np.bincount(self.codes[self.order], minlength=n_groups)
+        if not self.sizes.all():
+            raise ValueError("every group needs at least one row")
+        self.starts = np.zeros(n_groups, dtype=np.int64)
+        np.cumsum(self.sizes[:-1], out=self.starts[1:])
+
+    @property
+    def n_groups(self):
+        return len(self.sizes)
+
+    @classmethod
+    def from_keys(cls, frame, keys):
+        # (grouping, frame of the key values) with the groups in sorted key order; rows
+        # with a missing key are in no group, like in a groupby
+        combined = np.zeros(len(frame), dtype=np.int64)
+        missing = np.zeros(len(frame), dtype=bool)
+        uniques = []
+        for key in keys:
+            codes, values = pd.factorize(frame[key], sort=True)
+            combined = combined * max(len(values), 1) + codes
+            missing |= codes < 0
+            uniques.append(np.asarray(values))
+        codes, groups = pd.factorize(combined[~missing], sort=True)
+        row_groups = np.full(len(frame), -1, dtype=np.int64)
+        row_groups[~missing] = codes
+        grouping = cls(row_groups, len(groups))
+        key_values = {}
+        for key, values in reversed(list(zip(keys, uniques))):
+            groups, key_codes = np.divmod(groups, max(len(values), 1))
+            key_values[key] = values[key_codes]
+        return grouping, pd.DataFrame({key: key_values[key] for key in keys})
+
+    def segments(self, values):
+        # A column in group order. The numeric reductions below take their values this
+        # way, so a column used by several of them is reordered once; first_row, first
+        # and nunique take the column in row order and reorder only codes and masks.
+        return np.asarray(values)[self.order]
+
+    def segment_groups(self):
+        # The group of every row in group order: 0, 0, ..., 1, 1, ...
+        return np.repeat(np.arange(self.n_groups, dtype=np.int64), self.sizes)
+
+    def _reduceat(self, ufunc, values):
+        if not self.n_groups:
+            return values[:0]
+        return ufunc.reduceat(values, self.starts)
+
+    def size(self):
+        return self.sizes.copy()
+
+    def count(self, values):
+        return self._reduceat(np.add, pd.notna(values).astype(np.int64))
+
+    def sum(self, values):
+        if values.dtype.kind in "iub":
+            return self._reduceat(np.add, values.astype(np.int64))
+        return self._compensated_sum(values.astype(np.float64))
+
+    def _compensated_sum(self, values):
+        # Kahan summation of each segment in row order, NaN skipped: pandas' compiled
+        # grouped sum over the segment codes, one pass over the rows whatever the
+        # shape of the groups
+        if not self.n_groups:
+            return np.zeros(0)
+        return pd.Series(values).groupby(self.segment_groups(), sort=True).sum().to_numpy(dtype=np.float64)
+
+    def mean(self, values):
+        values = values.astype(np.float64)
+        count = self.count(values)
+        return np.divide(self.sum(values), count, out=np.full(self.n_groups, np.nan), where=count > 0)
+
+    def max(self, values):
+        if values.dtype.kind in "iub":
+            return self._reduceat(np.maximum, values)
+        return self._reduceat(np.fmax, values.astype(np.float64))
+
+    def first_row(self, values):
+        return np.asarray(values.take(self.order[self.starts]))
+
+    def first(self, values):
+        present = np.flatnonzero(self.segments(pd.notna(values)))
+        # First present value at or after each segment start, if it is in the segment
+        first = np.minimum(np.searchsorted(present, self.starts), max(len(present) - 1, 0))
+        if len(present):
+            found = (present[first] >= self.starts) & (present[first] < self.starts + self.sizes)
+        else:
+            found = np.zeros(self.n_groups, dtype=bool)
+        firsts = np.asarray(values.take(self.order[present[first[found]]]))
+        if found.all():
+            return firsts
+        result = np.full(self.n_groups, None if firsts.dtype == object else np.nan,
+                         dtype=object if firsts.dtype == object else np.float64)
+        result[found] = firsts
+        return result
+
+    def ordered(self, values):
+        # (each segment sorted, NaN last; non-null count per group) for the
+        # percentiles, which can share it
+        values = values.astype(np.float64)
+        count = self._reduceat(np.add, (~np.isnan(values)).astype(np.int64))
+        if self.n_groups * SORT_LOOP_ROWS <= len(values):
+            # Groups of some size: each segment sorted in place, one call per group
+            ordered = values.copy()
+            for start, end in zip(self.starts.tolist(), (self.starts + self.sizes).tolist()):
+                ordered[start:end].sort()
+            return ordered, count
+        # Mostly tiny groups: the rank of every value in the whole column, so one sort
+        # of (group, rank) keys sorts every segment
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[np.argsort(values)] = np.arange(len(values))
+        return values[np.argsort(self.segment_groups() * len(values) + rank)], count
+
+    def quantile(self, values, q, ordered=None):
+        # Linear interpolation between the order statistics around q * (count - 1)
+        low, high, fraction, count = self._order_statistics(self.ordered(values) if ordered is None else ordered, q)
+        return np.where(count > 0, low + (high - low) * fraction, np.nan)
+
+    def median(self, values, ordered=None):
+        low, high, _, count = self._order_statistics(self.ordered(values) if ordered is None else ordered, 0.5)
+        return np.where(count > 0, np.where(count % 2 == 1, low, (low + high) / 2), np.nan)
+
+    def _order_statistics(self, ordered, q):
+        ordered, count = ordered
+        if not self.n_groups:
+            return ordered, ordered, ordered, count
+        last = np.maximum(count - 1, 0)
+        position = q * last
+        below = position.astype(np.int64)
+        return ordered[self.starts + below], ordered[self.starts + np.minimum(below + 1, last)], position - below, count
+
+    def nunique(self, values):
+        codes, uniques = pd.factorize(values)
+        codes = self.segments(codes)
+        group = self.segment_groups()
+        kept = codes >= 0
+        pairs = pd.unique(group[kept] * max(len(uniques), 1) + codes[kept])
+        return np.bincount(pairs // max(len(uniques), 1), minlength=self.n_groups)
+
+    def reduce(self, how, values=None, ordered=None):
+        # values in group order, or row order for ROW_ORDER; ordered: self.ordered(values),
+        # shared between percentiles
+        if how == "size" or (how == "count" and values is None):
+            return self.size()
+        match = PERCENTILE.match(how)
+        if match:
+            return self.quantile(values, float(match.group(1)) / 100, ordered)
+        if how == "median":
+            return self.median(values, ordered)
+        if how not in AGGREGATIONS:
+            raise ValueError(f"unknown aggregation {how!r}")
+        return getattr(self, how)(values)
+
+    def reduce_columns(self, frame, columns):
+        # {output: values} of (output column, how, source column) definitions over the
+        # rows of frame; each source column is reordered and sorted at most once
+        result = {}
+        segments = {}
+        ordered = {}
+        for output, how, source in columns:
+            if source is None:
+                result[output] = self.reduce(how)
+                continue
+            if how in ROW_ORDER:
+                result[output] = self.reduce(how, frame[source])
+                continue
+            if source not in segments:
+                segments[source] = self.segments(frame[source])
+            if how == "median" or PERCENTILE.match(how):
+                if source not in ordered:
+                    ordered[source] = self.ordered(segments[source])
+                result[output] = self.reduce(how, segments[source], ordered[source])
+            else:
+                result[output] = self.reduce(how, segments[source])
+        return result
+
+
+def _stable_argsort(keys):
+    # Stable argsort of non-negative integers as passes over 16 bits, which NumPy
+    # sorts with a radix sort
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.arange(len(keys))
+    shift = 0
+    while shift == 0 or (len(keys) and keys.max() >> shift):
+        digits = ((keys[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind="stable")]
+        shift += 16
+    return order
+
+
+def aggregate(frame, keys, columns):
+    # One row per distinct combination of the keys, in sorted order: the key columns,
+    # then the (output, how, source) columns
+    grouping, result = Grouping.from_keys(frame, keys)
+    for output, values in grouping.reduce_columns(frame, columns).items():
+        result[output] = values
+    return result
@@ -0,0 +1,137 @@
+import io
+import os
+import gzip
+import tarfile
+import posixpath
+
+# Compressed and archived instance files. Next to plain .json files the walker picks
+# up .json.gz and .json.zst files and the instance files inside .tar, .tar.gz and
+# .tgz bundles. A file inside a bundle gets the path of the bundle joined with its
+# path in the bundle (WfInstances/2024.tar.gz/pegasus/montage/montage-001.json), so
+# basenames and workflow-system detection work as for extracted files; member names
+# are normalized for it (./pegasus/a.json is at bundle/pegasus/a.json) and read back
+# through their TarInfo. Everything is decompressed as it is read, nothing is
+# extracted to disk.
+
+INSTANCE_SUFFIXES = (".json", ".json.gz", ".json.zst")
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+
+# The bundle the last member was read from, kept open: reading its members in archive
+# order then decompresses it once instead of once per member, while a backward jump
+# in a compressed bundle starts decompressing it again from the beginning. Keyed by
+# process too, forked workers would otherwise share the parent's file offset.
+_open_archive = None
+# TarInfo of every bundle member seen by archive_members, by path
+_members = {}
+
+
+def is_instance_file(name):
+    return name.endswith(INSTANCE_SUFFIXES)
+
+
+def is_archive(name):
+    return name.endswith(ARCHIVE_SUFFIXES)
+
+
+def member_path(archive, name):
+    return os.path.join(archive, *posixpath.normpath(name).split("/"))
+
+
+def archive_members(path):
+    # Paths of the instance files inside a bundle, in archive order
+    paths = []
+    with tarfile.open(path, "r:*") as tar:
+        for member in tar:
+            if member.isfile() and is_instance_file(member.name):
+                paths.append(member_path(path, member.name))
+                _members[paths[-1]] = member
+    return paths
+
+
+def split_member(path):
+    # (bundle, name inside it) for a path into a bundle, (path, None) otherwise
+    if os.path.isfile(path):
+        return path, None
+    head = path
+    while True:
+        head, _ = os.path.split(head)
+        if not head or head == os.path.dirname(head):
+            return path, None
+        if is_archive(head) and os.path.isfile(head):
+            return head, os.path.relpath(path, head).replace(os.sep, "/")
+
+
+def _zstd_reader(f):
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd
+        except ImportError as e:
+            raise ImportError("Reading .json.zst instances needs zstandard (pip install zstandard)") from e
+        return zstd.ZstdFile(f)
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True))
+
+
+def _decompressed(f, name):
+    if name.endswith(".gz"):
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if name.endswith(".zst"):
+        return _zstd_reader(f)
+    return f
+
+
+def _archive(path):
+    global _open_archive
+    key = (path, os.getpid())
+    if _open_archive is None or _open_archive[0] != key:
+        if _open_archive is not None and _open_archive[0][1] == key[1]:
+            _open_archive[1].close()
+        _open_archive = (key, tarfile.open(path, "r:*"))
+    return _open_archive[1]
+
+
+def _member(path, archive):
+    # TarInfo of a bundle member; a process that did not list the bundle (a spawned
+    # worker) lists it once
+    info = _members.get(path)
+    if info is None:
+        for member in _archive(archive).getmembers():
+            if member.isfile():
+                _members.setdefault(member_path(archive, member.name), member)
+        info = _members.get(path)
+        if info is None:
+            raise OSError(f"{os.path.relpath(path, archive)} is not in {archive}")
+    return info
+
+
+def open_instance(path):
+    # Binary file object with the decompressed JSON of an instance file
+    archive, member = split_member(path)
+    if member is None:
+        if path.endswith(".gz"):
+            return gzip.open(path, 'rb')
+        return _decompressed(open(path, 'rb'), path)
+    f = _archive(archive).extractfile(_member(path, archive))
+    if f is None:
+        raise OSError(f"{member} in {archive} is not a regular file")
+    return _decompressed(f, member)
+
+
+def open_instance_text(path):
+    if path.endswith(".json") and os.path.isfile(path):
+        return open(path, 'r')
+    return io.TextIOWrapper(open_instance(path))
+
+
+def instance_size(path):
+    # Bytes on disk, or the uncompressed size of a bundle member
+    archive, member = split_member(path)
+    if member is None:
+        return os.path.getsize(path)
+    return _member(path, archive).size
+
+
+def stat_instance(path):
+    # os.stat of the file, or of the bundle holding it: a changed bundle changes all its members
+    return os.stat(split_member(path)[0])
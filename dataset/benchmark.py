@@ -0,0 +1,275 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import corpus
+import decoders
+import extractor
+import prueba
+import prueba2
+import prueba3
+from archives import instance_size, open_instance
+from execution import logical_dataset
+from ingest import BASE_DIR, find_instance_files, load_instance
+from profiling import peak_rss_mb
+from synthetic import STYLES, write_corpus
+
+# Extraction benchmarks on synthetic instances. Every (stage, style, size) runs in a
+# fresh process, so the peak RSS reported is the stage's own, and is timed over all
+# the generated instances of that size:
+#
+#   python dataset/benchmark.py --sizes 1000,10000,100000 --output bench.csv
+#   python dataset/benchmark.py --baseline bench.csv      # exits 1 on a slowdown
+#   python dataset/benchmark.py --largest montage,epigenomics --stages decode_json,decode_orjson
+#
+# --largest times the largest real instance of each named workflow instead, and
+# --aggregate the logical aggregation of prueba2.py and prueba3.py over synthetic
+# task frames, from a few huge groups to many small ones:
+#
+#   python dataset/benchmark.py --aggregate 1000000,10000000 --groups 2,300,100000
+
+
+def read_bytes(path):
+    with open_instance(path) as f:
+        return f.read()
+
+
+STAGES = {
+    "read": read_bytes,
+    "decode": load_instance,
+    "stream_decode": functools.partial(load_instance, streaming=True),
+    "extractor": extractor.process_instance,
+    "prueba": prueba.process_instance,
+    "prueba2": prueba2.extract_task_info,
+    "prueba3": prueba3.extract_task_info,
+    "corpus": corpus.extract_instance_columns,
+    # Whole-file decode with each installed JSON backend
+    **{f"decode_{name}": functools.partial(load_instance, backend=name) for name in decoders.available()},
+}
+OUTPUT_CSV = "benchmark_results.csv"
+# (keys, columns) of the logical aggregations timed by --aggregate
+AGGREGATIONS = {
+    "prueba2": (prueba2.LOGICAL_KEYS, prueba2.LOGICAL_COLUMNS),
+    "prueba3": (prueba3.LOGICAL_KEYS, prueba3.LOGICAL_COLUMNS),
+}
+
+
+def run_stage(stage, paths, repeat):
+    func = STAGES[stage]
+    start_rss = peak_rss_mb()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak_rss_mb(), start_rss
+
+
+def measure(stage, paths, repeat):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_stage, stage, paths, repeat).result()
+
+
+def result_row(stage, style, size, paths, seconds, peak, baseline):
+    megabytes = sum(instance_size(path) for path in paths) / 1e6
+    row = {
+        "stage": stage,
+        "style": style,
+        "tasks_per_instance": size,
+        "instances": len(paths),
+        "megabytes": round(megabytes, 2),
+        "seconds": round(seconds, 4),
+        "files_per_second": round(len(paths) / seconds, 2) if seconds else None,
+        "tasks_per_second": round(len(paths) * size / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(peak, 1),
+        "stage_rss_mb": round(peak - baseline, 1),
+        "json_backend": decoders.backend(),
+    }
+    print(f"  {style:8} {size:>8} tasks  {stage:13} {seconds:8.3f}s  "
+          f"{row['tasks_per_second']:>12} tasks/s  peak {peak:7.1f} MB")
+    return row
+
+
+def run_benchmarks(sizes, styles, stages, instances=2, repeat=1, work_dir=None, **options):
+    rows = []
+    for style in styles:
+        for size in sizes:
+            directory = tempfile.mkdtemp(prefix="wfbench-", dir=work_dir)
+            try:
+                paths = write_corpus(directory, instances, size, style, **options)
+                for stage in stages:
+                    rows.append(result_row(stage, style, size, paths, *measure(stage, paths, repeat)))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+    return pd.DataFrame(rows)
+
+
+def aggregation_frame(rows, groups, seed=0):
+    # A task-level frame whose rows fall uniformly into `groups` (workflow_name,
+    # task_category) groups, with the columns the logical aggregations read
+    rng = np.random.default_rng(seed)
+    categories = min(groups, 40)
+    group = rng.integers(0, groups, rows)
+    runtime = np.where(rng.random(rows) < 0.05, np.nan, rng.exponential(30.0, rows))
+    frame = pd.DataFrame({
+        "workflow_name": pd.Categorical.from_codes(group // categories,
+                                                   [f"workflow_{i}" for i in range(-(-groups // categories))]),
+        "task_category": pd.Categorical.from_codes(group % categories, [f"category_{i}" for i in range(categories)]),
+        "task_name": pd.Categorical.from_codes(rng.integers(0, 100, rows), [f"task_{i}" for i in range(100)]),
+        "instance_count": rng.integers(1, 1000, rows),
+        "children_count": rng.integers(0, 10, rows),
+        "input_file_count": rng.integers(0, 10, rows),
+        "total_input_file_sizes": rng.integers(0, 10 ** 9, rows),
+        "output_file_count": rng.integers(0, 10, rows),
+        "total_output_file_sizes": rng.integers(0, 10 ** 9, rows),
+        "runtime_seconds": runtime,
+        "cpu_seconds": runtime * rng.random(rows),
+        "machine": pd.Categorical.from_codes(rng.integers(0, 50, rows), [f"node_{i}" for i in range(50)]),
+    })
+    for column in ("workflow_name", "task_category", "task_name", "machine"):
+        frame[column] = frame[column].astype(object)
+    return frame
+
+
+def run_aggregation(variant, rows, groups, repeat):
+    frame = aggregation_frame(rows, groups)
+    start_rss = peak_rss_mb()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        logical_dataset(frame, *AGGREGATIONS[variant])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak_rss_mb(), start_rss
+
+
+def run_aggregation_benchmarks(row_counts, group_counts, variants=tuple(AGGREGATIONS), repeat=1):
+    results = []
+    for rows in row_counts:
+        for groups in group_counts:
+            for variant in variants:
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    seconds, peak, baseline = pool.submit(run_aggregation, variant, rows, groups, repeat).result()
+                results.append({
+                    "stage": f"aggregate_{variant}",
+                    "style": f"{groups}_groups",
+                    "tasks_per_instance": rows,
+                    "instances": 1,
+                    "seconds": round(seconds, 4),
+                    "tasks_per_second": round(rows / seconds, 1) if seconds else None,
+                    "peak_rss_mb": round(peak, 1),
+                    "stage_rss_mb": round(peak - baseline, 1),
+                })
+                print(f"  {groups:>8} groups {rows:>10} rows  aggregate_{variant:8} {seconds:8.3f}s  "
+                      f"{results[-1]['tasks_per_second']:>12} rows/s")
+    return pd.DataFrame(results)
+
+
+def largest_instances(workflows, base_dir=BASE_DIR):
+    # The biggest instance file of each workflow, by its directory name (montage, epigenomics...)
+    paths = find_instance_files(base_dir)
+    largest = {}
+    for workflow in workflows:
+        matching = [path for path in paths if workflow in os.path.dirname(path).split(os.sep)]
+        if not matching:
+            raise ValueError(f"no instances of {workflow} under {base_dir}")
+        largest[workflow] = max(matching, key=instance_size)
+    return largest
+
+
+def run_file_benchmarks(files, stages, repeat=1):
+    rows = []
+    for workflow, path in files.items():
+        size = len(load_instance(path)["workflow"]["specification"]["tasks"])
+        for stage in stages:
+            rows.append(result_row(stage, workflow, size, [path], *measure(stage, [path], repeat)))
+    return pd.DataFrame(rows)
+
+
+def decode_speedups(results):
+    # Whole-file decode time of stdlib json over each backend's, per style and size
+    keys = ["style", "tasks_per_instance"]
+    decode = results[results["stage"].str.startswith("decode_")]
+    baseline = decode[decode["stage"] == "decode_json"][keys + ["seconds"]]
+    speedups = decode[decode["stage"] != "decode_json"].merge(baseline, on=keys, suffixes=("", "_json"))
+    return speedups.assign(speedup=speedups["seconds_json"] / speedups["seconds"])
+
+
+def regressions(results, baseline, tolerance):
+    # Rows whose throughput dropped by more than `tolerance` against the baseline run
+    keys = ["stage", "style", "tasks_per_instance"]
+    merged = results.merge(baseline[keys + ["tasks_per_second"]], on=keys, suffixes=("", "_baseline"))
+    return merged[merged["tasks_per_second"] < merged["tasks_per_second_baseline"] * (1 - tolerance)]
+
+
+def parse_list(value, choices=None, cast=str):
+    items = [cast(item.strip()) for item in value.split(",") if item.strip()]
+    if choices is not None:
+        unknown = [item for item in items if item not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown: {', '.join(map(str, unknown))}")
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction stages on synthetic instances")
+    parser.add_argument("--sizes", type=functools.partial(parse_list, cast=int), default=[1000, 10000],
+                        help="comma-separated tasks per instance (default: 1000,10000)")
+    parser.add_argument("--styles", type=functools.partial(parse_list, choices=STYLES), default=list(STYLES))
+    parser.add_argument("--stages", type=functools.partial(parse_list, choices=STAGES), default=list(STAGES))
+    parser.add_argument("--instances", type=int, default=2, help="instances generated per size (default: 2)")
+    parser.add_argument("--repeat", type=int, default=1, help="report the best of N timed runs")
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--files-per-task", type=int, default=2)
+    parser.add_argument("--work-dir", default=None, help="where to generate the instances (default: system temp)")
+    parser.add_argument("--largest", type=parse_list, default=None, metavar="WORKFLOWS",
+                        help="benchmark the largest real instance of these workflows (e.g. montage,epigenomics)")
+    parser.add_argument("--aggregate", type=functools.partial(parse_list, cast=int), default=None, metavar="ROWS",
+                        help="benchmark the logical aggregations on synthetic task frames of these row counts")
+    parser.add_argument("--groups", type=functools.partial(parse_list, cast=int), default=[2, 300, 100000],
+                        help="comma-separated group counts for --aggregate (default: 2,300,100000)")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--baseline", default=None, help="earlier results CSV to compare tasks/s against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed throughput drop against the baseline (default: 0.25)")
+    args = parser.parse_args()
+    if args.files_per_task < 0:
+        parser.error(f"--files-per-task must be 0 or more, got {args.files_per_task}")
+
+    if args.aggregate:
+        results = run_aggregation_benchmarks(args.aggregate, args.groups, repeat=args.repeat)
+    elif args.largest:
+        results = run_file_benchmarks(largest_instances(args.largest), args.stages, args.repeat)
+    else:
+        results = run_benchmarks(
+            args.sizes, args.styles, args.stages, args.instances, args.repeat, args.work_dir,
+            fan_out=args.fan_out, files_per_task=args.files_per_task,
+        )
+    results.to_csv(args.output, index=False)
+    print(f"✅ Saved {len(results)} benchmark results to {args.output}")
+    for _, row in decode_speedups(results).iterrows():
+        print(f"  {row['style']} ({row['tasks_per_instance']} tasks): {row['stage']} decodes "
+              f"{row['speedup']:.2f}x as fast as decode_json")
+
+    if args.baseline:
+        slower = regressions(results, pd.read_csv(args.baseline), args.tolerance)
+        for _, row in slower.iterrows():
+            print(f"✖ {row['stage']} ({row['style']}, {row['tasks_per_instance']} tasks): "
+                  f"{row['tasks_per_second']} tasks/s vs {row['tasks_per_second_baseline']} in the baseline")
+        if len(slower):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import glob
+import pickle
+import sqlite3
+import hashlib
+
+import profiling
+from archives import open_instance, stat_instance
+from ingest import map_instances
+
+DEFAULT_CACHE_PATH = ".wfinstances_cache.sqlite"
+
+# Bump when the layout of the cache database changes
+CACHE_SCHEMA_VERSION = 1
+
+
+def source_version():
+    # Any change to the extraction code invalidates every cached result
+    digest = hashlib.sha1(str(CACHE_SCHEMA_VERSION).encode())
+    for source in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    # Of the decompressed content, so a .json and its .json.gz have the same digest
+    digest = hashlib.blake2b()
+    with open_instance(path) as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    # Per-instance extraction results keyed by (stage, absolute path) and validated
+    # against the file's size and mtime. With use_hash, an entry whose size/mtime no
+    # longer match (touch, fresh checkout, rsync) is revalidated by content hash
+    # instead of being re-parsed.
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, use_hash=False):
+        self.path = path
+        self.use_hash = use_hash
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "stage TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, digest TEXT, payload BLOB, "
+            "PRIMARY KEY (stage, path))"
+        )
+        version = source_version()
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if stored is None or stored[0] != version:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+            self.conn.commit()
+
+    def lookup(self, stage, path):
+        # True when the stored result for `path` is still valid
+        path = os.path.abspath(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest FROM entries WHERE stage = ? AND path = ?", (stage, path)
+        ).fetchone()
+        if row is None:
+            return False
+        st = stat_instance(path)
+        size, mtime_ns, digest = row
+        if size == st.st_size and mtime_ns == st.st_mtime_ns:
+            return True
+        if self.use_hash and digest is not None and size == st.st_size and digest == file_digest(path):
+            self.conn.execute(
+                "UPDATE entries SET mtime_ns = ? WHERE stage = ? AND path = ?", (st.st_mtime_ns, stage, path)
+            )
+            return True
+        return False
+
+    def load(self, stage, path):
+        row = self.conn.execute(
+            "SELECT payload FROM entries WHERE stage = ? AND path = ?", (stage, os.path.abspath(path))
+        ).fetchone()
+        return pickle.loads(row[0])
+
+    def store(self, stage, path, value):
+        path = os.path.abspath(path)
+        st = stat_instance(path)
+        digest = file_digest(path) if self.use_hash else None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (stage, path, st.st_size, st.st_mtime_ns, digest, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+        )
+
+    def evict_missing(self, paths):
+        # Drop results of instance files that are no longer part of the corpus
+        live = {os.path.abspath(path) for path in paths}
+        stale = [
+            (stage, path) for stage, path in self.conn.execute("SELECT stage, path FROM entries")
+            if path not in live
+        ]
+        self.conn.executemany("DELETE FROM entries WHERE stage = ? AND path = ?", stale)
+        return len(stale)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def map_instances_cached(func, paths, workers=1, cache=None, stage=None, live_paths=None):
+    # Same contract as ingest.map_instances; fresh results come from the cache and
+    # only the remaining files are decoded, in the worker pool. Entries of files
+    # outside live_paths (default: paths) are evicted.
+    if cache is None:
+        yield from map_instances(func, paths, workers)
+        return
+
+    fresh = {path for path in paths if cache.lookup(stage, path)}
+    computed = map_instances(func, [path for path in paths if path not in fresh], workers)
+
+    for path in paths:
+        if path in fresh:
+            cache.hits += 1
+            with profiling.stage("cache_load"):
+                result = cache.load(stage, path)
+            yield path, result, None
+            continue
+        _, result, error = next(computed)
+        cache.misses += 1
+        if error is None:
+            cache.store(stage, path, result)
+        yield path, result, error
+    computed.close()
+
+    cache.evict_missing(paths if live_paths is None else live_paths)
+    cache.commit()
+
+
+def add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="PATH",
+        help=f"reuse per-instance results from an on-disk cache (default path: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--cache-hash", action="store_true",
+        help="revalidate cache entries by content hash when a file's size or mtime changed",
+    )
+
+
+def open_cache(args):
+    if args.cache is None:
+        return None
+    return ParseCache(args.cache, use_hash=args.cache_hash)
+
+
+def close_cache(cache):
+    if cache is None:
+        return
+    print(f"Cache {cache.path}: {cache.hits} hits, {cache.misses} parsed")
+    cache.close()
@@ -0,0 +1,59 @@
+import re
+from functools import lru_cache
+
+from profiling import timed
+
+TRAILING_INDEX = re.compile(r'(_\d+)$')
+TRAILING_ID = re.compile(r'_ID\d+$')
+
+
+def strip_task_suffix(task_name):
+    cleaned = TRAILING_INDEX.sub('', task_name)
+    return TRAILING_ID.sub('', cleaned)
+
+
+class TaskClassifier:
+    # Maps raw task names to categories with a keyword table, where the first keyword
+    # (in table order) contained in the normalized name wins, as in the original loops.
+    #
+    # All keywords are compiled into one alternation inside a lookahead: at every
+    # position it reports the highest-priority keyword starting there, so the
+    # smallest priority over all positions is the first keyword of the table that
+    # occurs anywhere in the name. Results are memoized per (name, workflow system),
+    # since a trace with thousands of tasks only has a handful of distinct base names.
+
+    def __init__(self, mapping, normalize, default=None, cache_size=65536):
+        self.mapping = dict(mapping)
+        self.keywords = list(self.mapping)
+        self.priority = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self.pattern = None
+        if self.keywords:
+            self.pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in self.keywords) + "))")
+        self.normalize = normalize
+        # None keeps the normalized name as its own category
+        self.default = default
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, task_name, workflow_system=None):
+        cleaned = self.normalize(task_name, workflow_system)
+
+        best = None
+        if self.pattern is not None:
+            for match in self.pattern.finditer(cleaned):
+                priority = self.priority[match.group(1)]
+                if best is None or priority < best:
+                    best = priority
+                    if best == 0:
+                        break
+
+        if best is not None:
+            return self.mapping[self.keywords[best]]
+        return cleaned if self.default is None else self.default
+
+    @timed("classify")
+    def classify_many(self, task_names, workflow_system=None):
+        # Classify each distinct name once and broadcast back to the input order
+        categories = dict.fromkeys(task_names)
+        for task_name in categories:
+            categories[task_name] = self.classify(task_name, workflow_system)
+        return [categories[task_name] for task_name in task_names]
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+# Columnar copies of the CSV datasets, written as a directory next to the CSV
+# (task_level_dataset_detailed.csv -> task_level_dataset_detailed.parquet/) and
+# hive-partitioned by workflow system and workflow name, so readers can load just
+# the columns and partitions they need:
+#
+#   pd.read_parquet("task_level_dataset_detailed.parquet", columns=["task_category", "total_input_file_sizes"],
+#                   filters=[("workflow_system", "=", "pegasus")])
+
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+PARTITION_COLUMNS = ["workflow_system", "workflow_name"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError("Columnar output needs pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.dataset
+
+
+def columnar_path(csv_path, fmt):
+    return os.path.splitext(csv_path)[0] + "." + fmt
+
+
+def write_columnar(df, csv_path, fmt, partition_cols=PARTITION_COLUMNS, part=None):
+    # With `part`, df is one chunk of the dataset: its files are added next to those
+    # of the earlier parts (part 0 starts a fresh directory)
+    pa, ds = _pyarrow()
+    target = columnar_path(csv_path, fmt)
+    # List columns (input_files, output_files, children) become Arrow list<string>
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partitioning = ds.partitioning(pa.schema([table.schema.field(column) for column in partition_cols]), flavor="hive")
+
+    if os.path.isdir(target) and not part:
+        shutil.rmtree(target)
+    options = {} if part is None else {"basename_template": f"part-{part:05d}-{{i}}.{fmt}"}
+    ds.write_dataset(
+        table, target, format=COLUMNAR_FORMATS[fmt], partitioning=partitioning,
+        existing_data_behavior="overwrite_or_ignore", **options,
+    )
+    if part is None:
+        print(f"✅ Saved {fmt} copy of {csv_path} to {target}/")
+    return target
+
+
+def add_columnar_argument(parser):
+    parser.add_argument(
+        "--columnar", choices=sorted(COLUMNAR_FORMATS), default=None,
+        help="also write each dataset as a partitioned Parquet or Arrow IPC directory (needs pyarrow)",
+    )
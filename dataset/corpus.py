@@ -0,0 +1,282 @@
+import os
+import sys
+import argparse
+import functools
+
+import numpy as np
+import pandas as pd
+
+import prueba2
+from file_sizes import sum_resolved_file_sizes
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance, map_instances,
+)
+
+# Column-oriented model of the task-level dataset of prueba2.py. Instead of one dict
+# per task, every task attribute is a typed array; strings (task names, categories,
+# file ids, workflow names) are interned into tables and stored as integer codes, and
+# the per-task file lists and children are CSR arrays: task i owns
+# input_files[input_offsets[i]:input_offsets[i + 1]], and so on.
+
+COUNT_COLUMNS = [
+    "children_count", "input_file_count", "total_input_file_sizes", "output_file_count", "total_output_file_sizes",
+]
+
+
+def code_dtype(n_categories):
+    # The dtype pandas uses for Categorical codes, so to_frame doesn't have to convert
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class StringTable:
+    def __init__(self, values=()):
+        self.values = []
+        self.ids = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        code = self.ids.get(value)
+        if code is None:
+            code = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def intern_many(self, values):
+        return np.fromiter((self.intern(value) for value in values), dtype=np.int64, count=len(values))
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _csr(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(items) for items in lists], out=offsets[1:])
+    return offsets
+
+
+def instance_columns(path, data):
+    # Per-instance part, computed where the instance is decoded; string columns are
+    # factorized locally and re-coded against the corpus tables by the builder.
+    # Same task semantics as prueba2.task_rows.
+    tasks = data.get("workflow", {}).get("specification", {}).get("tasks", [])
+    file_sizes = prueba2.build_file_size_lookup(data)
+
+    task_names = [task.get("name") for task in tasks]
+    categories = prueba2.task_classifier.classify_many(task_names)
+    children = [task.get("children", []) for task in tasks]
+    children = [items if isinstance(items, list) else [] for items in children]
+    input_files = [task.get("inputFiles", []) for task in tasks]
+    output_files = [task.get("outputFiles", []) for task in tasks]
+
+    name_codes, name_values = pd.factorize(pd.Series(task_names, dtype=object))
+    category_codes, category_values = pd.factorize(pd.Series(categories, dtype=object))
+    file_codes, file_values = pd.factorize(pd.Series(
+        [f for files in input_files for f in files] + [f for files in output_files for f in files], dtype=object,
+    ))
+    n_input_refs = sum(len(files) for files in input_files)
+
+    # Children reference task ids; resolve them to task positions in this instance
+    position = {}
+    for i, task in enumerate(tasks):
+        position.setdefault(task.get("id", task.get("name")), i)
+    child_positions = np.fromiter(
+        (position.get(child, -1) for items in children for child in items), dtype=np.int64,
+    )
+
+    return {
+        "instance_file": os.path.basename(path),
+        "workflow_name": data.get("name", os.path.basename(path)),
+        "workflow_system": detect_workflow_system(path),
+        "task_names": list(name_values),
+        "task_name_codes": name_codes.astype(np.int64),
+        "categories": list(category_values),
+        "category_codes": category_codes.astype(np.int64),
+        "files": list(file_values),
+        "input_offsets": _csr(input_files),
+        "input_file_codes": file_codes[:n_input_refs].astype(np.int64),
+        "output_offsets": _csr(output_files),
+        "output_file_codes": file_codes[n_input_refs:].astype(np.int64),
+        "child_offsets": _csr(children),
+        "child_positions": child_positions,
+        "children_count": np.array([len(items) for items in children], dtype=np.int64),
+        "input_file_count": np.array([len(files) for files in input_files], dtype=np.int64),
+        "total_input_file_sizes": np.array(sum_resolved_file_sizes(input_files, file_sizes), dtype=np.int64),
+        "output_file_count": np.array([len(files) for files in output_files], dtype=np.int64),
+        "total_output_file_sizes": np.array(sum_resolved_file_sizes(output_files, file_sizes), dtype=np.int64),
+    }
+
+
+def extract_instance_columns(path, streaming=False):
+    return instance_columns(path, load_instance(path, streaming))
+
+
+def _recode(local_codes, table, local_values):
+    # Map codes of a local factorization onto a corpus-wide table; -1 (missing) stays -1
+    mapping = np.append(table.intern_many(local_values), -1)
+    return mapping[local_codes]
+
+
+class CorpusBuilder:
+    def __init__(self):
+        self.task_names = StringTable()
+        self.categories = StringTable()
+        self.files = StringTable()
+        self.workflow_names = StringTable()
+        self.workflow_systems = StringTable()
+        self.instance_files = []
+        self.instance_workflow = []
+        self.instance_system = []
+        self.chunks = {key: [] for key in (
+            "instance", "task_name", "task_category", "input_lengths", "input_files", "output_lengths",
+            "output_files", "child_lengths", "children", *COUNT_COLUMNS,
+        )}
+        self.n_tasks = 0
+
+    def add(self, part):
+        instance = len(self.instance_files)
+        self.instance_files.append(part["instance_file"])
+        self.instance_workflow.append(self.workflow_names.intern(part["workflow_name"]))
+        self.instance_system.append(self.workflow_systems.intern(part["workflow_system"]))
+
+        n = len(part["task_name_codes"])
+        chunks = self.chunks
+        chunks["instance"].append(np.full(n, instance, dtype=np.int32))
+        chunks["task_name"].append(_recode(part["task_name_codes"], self.task_names, part["task_names"]))
+        chunks["task_category"].append(_recode(part["category_codes"], self.categories, part["categories"]))
+        files = self.files.intern_many(part["files"])
+        for kind in ("input", "output"):
+            chunks[f"{kind}_lengths"].append(np.diff(part[f"{kind}_offsets"]))
+            codes = part[f"{kind}_file_codes"]
+            chunks[f"{kind}_files"].append(np.where(codes >= 0, files[np.maximum(codes, 0)], -1))
+        chunks["child_lengths"].append(np.diff(part["child_offsets"]))
+        positions = part["child_positions"]
+        chunks["children"].append(np.where(positions >= 0, positions + self.n_tasks, -1))
+        for column in COUNT_COLUMNS:
+            chunks[column].append(part[column])
+        self.n_tasks += n
+
+    def build(self):
+        def concat(key, dtype):
+            parts = self.chunks[key]
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+        def offsets(key):
+            result = np.zeros(self.n_tasks + 1, dtype=np.int64)
+            np.cumsum(concat(key, np.int64), out=result[1:])
+            return result
+
+        columns = {
+            "instance": concat("instance", np.int32),
+            "task_name": concat("task_name", code_dtype(len(self.task_names))),
+            "task_category": concat("task_category", code_dtype(len(self.categories))),
+            "input_offsets": offsets("input_lengths"),
+            "input_files": concat("input_files", np.int32),
+            "output_offsets": offsets("output_lengths"),
+            "output_files": concat("output_files", np.int32),
+            "child_offsets": offsets("child_lengths"),
+            "children": concat("children", np.int64),
+        }
+        for column in COUNT_COLUMNS:
+            columns[column] = concat(column, np.int64)
+
+        instances = {
+            "instance_file": np.array(self.instance_files, dtype=object),
+            "workflow_name": np.array(self.instance_workflow, dtype=code_dtype(len(self.workflow_names))),
+            "workflow_system": np.array(self.instance_system, dtype=code_dtype(len(self.workflow_systems))),
+        }
+        tables = {
+            "task_name": self.task_names.values,
+            "task_category": self.categories.values,
+            "file": self.files.values,
+            "workflow_name": self.workflow_names.values,
+            "workflow_system": self.workflow_systems.values,
+        }
+        return WorkflowCorpus(columns, instances, tables)
+
+
+class WorkflowCorpus:
+    def __init__(self, columns, instances, tables):
+        self.columns = columns
+        self.instances = instances
+        self.tables = tables
+
+    @classmethod
+    def from_paths(cls, paths, workers=1, streaming=False):
+        builder = CorpusBuilder()
+        func = functools.partial(extract_instance_columns, streaming=streaming)
+        for path, part, error in map_instances(func, paths, workers):
+            if error is not None:
+                print(f"✖ Error processing {path}: {error}")
+                continue
+            builder.add(part)
+        return builder.build()
+
+    @property
+    def n_tasks(self):
+        return len(self.columns["instance"])
+
+    @property
+    def n_instances(self):
+        return len(self.instances["instance_file"])
+
+    def task_files(self, task, kind="input"):
+        offsets = self.columns[f"{kind}_offsets"]
+        ids = self.columns[f"{kind}_files"][offsets[task]:offsets[task + 1]]
+        return [self.tables["file"][i] if i >= 0 else None for i in ids]
+
+    def task_children(self, task):
+        offsets = self.columns["child_offsets"]
+        return self.columns["children"][offsets[task]:offsets[task + 1]]
+
+    def _categorical(self, codes, table):
+        return pd.Categorical.from_codes(codes, pd.Index(table, dtype=object))
+
+    def to_frame(self):
+        # Numeric columns and category codes are wrapped, not copied; per-task
+        # instance attributes are expanded from the instance table
+        instance = self.columns["instance"]
+        # Instance files in different directories can share a name, so the categories
+        # are the distinct names and every instance maps to one of them
+        file_codes, file_names = pd.factorize(self.instances["instance_file"])
+        frame = {
+            "workflow_system": self._categorical(
+                self.instances["workflow_system"][instance], self.tables["workflow_system"]),
+            "workflow_name": self._categorical(
+                self.instances["workflow_name"][instance], self.tables["workflow_name"]),
+            "instance_file": self._categorical(
+                file_codes.astype(code_dtype(len(file_names)))[instance], file_names),
+            "task_name": self._categorical(self.columns["task_name"], self.tables["task_name"]),
+            "task_category": self._categorical(self.columns["task_category"], self.tables["task_category"]),
+        }
+        for column in COUNT_COLUMNS:
+            frame[column] = self.columns[column]
+        return pd.DataFrame(frame, copy=False)
+
+    def memory_usage(self):
+        # Bytes held by the arrays and the interned strings
+        total = sum(array.nbytes for array in self.columns.values())
+        total += sum(array.nbytes for array in self.instances.values())
+        for values in list(self.tables.values()) + [self.instances["instance_file"]]:
+            total += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+        return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar task corpus and report its footprint")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    args = parser.parse_args()
+
+    corpus = WorkflowCorpus.from_paths(find_instance_files(BASE_DIR), args.workers, args.streaming)
+    print(f"Corpus: {corpus.n_instances} instances, {corpus.n_tasks} tasks, "
+          f"{len(corpus.tables['file'])} distinct files, {len(corpus.tables['task_category'])} categories")
+    print(f"Memory: {corpus.memory_usage() / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
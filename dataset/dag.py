@@ -0,0 +1,151 @@
+import numpy as np
+
+# Task graph of one instance in CSR form (the children of task i are
+# targets[offsets[i]:offsets[i + 1]]) and the structural metrics the scripts report
+# per instance. Traversals go level by level over whole frontiers with array
+# operations, so every task and edge is touched a constant number of times.
+
+
+def instance_tasks(data):
+    if 'dag' in data and 'nodes' in data['dag']:
+        return data['dag']['nodes']
+    return data.get("workflow", {}).get("specification", {}).get("tasks", [])
+
+
+def execution_records(data):
+    # execution.tasks indexed by task id
+    records = {}
+    for task in data.get("workflow", {}).get("execution", {}).get("tasks", []):
+        if isinstance(task, dict) and "id" in task:
+            records.setdefault(task["id"], task)
+    return records
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
+class TaskGraph:
+    def __init__(self, ids, offsets, targets, runtime):
+        self.ids = ids
+        self.offsets = offsets
+        self.targets = targets
+        self.runtime = runtime
+
+    @property
+    def n_tasks(self):
+        return len(self.ids)
+
+    @property
+    def n_edges(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_instance(cls, data):
+        tasks = [task for task in instance_tasks(data) if isinstance(task, dict)]
+        ids = [task.get("id", task.get("name")) for task in tasks]
+        position = {}
+        for i, task_id in enumerate(ids):
+            position.setdefault(task_id, i)
+        # children usually name task ids, but fall back to names for traces that use them
+        for i, task in enumerate(tasks):
+            position.setdefault(task.get("name"), i)
+
+        # Edges come from both children and parents lists; either may be incomplete
+        sources, destinations = [], []
+        for i, task in enumerate(tasks):
+            for child in _as_list(task.get("children")):
+                j = position.get(child)
+                if j is not None:
+                    sources.append(i)
+                    destinations.append(j)
+            for parent in _as_list(task.get("parents")):
+                j = position.get(parent)
+                if j is not None:
+                    sources.append(j)
+                    destinations.append(i)
+
+        n = len(tasks)
+        edges = np.unique(np.array(sources, dtype=np.int64) * max(n, 1) + np.array(destinations, dtype=np.int64))
+        sources, targets = np.divmod(edges, max(n, 1))
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+
+        records = execution_records(data)
+        runtime = np.zeros(n, dtype=np.float64)
+        for i, (task_id, task) in enumerate(zip(ids, tasks)):
+            value = records.get(task_id, task).get("runtimeInSeconds", task.get("runtime"))
+            if isinstance(value, (int, float)):
+                runtime[i] = value
+        return cls(ids, offsets, targets, runtime)
+
+    def gather_children(self, nodes):
+        # (source, child) pairs for every edge leaving `nodes`
+        starts = self.offsets[nodes]
+        counts = self.offsets[nodes + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        sources = np.repeat(nodes, counts)
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return sources, self.targets[positions]
+
+    def in_degree(self):
+        return np.bincount(self.targets, minlength=self.n_tasks)
+
+    def parents_csr(self):
+        # Reverse adjacency: parents of task i are parent_targets[parent_offsets[i]:parent_offsets[i + 1]]
+        sources = np.repeat(np.arange(self.n_tasks, dtype=np.int64), np.diff(self.offsets))
+        order = np.argsort(self.targets, kind="stable")
+        offsets = np.zeros(self.n_tasks + 1, dtype=np.int64)
+        np.cumsum(self.in_degree(), out=offsets[1:])
+        return offsets, sources[order]
+
+    def levels(self):
+        # Kahn's algorithm one frontier at a time. Returns the level (longest distance
+        # from a source, in edges) of every task, -1 for tasks on or behind a cycle,
+        # the topological order, and the finish time of every task when each starts as
+        # soon as all its parents are done (runtime-weighted longest path).
+        n = self.n_tasks
+        indegree = self.in_degree()
+        level = np.full(n, -1, dtype=np.int64)
+        start = np.zeros(n, dtype=np.float64)
+        finish = np.zeros(n, dtype=np.float64)
+        order = []
+
+        frontier = np.flatnonzero(indegree == 0)
+        depth = 0
+        while frontier.size:
+            level[frontier] = depth
+            order.append(frontier)
+            finish[frontier] = start[frontier] + self.runtime[frontier]
+            sources, children = self.gather_children(frontier)
+            np.maximum.at(start, children, finish[sources])
+            np.subtract.at(indegree, children, 1)
+            frontier = np.unique(children[indegree[children] == 0])
+            depth += 1
+
+        order = np.concatenate(order) if order else np.zeros(0, dtype=np.int64)
+        return level, order, finish
+
+    def metrics(self):
+        level, order, finish = self.levels()
+        acyclic = len(order) == self.n_tasks
+        widths = np.bincount(level[level >= 0]) if self.n_tasks else np.zeros(0, dtype=np.int64)
+        total_runtime = float(self.runtime.sum())
+        critical_path = float(finish.max()) if self.n_tasks and acyclic else None
+        return {
+            "dag_edges": self.n_edges,
+            "dag_depth": len(widths) if acyclic else None,
+            "dag_max_width": int(widths.max()) if acyclic and len(widths) else None,
+            "critical_path_seconds": critical_path,
+            "total_runtime_seconds": total_runtime,
+            # Amdahl-style bound: no schedule beats total work over the critical path
+            "speedup_bound": total_runtime / critical_path if critical_path else None,
+            "parallelism_profile": widths.tolist() if acyclic else None,
+        }
+
+
+def dag_metrics(data):
+    return TaskGraph.from_instance(data).metrics()
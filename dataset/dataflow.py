@@ -0,0 +1,218 @@
+import os
+import argparse
+import functools
+
+import numpy as np
+import pandas as pd
+
+import prueba2
+from dag import instance_tasks
+from execution import execution_columns
+from file_sizes import explode_file_lists, resolve_file_sizes
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance, map_instances,
+)
+
+# Producer/consumer index of the files of one instance. File ids are interned per
+# instance; file f is written by task producer[f] (-1 for files staged in from
+# outside the workflow) and read by consumers[consumer_offsets[f]:consumer_offsets[f + 1]].
+# Every data-flow edge producer -> consumer carries the size of the file, which is
+# resolved like prueba2 does (the id itself, then its basename, then its normalized
+# path).
+
+OUTPUT_INSTANCES_CSV = "dataflow_instances.csv"
+OUTPUT_CATEGORIES_CSV = "dataflow_category_bytes.csv"
+OUTPUT_HOT_FILES_CSV = "dataflow_hot_files.csv"
+
+
+def resolve_sizes(files, size_lookup):
+    sizes = resolve_file_sizes(files, size_lookup)
+    if sizes.dtype == object:
+        sizes = np.array([size if isinstance(size, (int, float)) else 0 for size in sizes])
+    return sizes.astype(np.int64)
+
+
+class DataFlowIndex:
+    def __init__(self, task_categories, files, sizes, producer, producer_count, consumer_offsets, consumers):
+        self.task_categories = task_categories
+        self.files = files
+        self.sizes = sizes
+        self.producer = producer
+        self.producer_count = producer_count
+        self.consumer_offsets = consumer_offsets
+        self.consumers = consumers
+
+    @property
+    def n_tasks(self):
+        return len(self.task_categories)
+
+    @property
+    def n_files(self):
+        return len(self.files)
+
+    @classmethod
+    def from_instance(cls, data, classifier=prueba2.task_classifier):
+        tasks = [task for task in instance_tasks(data) if isinstance(task, dict)]
+        n = len(tasks)
+        categories = np.array(classifier.classify_many([task.get("name") for task in tasks]), dtype=object)
+
+        def file_list(task, key):
+            files = task.get(key, [])
+            return [f for f in files if isinstance(f, str) and f] if isinstance(files, list) else []
+
+        input_offsets, input_refs = explode_file_lists([file_list(task, "inputFiles") for task in tasks])
+        output_offsets, output_refs = explode_file_lists([file_list(task, "outputFiles") for task in tasks])
+        codes, files = pd.factorize(pd.concat([input_refs, output_refs], ignore_index=True))
+        files = np.array(files, dtype=object)
+        input_codes, output_codes = codes[:len(input_refs)], codes[len(input_refs):]
+        input_task = np.repeat(np.arange(n, dtype=np.int64), np.diff(input_offsets))
+        output_task = np.repeat(np.arange(n, dtype=np.int64), np.diff(output_offsets))
+
+        # First writer of each file wins; producer_count keeps track of files written more than once
+        producer = np.full(len(files), -1, dtype=np.int64)
+        written, first = np.unique(output_codes, return_index=True)
+        producer[written] = output_task[first]
+        producer_count = np.bincount(output_codes, minlength=len(files))
+
+        # Each task reads a file once, however many times it lists it
+        pairs = np.unique(input_codes * max(n, 1) + input_task)
+        consumer_files, consumers = np.divmod(pairs, max(n, 1))
+        consumer_offsets = np.zeros(len(files) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(consumer_files, minlength=len(files)), out=consumer_offsets[1:])
+
+        sizes = resolve_sizes(list(files), prueba2.build_file_size_lookup(data))
+        return cls(categories, files, sizes, producer, producer_count, consumer_offsets, consumers)
+
+    def fan_out(self):
+        return np.diff(self.consumer_offsets)
+
+    def consumption(self):
+        # (file, consumer) for every read
+        return np.repeat(np.arange(self.n_files, dtype=np.int64), self.fan_out()), self.consumers
+
+    def edges(self):
+        # Aggregated producer -> consumer edges: producer, consumer, file count, bytes
+        files, consumers = self.consumption()
+        producers = self.producer[files]
+        keep = (producers >= 0) & (producers != consumers)
+        files, consumers, producers = files[keep], consumers[keep], producers[keep]
+        keys, inverse = np.unique(producers * max(self.n_tasks, 1) + consumers, return_inverse=True)
+        source, target = np.divmod(keys, max(self.n_tasks, 1))
+        return pd.DataFrame({
+            "producer": source,
+            "consumer": target,
+            "file_count": np.bincount(inverse, minlength=len(keys)),
+            "bytes": np.bincount(inverse, weights=self.sizes[files], minlength=len(keys)).astype(np.int64),
+        })
+
+    def category_bytes(self):
+        edges = self.edges()
+        edges["producer_category"] = self.task_categories[edges["producer"].to_numpy()]
+        edges["consumer_category"] = self.task_categories[edges["consumer"].to_numpy()]
+        return edges.groupby(["producer_category", "consumer_category"], sort=True).agg(
+            edge_count=("bytes", "size"), file_count=("file_count", "sum"), bytes=("bytes", "sum"),
+        ).reset_index()
+
+    def file_table(self):
+        fan_out = self.fan_out()
+        return pd.DataFrame({
+            "file": self.files,
+            "size_in_bytes": self.sizes,
+            "fan_in": self.producer_count,
+            "fan_out": fan_out,
+            # Bytes read from the file over all its consumers
+            "read_volume": self.sizes * fan_out,
+        })
+
+    def hot_files(self, n=10, by="read_volume"):
+        return self.file_table().nlargest(n, [by, "fan_out"])
+
+    def staged_in_bytes(self):
+        # Files read by the workflow but produced by none of its tasks
+        staged = (self.producer < 0) & (self.fan_out() > 0)
+        return int(self.sizes[staged].sum())
+
+    def cross_machine_bytes(self, assignment):
+        # Bytes that leave the producer's machine when task i runs on machine
+        # assignment[i] (-1 = unknown). A file is shipped once to each other machine
+        # that reads it, however many tasks there read it.
+        assignment = np.asarray(assignment, dtype=np.int64)
+        files, consumers = self.consumption()
+        producers = self.producer[files]
+        known = producers >= 0
+        files, consumers, producers = files[known], consumers[known], producers[known]
+        source, target = assignment[producers], assignment[consumers]
+        remote = (source >= 0) & (target >= 0) & (source != target)
+        machines = max(int(assignment.max()) + 1, 1) if len(assignment) else 1
+        shipped = np.unique(files[remote] * machines + target[remote]) // machines
+        return int(self.sizes[shipped].sum())
+
+
+def recorded_assignment(data):
+    # Machine of each task in the recorded run, as codes (-1 = not recorded)
+    tasks = [task for task in instance_tasks(data) if isinstance(task, dict)]
+    machines = execution_columns(data, [task.get("id") for task in tasks])["machine"]
+    codes, _ = pd.factorize(pd.Series(machines, dtype=object))
+    return codes.astype(np.int64)
+
+
+def instance_dataflow(path, streaming=False, top=10):
+    data = load_instance(path, streaming)
+    index = DataFlowIndex.from_instance(data)
+    edges = index.edges()
+    assignment = recorded_assignment(data)
+
+    ident = {
+        "workflow_system": detect_workflow_system(path),
+        "workflow_name": data.get("name", os.path.basename(path)),
+        "instance_file": os.path.basename(path),
+    }
+    summary = dict(ident, **{
+        "num_tasks": index.n_tasks,
+        "files": index.n_files,
+        "produced_files": int((index.producer >= 0).sum()),
+        "staged_in_bytes": index.staged_in_bytes(),
+        "dataflow_edges": len(edges),
+        "transferred_bytes": int(edges["bytes"].sum()),
+        "machines_used": int(len(np.unique(assignment[assignment >= 0]))),
+        "cross_machine_bytes": index.cross_machine_bytes(assignment),
+    })
+    categories = index.category_bytes()
+    hot = index.hot_files(top)
+    for frame in (categories, hot):
+        for column, value in reversed(ident.items()):
+            frame.insert(0, column, value)
+    return summary, categories, hot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File producer/consumer index and data-flow volumes per instance")
+    parser.add_argument("--top", type=int, default=10, help="hot files to report per instance (default: 10)")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    args = parser.parse_args()
+
+    func = functools.partial(instance_dataflow, streaming=args.streaming, top=args.top)
+    summaries, categories, hot = [], [], []
+    for path, result, error in map_instances(func, find_instance_files(BASE_DIR), args.workers):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        summaries.append(result[0])
+        categories.append(result[1])
+        hot.append(result[2])
+
+    if not summaries:
+        print("⚠ No instances could be processed, nothing saved")
+        return
+    pd.DataFrame(summaries).to_csv(OUTPUT_INSTANCES_CSV, index=False)
+    pd.concat(categories, ignore_index=True).to_csv(OUTPUT_CATEGORIES_CSV, index=False)
+    pd.concat(hot, ignore_index=True).to_csv(OUTPUT_HOT_FILES_CSV, index=False)
+    print(f"✅ Saved data-flow summary of {len(summaries)} instances to {OUTPUT_INSTANCES_CSV}")
+    print(f"✅ Saved per-category transfer volumes to {OUTPUT_CATEGORIES_CSV}")
+    print(f"✅ Saved the top {args.top} files per instance to {OUTPUT_HOT_FILES_CSV}")
+
+
+if __name__ == "__main__":
+    main()
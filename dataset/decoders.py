@@ -0,0 +1,136 @@
+import os
+import json
+import argparse
+
+import profiling
+
+# JSON decoder backends for the instance files. The fastest installed one is used
+# (pysimdjson, then orjson, then the standard library); WFINSTANCES_JSON_BACKEND or
+# --json-backend picks one explicitly. The fast backends decode to the same objects
+# as json.loads; documents they would read differently (integers beyond 64 bits in
+# the workflow, file, task and machine fields) or reject (NaN/Infinity, non-UTF-8
+# encodings, lone surrogates) go to json.loads, which accepts or rejects them as
+# before. Those fallbacks show up as the "decode_fallback" stage of a --profile
+# report, next to the backend that ran.
+
+BACKEND_ENV = "WFINSTANCES_JSON_BACKEND"
+PREFERENCE = ("simdjson", "orjson", "json")
+
+# Smallest magnitude of an integer orjson turns into a float
+LONG_INTEGER = float(2 ** 63)
+
+_loaders = {}
+
+
+def has_overflowed_integer(data):
+    # orjson decodes integers outside the 64-bit range to floats of at least 2**63 in
+    # magnitude. The check looks at the numeric fields the datasets read: the scalars
+    # of the workflow and of its file, task and machine records. Scanning the raw
+    # bytes for long digit runs instead costs about as much as the parse.
+    workflow = data.get("workflow") if isinstance(data, dict) else None
+    if not isinstance(workflow, dict):
+        return False
+    records = [data, workflow]
+    for part in ("specification", "execution"):
+        section = workflow.get(part)
+        if isinstance(section, dict):
+            records.append(section)
+            for items in section.values():
+                if isinstance(items, list):
+                    records.extend(item for item in items if isinstance(item, dict))
+    for record in records:
+        for value in record.values():
+            if type(value) is float and abs(value) >= LONG_INTEGER:
+                return True
+    return False
+
+
+def _orjson():
+    import orjson
+
+    def loads(raw):
+        data = orjson.loads(raw)
+        if has_overflowed_integer(data):
+            raise ValueError("integer may not fit in 64 bits")
+        return data
+    return loads
+
+
+def _simdjson():
+    import simdjson
+    parser = simdjson.Parser()
+
+    def loads(raw):
+        # recursive=True builds plain dicts and lists, nothing points into the parser
+        return parser.parse(raw, True)
+    return loads
+
+
+def _stdlib():
+    return json.loads
+
+
+BACKENDS = {"orjson": _orjson, "simdjson": _simdjson, "json": _stdlib}
+
+
+def loader(name):
+    if name not in _loaders:
+        _loaders[name] = BACKENDS[name]()
+    return _loaders[name]
+
+
+def available():
+    names = []
+    for name in PREFERENCE:
+        try:
+            loader(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def backend():
+    # The backend decode() uses: the configured one, or the fastest installed
+    name = os.environ.get(BACKEND_ENV, "auto")
+    if name == "auto":
+        return available()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"unknown JSON backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return name
+
+
+def select(name):
+    # Set through the environment so worker processes decode with the same backend
+    if name != "auto":
+        loader(name)
+    os.environ[BACKEND_ENV] = name
+
+
+def decode(raw, name=None):
+    name = name or backend()
+    loads = loader(name)
+    if loads is json.loads:
+        return loads(raw)
+    try:
+        return loads(raw)
+    except (ValueError, RuntimeError):
+        # simdjson raises RuntimeError for some of these, e.g. integers beyond 64 bits
+        with profiling.stage("decode_fallback"):
+            return json.loads(raw)
+
+
+class _SelectBackend(argparse.Action):
+    def __call__(self, parser, namespace, value, option_string=None):
+        try:
+            select(value)
+        except ImportError as e:
+            parser.error(f"JSON backend {value} is not installed ({e})")
+        setattr(namespace, self.dest, value)
+
+
+def add_json_backend_argument(parser):
+    parser.add_argument(
+        "--json-backend", choices=("auto",) + PREFERENCE, default="auto", action=_SelectBackend,
+        help="JSON decoder for instance files (default: the first installed of simdjson, orjson, json)",
+    )
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from aggregation import Grouping
+from profiling import timed
+
+# Execution-side attributes of each task, joined from workflow.execution.tasks to
+# the specification tasks by id, and the per-category performance profile the
+# logical datasets report. avgCPU is recorded as a percentage of one core.
+
+EXECUTION_COLUMNS = ["runtime_seconds", "avg_cpu_percent", "cpu_seconds", "priority", "machine"]
+RECORD_COLUMNS = ["id", "runtimeInSeconds", "avgCPU", "priority", "machines"]
+# (output column, aggregation, source column) of the profile, see aggregation.py
+RUNTIME_PROFILE = [
+    ("runtime_sum_seconds", "sum", "runtime_seconds"),
+    ("runtime_mean_seconds", "mean", "runtime_seconds"),
+    ("runtime_p50_seconds", "median", "runtime_seconds"),
+    ("runtime_p95_seconds", "p95", "runtime_seconds"),
+    ("runtime_max_seconds", "max", "runtime_seconds"),
+    ("cpu_seconds", "sum", "cpu_seconds"),
+]
+
+
+@timed("execution_join")
+def execution_columns(data, task_ids):
+    # One value per entry of task_ids; tasks without an execution record get NaN/None
+    records = data.get("workflow", {}).get("execution", {}).get("tasks", [])
+    records = pd.DataFrame([record for record in records if isinstance(record, dict) and "id" in record],
+                           columns=RECORD_COLUMNS)
+    records = records.drop_duplicates("id").set_index("id")
+    joined = records.reindex(pd.Index(task_ids, dtype=object))
+
+    runtime = pd.to_numeric(joined["runtimeInSeconds"], errors="coerce").to_numpy(dtype=np.float64)
+    avg_cpu = pd.to_numeric(joined["avgCPU"], errors="coerce").to_numpy(dtype=np.float64)
+    machine = joined["machines"].astype(object).str[0]
+    return {
+        "runtime_seconds": runtime.tolist(),
+        "avg_cpu_percent": avg_cpu.tolist(),
+        "cpu_seconds": (runtime * avg_cpu / 100.0).tolist(),
+        # Always float, so a batch of rows formats like the whole dataset does
+        "priority": pd.to_numeric(joined["priority"], errors="coerce").astype(np.float64).tolist(),
+        "machine": machine.astype(object).where(machine.notna(), None).tolist(),
+    }
+
+
+def add_execution_columns(rows, data, task_ids):
+    for column, values in execution_columns(data, task_ids).items():
+        for row, value in zip(rows, values):
+            row[column] = value
+
+
+def logical_dataset(task_df, keys, columns):
+    # The logical dataset of a task-level frame: one row per key combination, in
+    # sorted order, with the (output, how, source) columns and the execution profile,
+    # all reduced over one grouping of the rows
+    grouping, logical = Grouping.from_keys(task_df, keys)
+    for output, values in grouping.reduce_columns(task_df, columns).items():
+        logical[output] = values
+    bytes_moved = task_df["total_input_file_sizes"] + task_df["total_output_file_sizes"]
+    profile = runtime_profile(grouping, task_df, grouping.nunique(task_df["machine"]),
+                              grouping.sum(grouping.segments(bytes_moved)))
+    return pd.concat([logical, profile], axis=1)
+
+
+def runtime_profile(grouping, values, machine_count, moved):
+    # The profile columns of the groups of a grouping over values (holding
+    # runtime_seconds and cpu_seconds), given the distinct machines and bytes moved
+    # of each group
+    profile = pd.DataFrame(grouping.reduce_columns(values, RUNTIME_PROFILE))
+    profile["machine_count"] = machine_count
+    runtime_sum = profile["runtime_sum_seconds"]
+    # Bytes read and written per second of task runtime
+    profile["io_throughput_bytes_per_second"] = (moved / runtime_sum).where(runtime_sum > 0)
+    return profile
@@ -1,10 +1,20 @@
 import os
-import json
+import functools
+import argparse
 import pandas as pd
-import re
 
-# Change this to the location where you cloned the repo
-BASE_DIR = "./WfInstances"
+from classifier import TaskClassifier, strip_task_suffix
+from dag import dag_metrics
+from columnar import add_columnar_argument, write_columnar
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from sharding import add_shard_arguments, open_shard
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance,
+)
+
+OUTPUT_CSV = "workflow_instances_refined_nextflow_task_mapping.csv"
 
 # Prepare list to hold dataset rows
 data = []
@@ -63,9 +73,8 @@ main_task_mapping = {
 }
 
 
-def clean_and_map_task_type(task_name, workflow_system):
-    cleaned = re.sub(r'(_\d+)$', '', task_name)
-    cleaned = re.sub(r'_ID\d+$', '', cleaned)
+def normalize_task_name(task_name, workflow_system):
+    cleaned = strip_task_suffix(task_name)
 
     if workflow_system == 'nextflow' and '.' in cleaned:
         cleaned_parts = cleaned.split('.')
@@ -78,17 +87,23 @@ def clean_and_map_task_type(task_name, workflow_system):
     if workflow_system != 'nextflow' and '_' in cleaned:
         cleaned = cleaned.split('_')[0].lower()
 
-    # Map to main category if keyword matches
-    for key in main_task_mapping:
-        if key in cleaned:
-            return main_task_mapping[key]
-
     return cleaned
 
-def parse_json_file(filepath, workflow_system):
-    with open(filepath, 'r') as f:
-        wf_data = json.load(f)
 
+# Map to main category if keyword matches
+task_classifier = TaskClassifier(main_task_mapping, normalize_task_name)
+
+
+def clean_and_map_task_type(task_name, workflow_system):
+    return task_classifier.classify(task_name, workflow_system)
+
+def parse_json_file(filepath, workflow_system, streaming=False):
+    wf_data = load_instance(filepath, streaming)
+
+    return parse_workflow_data(wf_data, filepath, workflow_system)
+
+
+def parse_workflow_data(wf_data, filepath, workflow_system):
     workflow_name = wf_data.get('workflowName') or wf_data.get('name') or os.path.basename(filepath).split('-')[0]
 
     num_tasks = 0
@@ -97,53 +112,104 @@ def parse_json_file(filepath, workflow_system):
     if 'dag' in wf_data and 'nodes' in wf_data['dag']:
         nodes = wf_data['dag']['nodes']
         num_tasks = len(nodes)
-        for node in nodes:
-            raw_type = node.get('type') or node.get('name') or 'unknown_task_type'
-            task_type = clean_and_map_task_type(raw_type, workflow_system)
+        raw_types = [node.get('type') or node.get('name') or 'unknown_task_type' for node in nodes]
+        for task_type in task_classifier.classify_many(raw_types, workflow_system):
             task_types_count[task_type] = task_types_count.get(task_type, 0) + 1
     elif 'workflow' in wf_data and 'specification' in wf_data['workflow'] and 'tasks' in wf_data['workflow']['specification']:
         tasks = wf_data['workflow']['specification']['tasks']
         num_tasks = len(tasks)
-        for task in tasks:
-            raw_type = task.get('type') or task.get('name') or 'unknown_task_type'
-            task_type = clean_and_map_task_type(raw_type, workflow_system)
+        raw_types = [task.get('type') or task.get('name') or 'unknown_task_type' for task in tasks]
+        for task_type in task_classifier.classify_many(raw_types, workflow_system):
             task_types_count[task_type] = task_types_count.get(task_type, 0) + 1
 
     return workflow_name, num_tasks, task_types_count
 
-rows = []
-
-for root, dirs, files in os.walk(BASE_DIR):
-    for file in files:
-        if file.endswith(".json"):
-            file_path = os.path.join(root, file)
-
-            parts = root.split(os.sep)
-            workflow_system = next((p for p in parts if p in ["nextflow", "pegasus", "swift", "makeflow", "helloworld"]), "unknown")
+def process_instance(file_path, streaming=False):
+    wf_data = load_instance(file_path, streaming)
+
+    return instance_row(file_path, wf_data)
+
+
+def instance_row(file_path, wf_data):
+    file = os.path.basename(file_path)
+    workflow_system = detect_workflow_system(file_path)
+
+    workflow_name, num_tasks, task_types_count = parse_workflow_data(wf_data, file_path, workflow_system)
+
+    if workflow_system == "unknown":
+        for system, wf_names in known_workflow_systems.items():
+            if any(wf_name.lower() in workflow_name.lower() for wf_name in wf_names):
+                workflow_system = system
+                break
+
+    row = {
+        "workflow_system": workflow_system,
+        "workflow_name": workflow_name,
+        "instance_file": file,
+        "num_tasks": num_tasks,
+        "task_types": "; ".join(f"{k}: {v}" for k, v in task_types_count.items()) if task_types_count else "none"
+    }
+
+    # DAG shape and runtime-weighted critical path
+    metrics = dag_metrics(wf_data)
+    profile = metrics.pop("parallelism_profile")
+    row.update(metrics)
+    row["parallelism_profile"] = ";".join(str(width) for width in profile) if profile else ""
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-instance task type counts")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_columnar_argument(parser)
+    add_cache_arguments(parser)
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+    start_profiling(args)
+
+    rows = []
+    paths = find_instance_files(BASE_DIR)
+    shard = open_shard(args, "extractor", paths)
+
+    for path, row, error in map_instances_cached(
+        functools.partial(process_instance, streaming=args.streaming), shard.paths if shard else paths, args.workers, cache,
+        "extractor.process_instance", live_paths=paths,
+    ):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        if shard is not None:
+            shard.add(path, row=row)
+        else:
+            rows.append(row)
 
-            workflow_name, num_tasks, task_types_count = parse_json_file(file_path, workflow_system)
+    close_cache(cache)
+    if shard is not None:
+        shard.close()
+    else:
+        write_dataset(rows, args.columnar)
+    finish_profiling(args)
 
-            if workflow_system == "unknown":
-                for system, wf_names in known_workflow_systems.items():
-                    if any(wf_name.lower() in workflow_name.lower() for wf_name in wf_names):
-                        workflow_system = system
-                        break
 
-            row = {
-                "workflow_system": workflow_system,
-                "workflow_name": workflow_name,
-                "instance_file": file,
-                "num_tasks": num_tasks,
-                "task_types": "; ".join(f"{k}: {v}" for k, v in task_types_count.items()) if task_types_count else "none"
-            }
+def write_dataset(rows, columnar=None):
+    # Convert to DataFrame and sort
+    with stage("dataframe"):
+        df = pd.DataFrame(rows)
+        df = df.sort_values(by=["workflow_system", "workflow_name", "instance_file"])
 
-            rows.append(row)
+    # Save to CSV
+    with stage("csv_write"):
+        df.to_csv(OUTPUT_CSV, index=False)
+    if columnar:
+        with stage("columnar_write"):
+            write_columnar(df, OUTPUT_CSV, columnar)
 
-# Convert to DataFrame and sort
-df = pd.DataFrame(rows)
-df = df.sort_values(by=["workflow_system", "workflow_name", "instance_file"])
+    print(f"Dataset saved with {len(df)} rows and improved Nextflow task name mapping!")
 
-# Save to CSV
-df.to_csv("workflow_instances_refined_nextflow_task_mapping.csv", index=False)
 
-print(f"Dataset saved with {len(df)} rows and improved Nextflow task name mapping!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from profiling import timed
+
+
+# Columnar versions of the per-task file size sums of prueba2.py / prueba3.py.
+# The task -> file references of an instance are exploded into one flat array with
+# CSR offsets (task i owns refs[offsets[i]:offsets[i + 1]]), each distinct path is
+# normalized and joined against the size table once, and the per-task totals are
+# segment sums over the offsets.
+
+def explode_file_lists(file_lists):
+    counts = np.fromiter((len(files) for files in file_lists), dtype=np.int64, count=len(file_lists))
+    offsets = np.zeros(len(file_lists) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    refs = pd.Series(list(chain.from_iterable(file_lists)), dtype=object)
+    return offsets, refs
+
+
+def segment_sums(values, offsets):
+    totals = np.zeros(len(values) + 1, dtype=values.dtype)
+    np.cumsum(values, out=totals[1:])
+    return totals[offsets[1:]] - totals[offsets[:-1]]
+
+
+def _size_table(size_lookup):
+    keys = pd.Index(list(size_lookup.keys()), dtype=object)
+    sizes = np.array(list(size_lookup.values()))
+    if sizes.dtype == object or sizes.dtype.kind not in "iuf":
+        sizes = sizes.astype(object)
+    return keys, sizes
+
+
+def _join(keys, probe):
+    if len(keys) == 0:
+        return np.full(len(probe), -1, dtype=np.int64)
+    return keys.get_indexer(pd.Index(probe, dtype=object))
+
+
+def resolve_file_sizes(paths, size_lookup):
+    # Size of each distinct path as get_file_size in prueba2.py resolves it: the first
+    # non-zero size among the path itself, its basename and its normalized form; 0 for
+    # empty and "none" paths and for paths that are not found
+    paths = list(paths)
+    valid_path = np.array([bool(p) and p.lower() != "none" for p in paths], dtype=bool)
+    basenames = [os.path.basename(p) for p in paths]
+
+    keys, sizes = _size_table(size_lookup)
+    nonzero = np.array([bool(size) for size in sizes], dtype=bool)
+    path_size = np.zeros(len(paths), dtype=sizes.dtype if len(sizes) else np.int64)
+    resolved = np.zeros(len(paths), dtype=bool)
+
+    for probe in (paths, basenames, None):
+        pending = np.flatnonzero(~resolved & valid_path)
+        if len(pending) == 0:
+            break
+        if probe is None:
+            probe_keys = [os.path.normpath(paths[i]).replace("\\", "/") for i in pending]
+        else:
+            probe_keys = [probe[i] for i in pending]
+        pos = _join(keys, probe_keys)
+        hit = pos >= 0
+        hit[hit] = nonzero[pos[hit]]
+        path_size[pending[hit]] = sizes[pos[hit]]
+        resolved[pending[hit]] = True
+    return path_size
+
+
+@timed("size_lookup")
+def sum_resolved_file_sizes(file_lists, size_lookup):
+    # prueba2.py semantics: skip empty and "none" entries, count each basename once
+    # per task, and size each reference with resolve_file_sizes.
+    offsets, refs = explode_file_lists(file_lists)
+    if len(refs) == 0:
+        return [0] * len(file_lists)
+
+    codes, paths = pd.factorize(refs)
+    if len(paths) == 0:
+        return [0] * len(file_lists)
+    paths = list(paths)
+    valid_path = np.array([bool(p) and p.lower() != "none" for p in paths], dtype=bool)
+    basenames = [os.path.basename(p) for p in paths]
+    path_size = resolve_file_sizes(paths, size_lookup)
+
+    # Keep the first valid reference of each (task, basename) pair
+    task_of_ref = np.repeat(np.arange(len(file_lists), dtype=np.int64), np.diff(offsets))
+    base_codes, _ = pd.factorize(pd.Series(basenames, dtype=object))
+    valid_refs = np.flatnonzero((codes >= 0) & valid_path[np.maximum(codes, 0)])
+    first = ~pd.DataFrame({
+        "task": task_of_ref[valid_refs], "base": base_codes[codes[valid_refs]],
+    }).duplicated().to_numpy()
+    keep = np.zeros(len(refs), dtype=bool)
+    keep[valid_refs[first]] = True
+
+    ref_sizes = np.where(keep, path_size[np.maximum(codes, 0)], 0)
+    return segment_sums(ref_sizes, offsets).tolist()
+
+
+@timed("size_lookup")
+def sum_basename_file_sizes(file_lists, size_lookup):
+    # prueba3.py semantics: every string reference counts, sized by its basename only
+    offsets, refs = explode_file_lists(file_lists)
+    if len(refs) == 0:
+        return [0] * len(file_lists)
+
+    codes, paths = pd.factorize(refs)
+    if len(paths) == 0:
+        return [0] * len(file_lists)
+    is_str = np.array([isinstance(p, str) for p in paths], dtype=bool)
+    basenames = [os.path.basename(p) if s else None for p, s in zip(paths, is_str)]
+
+    keys, sizes = _size_table(size_lookup)
+    pos = _join(keys, basenames)
+    hit = (pos >= 0) & is_str
+    path_size = np.zeros(len(paths), dtype=sizes.dtype if len(sizes) else np.int64)
+    path_size[hit] = sizes[pos[hit]]
+
+    ref_sizes = np.where(codes >= 0, path_size[np.maximum(codes, 0)], 0)
+    return segment_sums(ref_sizes, offsets).tolist()
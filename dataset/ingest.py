@@ -0,0 +1,135 @@
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+from archives import archive_members, instance_size, is_archive, is_instance_file, open_instance, split_member
+from decoders import add_json_backend_argument, decode
+from stream import load_compact_instance
+
+# Change this to the location where you cloned the repo
+BASE_DIR = "./WfInstances"
+
+WORKFLOW_SYSTEMS = ["nextflow", "pegasus", "swift", "makeflow", "helloworld"]
+
+
+def find_instance_files(base_dir=BASE_DIR):
+    # Same order as the original os.walk loops, so merged output does not depend on the worker count.
+    # Bundles contribute their instance files in archive order (see archives.py).
+    paths = []
+    with profiling.stage("walk"):
+        for root, dirs, files in os.walk(base_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                if is_instance_file(file):
+                    paths.append(path)
+                elif is_archive(file):
+                    try:
+                        paths.extend(archive_members(path))
+                    except (tarfile.TarError, OSError) as e:
+                        print(f"✖ Error reading archive {path}: {e}")
+    return paths
+
+
+def detect_workflow_system(file_path):
+    # Inside a bundle the path within it is looked at first
+    archive, member = split_member(file_path)
+    parts = os.path.dirname(archive).split(os.sep)
+    if member is not None:
+        parts = member.split("/")[:-1] + parts
+    return next((p for p in parts if p in WORKFLOW_SYSTEMS), "unknown")
+
+
+def load_instance(path, streaming=False, backend=None):
+    if streaming:
+        with profiling.stage("stream_decode"):
+            return load_compact_instance(path)
+    with profiling.stage("read"):
+        with open_instance(path) as f:
+            raw = f.read()
+    profiling.add_bytes("read", len(raw))
+    with profiling.stage("decode"):
+        return decode(raw, backend)
+
+
+def resolve_workers(workers):
+    if not workers or workers < 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _run_one(func, path, profile=None):
+    with profiling.collecting(path, profile) as profiler:
+        try:
+            result, error = func(path), None
+        except Exception as e:
+            # Only the message crosses the process boundary, some exceptions don't pickle
+            result, error = None, str(e)
+    return result, error, profiler.snapshot() if profiler is not None else None
+
+
+def map_instances(func, paths, workers=1):
+    # Yields (path, result, error) in the order of `paths`, whatever the worker count.
+    # `func` must be a module-level function so it can be sent to the pool.
+    workers = resolve_workers(workers)
+    profile = profiling.worker_options()
+    if workers == 1 or len(paths) < 2:
+        for path in paths:
+            result, error, stats = _run_one(func, path, profile)
+            profiling.merge(stats)
+            yield path, result, error
+        return
+
+    order = _submission_order(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [None] * len(paths)
+        for i in order:
+            futures[i] = pool.submit(_run_one, func, paths[i], profile)
+        for path, future in zip(paths, futures):
+            result, error, stats = future.result()
+            profiling.merge(stats)
+            yield path, result, error
+
+
+def _submission_order(paths):
+    # Biggest traces first, so a multi-MB montage file doesn't end up last on one core.
+    # The members of a bundle go together in archive order (the order of `paths`) and
+    # the bundle counts as one trace of their total size: the workers then only read
+    # forward through a compressed bundle, and each decompresses it at most once.
+    units = {}
+    for i, path in enumerate(paths):
+        archive, member = split_member(path)
+        unit = units.setdefault(archive if member is not None else path, [0, []])
+        unit[0] += _file_size(path)
+        unit[1].append(i)
+    return [i for _, items in sorted(units.values(), key=lambda unit: unit[0], reverse=True) for i in items]
+
+
+def _file_size(path):
+    try:
+        return instance_size(path)
+    except OSError:
+        return 0
+
+
+def add_workers_argument(parser):
+    parser.add_argument(
+        "-j", "--workers", type=int, default=1,
+        help="number of worker processes used to parse instance files (0 = one per CPU, default: 1)",
+    )
+
+
+def add_verbose_argument(parser):
+    parser.add_argument(
+        "-v", "--verbose", action="store_true",
+        help="print a progress line for every instance file",
+    )
+
+
+def add_streaming_argument(parser):
+    # How instance files are read: incrementally, or whole with the chosen JSON decoder
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="read instances incrementally, keeping only the task/file records the datasets use",
+    )
+    add_json_backend_argument(parser)
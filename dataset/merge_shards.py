@@ -0,0 +1,109 @@
+import argparse
+
+import pandas as pd
+
+import extractor
+import prueba
+import prueba2
+import prueba3
+from columnar import add_columnar_argument
+from outofcore import CHUNK_ROWS, ChunkedDatasetWriter, LogicalPartial, OutOfCoreDataset, SpilledGroupValues
+from sharding import SHARD_DIR, ShardRows, load_shards
+
+# Combines the results of `--shard i/N` runs (see sharding.py) into the datasets one
+# run of the same script over the whole corpus writes, byte for byte:
+#
+#   python dataset/merge_shards.py prueba2 prueba3 --shard-dir shards
+#
+# Instances are replayed in the order of the full walk. prueba2's duplicates are
+# resolved here: the first parsed instance of each dedupe key wins, then (with name
+# dedupe) the first instance of each workflow name.
+
+WORKFLOW_SCRIPTS = {"extractor": extractor, "prueba": prueba}
+# Task-level scripts: module, task-level CSVs and the CSV the columnar copy is named after
+TASK_SCRIPTS = {
+    "prueba2": (prueba2, prueba2.TASK_LEVEL_CSVS, "task_level_dataset_detailed.csv"),
+    "prueba3": (prueba3, [(prueba3.TASK_LEVEL_CSV, [])], prueba3.TASK_LEVEL_CSV),
+}
+
+
+def instance_records(manifests):
+    # (manifest, record) of every instance of the shards, in the order of the full walk
+    items = [(manifest, record) for manifest in manifests for record in manifest["records"]]
+    return sorted(items, key=lambda item: item[1]["position"])
+
+
+def unique_instances(items, dedupe):
+    seen_keys = set()
+    seen_names = set()
+    included = []
+    for manifest, record in items:
+        if record["key"] in seen_keys:
+            continue
+        seen_keys.add(record["key"])
+        if dedupe == "name":
+            if record["workflow_name"] in seen_names:
+                continue
+            seen_names.add(record["workflow_name"])
+        included.append((manifest, record))
+    return included
+
+
+def merge_workflow_rows(script, manifests, args):
+    rows = [record["row"] for _, record in instance_records(manifests)]
+    WORKFLOW_SCRIPTS[script].write_dataset(rows, args.columnar)
+
+
+def merge_task_rows(script, manifests, args):
+    module, outputs, columnar_csv = TASK_SCRIPTS[script]
+    items = instance_records(manifests)
+    if script == "prueba2":
+        items = unique_instances(items, manifests[0]["options"]["dedupe"])
+
+    workflow_systems = {}
+    partial = LogicalPartial(module.LOGICAL_KEYS, module.LOGICAL_COLUMNS, SpilledGroupValues())
+    for _, record in items:
+        workflow_systems.setdefault(record["workflow_name"], record["system"])
+        partial.merge(record["partial"])
+
+    columnar = (args.columnar, columnar_csv) if args.columnar else None
+    writer = ChunkedDatasetWriter(outputs, args.chunk_rows, columnar, workflow_systems)
+    shard_rows = ShardRows(args.shard_dir, script)
+    try:
+        # The per-task runtime values are not in the manifests; they come from the
+        # task rows, spilled to disk as they are replayed
+        for manifest, record in items:
+            rows = shard_rows.load(manifest, record)
+            writer.add(rows)
+            partial.add_values(pd.DataFrame(rows, columns=partial.source_columns()), record["position"])
+    finally:
+        shard_rows.close()
+    module.write_datasets(OutOfCoreDataset(writer, partial), args.columnar, workflow_systems)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the partial results of sharded runs into the datasets")
+    parser.add_argument("scripts", nargs="+", choices=sorted({**WORKFLOW_SCRIPTS, **TASK_SCRIPTS}))
+    parser.add_argument("--shard-dir", default=SHARD_DIR, metavar="DIR",
+                        help=f"directory the shards were written to (default: {SHARD_DIR})")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, metavar="N",
+                        help=f"task rows written per output chunk (default: {CHUNK_ROWS})")
+    add_columnar_argument(parser)
+    args = parser.parse_args()
+
+    for script in args.scripts:
+        try:
+            manifests = load_shards(args.shard_dir, script)
+        except ValueError as e:
+            parser.error(str(e))
+        instances = sum(len(manifest["records"]) for manifest in manifests)
+        print(f"Merging {len(manifests)} shards of {script} "
+              f"({instances} instances from {manifests[0]['files']} instance files)")
+        if script in WORKFLOW_SCRIPTS:
+            merge_workflow_rows(script, manifests, args)
+        else:
+            merge_task_rows(script, manifests, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from columnar import columnar_path, write_columnar
+from aggregation import Grouping
+from execution import runtime_profile
+from profiling import stage
+
+# Out-of-core builds of the task-level and logical datasets (--out-of-core). The
+# task rows of each instance are appended to the output files in chunks of
+# --chunk-rows rows as soon as they are extracted, and the (workflow_name,
+# task_category) aggregation is kept as mergeable per-group partials: counts, sums,
+# maxima, first values with their position in the run, and means as sum / count.
+# The runtime and CPU seconds of each task are the only per-task state, kept so the
+# runtime p50/p95 and float sums come out bit-identical to the in-memory build. They
+# are spilled to one temporary file per group and the profile is reduced a few
+# groups at a time, so peak memory is bounded by the largest instance, one chunk of
+# rows and the runtime values of the largest group (24 bytes per task).
+
+CHUNK_ROWS = 50_000
+# Task values read back at once while the profile is reduced (one group at least)
+PROFILE_ROWS = 1_000_000
+AGGREGATIONS = ("first_row", "first", "count", "sum", "max", "mean")
+
+
+class GroupValues:
+    # Runtime and CPU seconds of the tasks of each group, with the position of their
+    # batch in the run, kept in memory
+    DTYPE = np.dtype([("position", "<i8"), ("runtime", "<f8"), ("cpu", "<f8")])
+
+    def __init__(self):
+        self.values = {}
+
+    def add(self, key, position, runtime, cpu):
+        records = np.empty(len(runtime), dtype=self.DTYPE)
+        records["position"] = position
+        records["runtime"] = runtime
+        records["cpu"] = cpu
+        self._append(key, records)
+
+    def _append(self, key, records):
+        self.values.setdefault(key, []).append(records)
+
+    def _records(self, key):
+        return np.concatenate(self.values[key]) if key in self.values else np.zeros(0, dtype=self.DTYPE)
+
+    def keys(self):
+        return self.values.keys()
+
+    def load(self, key):
+        # (runtime, cpu) of a group in run order
+        records = self._records(key)
+        records = records[np.argsort(records["position"], kind="stable")]
+        return records["runtime"], records["cpu"]
+
+    def merge(self, other):
+        for key in other.keys():
+            self._append(key, other._records(key))
+
+    def close(self):
+        self.values = {}
+
+
+class SpilledGroupValues(GroupValues):
+    # GroupValues appended to one file per group in a temporary directory
+    def __init__(self, directory=None):
+        self.directory = tempfile.mkdtemp(prefix="wf-values-", dir=directory)
+        self.files = {}
+
+    def _append(self, key, records):
+        path = self.files.get(key)
+        if path is None:
+            path = self.files[key] = os.path.join(self.directory, f"{len(self.files)}.values")
+        with open(path, "ab") as f:
+            records.tofile(f)
+
+    def _records(self, key):
+        if key not in self.files:
+            return np.zeros(0, dtype=self.DTYPE)
+        return np.fromfile(self.files[key], dtype=self.DTYPE)
+
+    def keys(self):
+        return self.files.keys()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.files = {}
+
+
+class LogicalPartial:
+    # State of a logical aggregation over the batches folded in so far. `columns` are
+    # (output column, how, source column) with how in AGGREGATIONS: first_row is the
+    # value of a group's first row, first its first non-null value. Every batch has a
+    # position in the run, so partials merge in any order to the same result.
+    # `values` keeps the per-task runtime values the profile needs (GroupValues or
+    # SpilledGroupValues); a partial without them can be merged but not reduced.
+
+    def __init__(self, keys, columns, values=None):
+        self.keys = list(keys)
+        self.columns = list(columns)
+        self.groups = {}
+        self.values = values
+
+    def source_columns(self):
+        sources = [source for _, how, source in self.columns if how != "count"]
+        extra = ["runtime_seconds", "cpu_seconds", "machine", "total_input_file_sizes", "total_output_file_sizes"]
+        return list(dict.fromkeys(self.keys + sources + extra))
+
+    def add(self, task_df, position):
+        if task_df.empty:
+            return
+        grouped = task_df.groupby(self.keys, sort=False)
+        reduced = {}
+        for output, how, source in self.columns:
+            if how in ("sum", "mean"):
+                reduced[output] = grouped[source].sum()
+            elif how == "max":
+                reduced[output] = grouped[source].max()
+        non_null = {output: grouped[source].count() for output, how, source in self.columns if how == "mean"}
+        moved = (task_df["total_input_file_sizes"] + task_df["total_output_file_sizes"]).to_numpy()
+        runtime = task_df["runtime_seconds"].to_numpy(dtype=np.float64)
+        cpu = task_df["cpu_seconds"].to_numpy(dtype=np.float64)
+        machine = task_df["machine"].to_numpy(dtype=object)
+        firsts = {source: task_df[source].to_numpy(dtype=object)
+                  for _, how, source in self.columns if how in ("first_row", "first")}
+
+        for group, rows in grouped.indices.items():
+            key = group if isinstance(group, tuple) else (group,)
+            if self.values is not None:
+                self.values.add(key, position, runtime[rows], cpu[rows])
+            part = {"rows": len(rows), "agg": {},
+                    "machines": {m for m in machine[rows] if isinstance(m, str)}, "moved": moved[rows].sum()}
+            for output, how, source in self.columns:
+                if how == "count":
+                    part["agg"][output] = len(rows)
+                elif how in ("first_row", "first"):
+                    values = firsts[source][rows]
+                    present = np.flatnonzero(pd.notna(values)) if how == "first" else [0]
+                    if len(present):
+                        part["agg"][output] = ((position, rows[present[0]]), values[present[0]])
+                elif how == "mean":
+                    part["agg"][output] = (reduced[output][group], non_null[output][group])
+                else:
+                    part["agg"][output] = reduced[output][group]
+            self._merge_group(key, part)
+
+    def add_values(self, task_df, position):
+        # Only the per-task values of a batch whose aggregates came in a merged partial
+        if task_df.empty:
+            return
+        runtime = task_df["runtime_seconds"].to_numpy(dtype=np.float64)
+        cpu = task_df["cpu_seconds"].to_numpy(dtype=np.float64)
+        for key, rows in task_df.groupby(self.keys, sort=False).indices.items():
+            self.values.add(key if isinstance(key, tuple) else (key,), position, runtime[rows], cpu[rows])
+
+    def merge(self, other):
+        for key, part in other.groups.items():
+            self._merge_group(key, part)
+        if self.values is not None and other.values is not None:
+            self.values.merge(other.values)
+
+    def close(self):
+        if self.values is not None:
+            self.values.close()
+
+    def _merge_group(self, key, part):
+        state = self.groups.get(key)
+        if state is None:
+            self.groups[key] = {"rows": part["rows"], "agg": dict(part["agg"]),
+                                "machines": set(part["machines"]), "moved": part["moved"]}
+            return
+        state["rows"] += part["rows"]
+        state["machines"] |= part["machines"]
+        state["moved"] += part["moved"]
+        agg = state["agg"]
+        for output, how, _ in self.columns:
+            if output not in part["agg"]:
+                continue
+            value = part["agg"][output]
+            if output not in agg:
+                agg[output] = value
+            elif how in ("first_row", "first"):
+                agg[output] = min(agg[output], value, key=lambda first: first[0])
+            elif how == "mean":
+                agg[output] = (agg[output][0] + value[0], agg[output][1] + value[1])
+            elif how == "max":
+                agg[output] = max(agg[output], value)
+            else:
+                agg[output] = agg[output] + value
+
+    def result(self):
+        # The logical dataset, sorted by the keys like a groupby, with the execution profile
+        keys = sorted(self.groups)
+        rows = []
+        for key in keys:
+            agg = self.groups[key]["agg"]
+            row = dict(zip(self.keys, key))
+            for output, how, _ in self.columns:
+                value = agg.get(output)
+                if how in ("first_row", "first"):
+                    value = None if value is None else value[1]
+                elif how == "mean":
+                    value = value[0] / value[1] if value[1] else np.nan
+                row[output] = value
+            rows.append(row)
+        logical = pd.DataFrame(rows, columns=self.keys + [output for output, _, _ in self.columns])
+        return logical.merge(self.profile(keys), on=self.keys, how="left")
+
+    def profile(self, keys):
+        # Runs the in-memory profile reductions over the kept runtime/CPU values, read
+        # back a batch of groups at a time, each group in run order
+        profiles = []
+        batch = []
+        rows = 0
+        for i, key in enumerate(keys):
+            batch.append((key, *self.values.load(key)))
+            rows += len(batch[-1][1])
+            if rows >= PROFILE_ROWS or i == len(keys) - 1:
+                profiles.append(self._profile_batch(batch))
+                batch = []
+                rows = 0
+        if not profiles:
+            return pd.DataFrame(columns=self.keys)
+        return pd.concat(profiles, ignore_index=True)
+
+    def _profile_batch(self, batch):
+        sizes = [len(runtime) for _, runtime, _ in batch]
+        values = {
+            "runtime_seconds": np.concatenate([runtime for _, runtime, _ in batch]),
+            "cpu_seconds": np.concatenate([cpu for _, _, cpu in batch]),
+        }
+        grouping = Grouping(np.repeat(np.arange(len(batch), dtype=np.int64), sizes), len(batch))
+        profile = runtime_profile(
+            grouping, values,
+            np.array([len(self.groups[key]["machines"]) for key, _, _ in batch], dtype=np.int64),
+            pd.Series([self.groups[key]["moved"] for key, _, _ in batch]),
+        )
+        for i, name in enumerate(self.keys):
+            profile.insert(i, name, [key[i] for key, _, _ in batch])
+        return profile
+
+
+class ChunkedDatasetWriter:
+    # Appends row batches to CSV files, each (path, dropped columns), writing the header
+    # with the first chunk; with columnar=(format, csv path) every chunk is also added to
+    # the columnar copy as part files
+    def __init__(self, outputs, chunk_rows=CHUNK_ROWS, columnar=None, workflow_systems=None):
+        self.outputs = outputs
+        self.chunk_rows = chunk_rows
+        self.columnar = columnar
+        self.workflow_systems = workflow_systems if workflow_systems is not None else {}
+        self.pending = []
+        self.chunks = 0
+        self.rows = 0
+
+    def add(self, rows):
+        # Flushing before adding lets the caller register the workflow system of the
+        # rows it just added, which the columnar parts are partitioned by
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+        self.pending.extend(rows)
+
+    def flush(self):
+        if not self.pending:
+            return
+        with stage("dataframe"):
+            chunk = pd.DataFrame(self.pending)
+        self.pending = []
+        with stage("csv_write"):
+            for path, dropped in self.outputs:
+                chunk.drop(columns=dropped, errors='ignore').to_csv(
+                    path, mode="a" if self.chunks else "w", header=not self.chunks, index=False
+                )
+        if self.columnar:
+            fmt, csv_path = self.columnar
+            with stage("columnar_write"):
+                # A column with no values in this chunk would otherwise get Arrow's null type
+                for column in chunk.columns[(chunk.dtypes == object) & chunk.isna().all().to_numpy()]:
+                    chunk[column] = chunk[column].astype("str")
+                chunk.insert(0, "workflow_system", chunk["workflow_name"].map(self.workflow_systems).fillna("unknown"))
+                write_columnar(chunk, csv_path, fmt, part=self.chunks)
+        self.chunks += 1
+        self.rows += len(chunk)
+
+    def close(self):
+        self.flush()
+        if self.columnar and self.chunks:
+            fmt, csv_path = self.columnar
+            print(f"✅ Saved {fmt} copy of {csv_path} to {columnar_path(csv_path, fmt)}/ ({self.chunks} chunks)")
+        return self.rows
+
+
+class OutOfCoreDataset:
+    # Stands in for the all_rows list of prueba2.py / prueba3.py: every extend() is the
+    # rows of one instance, handed to the chunked writer and the logical partial
+    def __init__(self, writer, partial):
+        self.writer = writer
+        self.partial = partial
+        self.batches = 0
+
+    def extend(self, rows, position=None):
+        if not rows:
+            return
+        self.writer.add(rows)
+        with stage("groupby"):
+            self.partial.add(pd.DataFrame(rows, columns=self.partial.source_columns()),
+                             self.batches if position is None else position)
+        self.batches += 1
+
+    def close(self):
+        # Flushes the last chunk; returns the number of task rows written
+        return self.writer.close()
+
+    def logical_tasks(self):
+        try:
+            with stage("groupby"):
+                return self.partial.result()
+        finally:
+            self.partial.close()
+
+
+def out_of_core_dataset(args, outputs, columnar_csv, keys, columns, workflow_systems):
+    # The all_rows sink of a dataset build: a list, or with --out-of-core an OutOfCoreDataset
+    if not args.out_of_core:
+        return []
+    columnar = (args.columnar, columnar_csv) if args.columnar else None
+    writer = ChunkedDatasetWriter(outputs, args.chunk_rows, columnar, workflow_systems)
+    return OutOfCoreDataset(writer, LogicalPartial(keys, columns, SpilledGroupValues()))
+
+
+def add_out_of_core_arguments(parser):
+    parser.add_argument(
+        "--out-of-core", action="store_true",
+        help="append task rows to the outputs as instances are parsed and aggregate from mergeable "
+             "partials, so memory stays bounded by the largest instance and group",
+    )
+    parser.add_argument(
+        "--chunk-rows", type=int, default=CHUNK_ROWS, metavar="N",
+        help=f"task rows buffered per output chunk with --out-of-core (default: {CHUNK_ROWS})",
+    )
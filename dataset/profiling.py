@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import resource
+import functools
+import contextlib
+import tracemalloc
+
+import pandas as pd
+
+# Opt-in instrumentation of the dataset builds. Pipeline code marks its stages with
+# `with stage("decode"):` or `@timed("classify")`; while profiling is off those are a
+# single None check. With --profile, every stage records calls, wall time, bytes and
+# (with --profile-memory, through tracemalloc) peak traced memory, both in total and
+# per instance file; a file's peak is counted above the memory traced when it
+# started. Instance files parsed in worker processes are profiled there and their
+# stats are merged into the main process by ingest.map_instances.
+
+_profiler = None
+_NO_STAGE = contextlib.nullcontext()
+
+
+class Profiler:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+        self.files = {}
+        self.current = None
+        self.peaks = []
+        self.started = time.perf_counter()
+
+    def _stage_stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {"calls": 0, "seconds": 0.0, "bytes": 0, "peak_bytes": 0}
+        return stats
+
+    def _start_peak(self):
+        # reset_peak is global, so hand the peak seen so far to the enclosing stage or file
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.peaks.append(0)
+
+    def _end_peak(self):
+        peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        return peak
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.memory:
+            self._start_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self._stage_stats(name)
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            if self.memory:
+                stats["peak_bytes"] = max(stats["peak_bytes"], self._end_peak())
+            if self.current is not None:
+                per_stage = self.current["stages"]
+                per_stage[name] = per_stage.get(name, 0.0) + elapsed
+
+    def add_bytes(self, name, nbytes):
+        self._stage_stats(name)["bytes"] += nbytes
+        if self.current is not None:
+            self.current["bytes"] += nbytes
+
+    @contextlib.contextmanager
+    def file(self, path):
+        previous = self.current
+        record = self.current = self.files.setdefault(path, _file_record())
+        if self.memory:
+            baseline = tracemalloc.get_traced_memory()[0]
+            self._start_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] += time.perf_counter() - start
+            if self.memory:
+                record["peak_bytes"] = max(record["peak_bytes"], self._end_peak() - baseline)
+            self.current = previous
+
+    def snapshot(self):
+        return {"stages": self.stages, "files": self.files}
+
+    def merge(self, snapshot):
+        for name, other in snapshot["stages"].items():
+            stats = self._stage_stats(name)
+            for key in ("calls", "seconds", "bytes"):
+                stats[key] += other[key]
+            stats["peak_bytes"] = max(stats["peak_bytes"], other["peak_bytes"])
+        for path, other in snapshot["files"].items():
+            record = self.files.setdefault(path, _file_record())
+            record["seconds"] += other["seconds"]
+            record["bytes"] += other["bytes"]
+            record["peak_bytes"] = max(record["peak_bytes"], other["peak_bytes"])
+            for name, seconds in other["stages"].items():
+                record["stages"][name] = record["stages"].get(name, 0.0) + seconds
+
+    def report(self, top=10):
+        stages = [{"stage": name, **stats} for name, stats in self.stages.items()]
+        stages.sort(key=lambda stats: stats["seconds"], reverse=True)
+        slowest = sorted(self.files.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "json_backend": _json_backend(),
+            "peak_rss_mb": peak_rss_mb(),
+            "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "instance_files": len(self.files),
+            "stages": stages,
+            "slowest_files": [
+                {"path": path, "seconds": record["seconds"], "bytes": record["bytes"],
+                 "peak_bytes": record["peak_bytes"],
+                 **{f"{name}_seconds": seconds for name, seconds in record["stages"].items()}}
+                for path, record in slowest
+            ],
+        }
+
+
+def _file_record():
+    return {"seconds": 0.0, "bytes": 0, "peak_bytes": 0, "stages": {}}
+
+
+def _json_backend():
+    # decoders imports this module, so it is imported on first use
+    import decoders
+    return decoders.backend()
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def active():
+    return _profiler
+
+
+def stage(name):
+    if _profiler is None:
+        return _NO_STAGE
+    return _profiler.stage(name)
+
+
+def add_bytes(name, nbytes):
+    if _profiler is not None:
+        _profiler.add_bytes(name, nbytes)
+
+
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start(memory=False):
+    global _profiler
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _profiler = Profiler(memory)
+    return _profiler
+
+
+def stop():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return profiler
+
+
+def worker_options():
+    # What a worker needs to profile one instance file the same way, None when off
+    if _profiler is None:
+        return None
+    return {"memory": _profiler.memory}
+
+
+@contextlib.contextmanager
+def collecting(path, options):
+    # Profiles one instance file under a fresh profiler and yields it; the caller
+    # ships its snapshot to the main process (a no-op yielding None when off)
+    global _profiler
+    if options is None:
+        yield None
+        return
+    previous = _profiler
+    tracing = options["memory"] and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    profiler = _profiler = Profiler(**options)
+    try:
+        with profiler.file(path):
+            yield profiler
+    finally:
+        _profiler = previous
+        if tracing:
+            tracemalloc.stop()
+
+
+def merge(snapshot):
+    if _profiler is not None and snapshot is not None:
+        _profiler.merge(snapshot)
+
+
+def write_report(profiler, path, top=10):
+    # JSON report, or with a .csv path the stage table plus <name>_files.csv
+    report = profiler.report(top)
+    if path.endswith(".csv"):
+        pd.DataFrame(report["stages"]).to_csv(path, index=False)
+        files_path = os.path.splitext(path)[0] + "_files.csv"
+        pd.DataFrame(report["slowest_files"]).to_csv(files_path, index=False)
+    else:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def print_summary(report):
+    print(f"--- Profile: {report['instance_files']} files in {report['wall_seconds']:.2f}s "
+          f"({report['json_backend']} decoder), peak RSS {report['peak_rss_mb']:.0f} MB (workers {report['worker_peak_rss_mb']:.0f} MB) ---")
+    for stats in report["stages"]:
+        line = f"  {stats['stage']:15} {stats['calls']:>8} calls {stats['seconds']:9.3f}s"
+        if stats["bytes"]:
+            line += f" {stats['bytes'] / 1e6:10.1f} MB"
+        if stats["peak_bytes"]:
+            line += f"  peak {stats['peak_bytes'] / 1e6:.1f} MB"
+        print(line)
+    for record in report["slowest_files"]:
+        line = f"  {record['seconds']:9.3f}s  {record['path']}"
+        if record["peak_bytes"]:
+            line += f"  peak {record['peak_bytes'] / 1e6:.1f} MB"
+        print(line)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile", default=None, metavar="REPORT",
+        help="time each pipeline stage and write a run report to REPORT (.json, or .csv for tables)",
+    )
+    parser.add_argument(
+        "--profile-memory", action="store_true",
+        help="also record peak traced memory per stage and per instance file (tracemalloc, slows the run down)",
+    )
+    parser.add_argument(
+        "--profile-top", type=int, default=10, metavar="N",
+        help="slowest instance files to list in the report (default: 10)",
+    )
+
+
+def start_profiling(args):
+    if args.profile:
+        start(args.profile_memory)
+
+
+def finish_profiling(args):
+    profiler = stop()
+    if profiler is None:
+        return
+    report = write_report(profiler, args.profile, args.profile_top)
+    print_summary(report)
+    print(f"✅ Saved run profile to {args.profile}")
@@ -1,9 +1,19 @@
 import os
-import json
+import functools
+import argparse
 import pandas as pd
-import re
 
-BASE_DIR = "./WfInstances"
+from classifier import TaskClassifier, strip_task_suffix
+from columnar import add_columnar_argument, write_columnar
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from sharding import add_shard_arguments, open_shard
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance,
+)
+
+OUTPUT_CSV = "workflow_instances_grouped_task_mapping.csv"
 
 data = []
 
@@ -31,9 +41,8 @@ for group, keywords in task_group_map.items():
     for keyword in keywords:
         flat_task_group_map[keyword] = group
 
-def clean_and_map_task_type(task_name, workflow_system):
-    cleaned = re.sub(r'(_\d+)$', '', task_name)
-    cleaned = re.sub(r'_ID\d+$', '', cleaned)
+def normalize_task_name(task_name, workflow_system):
+    cleaned = strip_task_suffix(task_name)
 
     if workflow_system == 'nextflow' and '.' in cleaned:
         parts = cleaned.split('.')
@@ -41,17 +50,22 @@ def clean_and_map_task_type(task_name, workflow_system):
     elif workflow_system != 'nextflow' and '_' in cleaned:
         cleaned = cleaned.split('_')[0].lower()
 
-    cleaned = cleaned.lower()
-    for keyword, group in flat_task_group_map.items():
-        if keyword in cleaned:
-            return group
+    return cleaned.lower()
+
+
+task_classifier = TaskClassifier(flat_task_group_map, normalize_task_name, default='other')
+
+
+def clean_and_map_task_type(task_name, workflow_system):
+    return task_classifier.classify(task_name, workflow_system)
 
-    return 'other'
+def parse_json_file(filepath, workflow_system, streaming=False):
+    wf_data = load_instance(filepath, streaming)
 
-def parse_json_file(filepath, workflow_system):
-    with open(filepath, 'r') as f:
-        wf_data = json.load(f)
+    return parse_workflow_data(wf_data, filepath, workflow_system)
 
+
+def parse_workflow_data(wf_data, filepath, workflow_system):
     workflow_name = wf_data.get('workflowName') or wf_data.get('name') or os.path.basename(filepath).split('-')[0]
 
     num_tasks = 0
@@ -66,50 +80,96 @@ def parse_json_file(filepath, workflow_system):
 
     for task_list in task_lists:
         num_tasks += len(task_list)
-        for node in task_list:
-            raw_type = node.get('type') or node.get('name') or 'unknown_task_type'
-            group = clean_and_map_task_type(raw_type, workflow_system)
+        raw_types = [node.get('type') or node.get('name') or 'unknown_task_type' for node in task_list]
+        for group in task_classifier.classify_many(raw_types, workflow_system):
             group_counts[group] = group_counts.get(group, 0) + 1
-            raw_task_list.append(raw_type)
+        raw_task_list.extend(raw_types)
 
     return workflow_name, num_tasks, group_counts, raw_task_list
 
-rows = []
-
-for root, dirs, files in os.walk(BASE_DIR):
-    for file in files:
-        if file.endswith(".json"):
-            file_path = os.path.join(root, file)
-
-            parts = root.split(os.sep)
-            workflow_system = next((p for p in parts if p in ["nextflow", "pegasus", "swift", "makeflow", "helloworld"]), "unknown")
-
-            workflow_name, num_tasks, group_counts, raw_task_list = parse_json_file(file_path, workflow_system)
+def process_instance(file_path, streaming=False):
+    wf_data = load_instance(file_path, streaming)
+
+    return instance_row(file_path, wf_data)
+
+
+def instance_row(file_path, wf_data):
+    file = os.path.basename(file_path)
+    workflow_system = detect_workflow_system(file_path)
+
+    workflow_name, num_tasks, group_counts, raw_task_list = parse_workflow_data(wf_data, file_path, workflow_system)
+
+    if workflow_system == "unknown":
+        for system, wf_names in known_workflow_systems.items():
+            if any(wf_name.lower() in workflow_name.lower() for wf_name in wf_names):
+                workflow_system = system
+                break
+
+    row = {
+        "workflow_system": workflow_system,
+        "workflow_name": workflow_name,
+        "instance_file": file,
+        "num_tasks": num_tasks,
+        "task_groups": "; ".join(f"{k}: {v}" for k, v in group_counts.items()) if group_counts else "none"
+    }
+
+    for group in task_group_map.keys():
+        row[f"group_{group}"] = group_counts.get(group, 0)
+    row["group_other"] = group_counts.get("other", 0)
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-instance grouped task counts")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_columnar_argument(parser)
+    add_cache_arguments(parser)
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+    start_profiling(args)
+
+    rows = []
+    paths = find_instance_files(BASE_DIR)
+    shard = open_shard(args, "prueba", paths)
+
+    for path, row, error in map_instances_cached(
+        functools.partial(process_instance, streaming=args.streaming), shard.paths if shard else paths, args.workers, cache,
+        "prueba.process_instance", live_paths=paths,
+    ):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        if shard is not None:
+            shard.add(path, row=row)
+        else:
+            rows.append(row)
 
-            if workflow_system == "unknown":
-                for system, wf_names in known_workflow_systems.items():
-                    if any(wf_name.lower() in workflow_name.lower() for wf_name in wf_names):
-                        workflow_system = system
-                        break
+    close_cache(cache)
+    if shard is not None:
+        shard.close()
+    else:
+        write_dataset(rows, args.columnar)
+    finish_profiling(args)
 
-            row = {
-                "workflow_system": workflow_system,
-                "workflow_name": workflow_name,
-                "instance_file": file,
-                "num_tasks": num_tasks,
-                "task_groups": "; ".join(f"{k}: {v}" for k, v in group_counts.items()) if group_counts else "none"
-            }
 
-            for group in task_group_map.keys():
-                row[f"group_{group}"] = group_counts.get(group, 0)
-            row["group_other"] = group_counts.get("other", 0)
+def write_dataset(rows, columnar=None):
+    # Convert to DataFrame
+    with stage("dataframe"):
+        df = pd.DataFrame(rows)
+        df = df.sort_values(by=["workflow_system", "workflow_name", "instance_file"])
 
-            rows.append(row)
+    with stage("csv_write"):
+        df.to_csv(OUTPUT_CSV, index=False)
+    if columnar:
+        with stage("columnar_write"):
+            write_columnar(df, OUTPUT_CSV, columnar)
 
-# Convert to DataFrame
-df = pd.DataFrame(rows)
-df = df.sort_values(by=["workflow_system", "workflow_name", "instance_file"])
+    print(f"Dataset saved with {len(df)} rows and grouped task mappings!")
 
-df.to_csv("workflow_instances_grouped_task_mapping.csv", index=False)
 
-print(f"Dataset saved with {len(df)} rows and grouped task mappings!")
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import os
 import json
+import argparse
+import functools
 import pandas as pd
-import re
 from collections import defaultdict
 
-BASE_DIR = "./WfInstances"
-print(f"Scanning in: {BASE_DIR}")
+from classifier import TaskClassifier, strip_task_suffix
+from file_sizes import sum_resolved_file_sizes
+from execution import EXECUTION_COLUMNS, add_execution_columns, logical_dataset
+from columnar import add_columnar_argument, write_columnar
+from outofcore import OutOfCoreDataset, add_out_of_core_arguments, out_of_core_dataset
+from cache import add_cache_arguments, close_cache, file_digest, map_instances_cached, open_cache
+from stream import StreamFallback, read_top_level_value
+from sharding import add_shard_arguments, open_shard
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling, timed
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_verbose_argument, add_workers_argument, detect_workflow_system,
+    find_instance_files, load_instance,
+)
 
 main_task_mapping = {
     'fastp': 'preprocessing', 'cutadapt': 'trimming', 'trimmomatic': 'trimming', 'awk': 'filtering',
@@ -19,21 +31,46 @@ main_task_mapping = {
     'preseq': 'complexity_estimation'
 }
 
-def clean_and_map_task_type(task_name):
-    cleaned = re.sub(r'(_\d+)$', '', task_name)
-    cleaned = re.sub(r'_ID\d+$', '', cleaned)
+# The children lists only go to the columnar output, a CSV cell can't hold them usefully
+TASK_LEVEL_CSVS = [
+    ("task_level_dataset_detailed.csv", ["children"]),
+    ("task_level_dataset.csv", ["input_files", "output_files", "children"]),
+]
+LOGICAL_KEYS = ['workflow_name', 'task_category']
+# (output column, aggregation, source column) of logical_aggregation, see aggregation.py
+LOGICAL_COLUMNS = [
+    ("task_name", "first_row", "task_name"),
+    ("instance_count", "count", None),
+    ("children_count", "sum", "children_count"),
+    ("input_file_count", "sum", "input_file_count"),
+    ("total_input_file_sizes", "sum", "total_input_file_sizes"),
+    ("output_file_count", "sum", "output_file_count"),
+    ("total_output_file_sizes", "sum", "total_output_file_sizes"),
+]
+# Columns of the --summary dump; the sums of counts and sizes print as integers
+SUMMARY_COLUMNS = [
+    "workflow_name", "task_category", "task_name", "instance_count", "children_count",
+    "input_file_count", "total_input_file_sizes", "output_file_count", "total_output_file_sizes",
+]
+SUMMARY_INT_COLUMNS = ["children_count", "total_input_file_sizes", "total_output_file_sizes"]
+
+def normalize_task_name(task_name, workflow_system=None):
+    cleaned = strip_task_suffix(task_name)
     
     if '.' in cleaned:
         cleaned = cleaned.split('.')[-1]  # More precise subtask
     
-    # Match known keywords
-    for key in main_task_mapping:
-        if key in cleaned.lower():
-            return main_task_mapping[key]
-    
     return cleaned.lower()
 
 
+# Match known keywords
+task_classifier = TaskClassifier(main_task_mapping, normalize_task_name)
+
+
+def clean_and_map_task_type(task_name):
+    return task_classifier.classify(task_name)
+
+
 def get_file_size(file_path, size_lookup):
     basename = os.path.basename(file_path)
     return (
@@ -43,6 +80,7 @@ def get_file_size(file_path, size_lookup):
         or 0
     )
 
+@timed("size_lookup")
 def build_file_size_lookup(data):
     file_size_lookup = {}
 
@@ -72,18 +110,21 @@ def build_file_size_lookup(data):
 
     return file_size_lookup
 
-def extract_task_info(filepath):
-    with open(filepath, "r") as f:
-        data = json.load(f)
+def extract_task_info(filepath, streaming=False):
+    data = load_instance(filepath, streaming)
+
+    return task_rows(data, filepath)
 
+
+def task_rows(data, filepath):
     workflow_name = data.get("name", os.path.basename(filepath))
     tasks = data.get("workflow", {}).get("specification", {}).get("tasks", [])
     file_sizes = build_file_size_lookup(data)
+    task_categories = task_classifier.classify_many([task.get("name") for task in tasks])
 
     rows = []
-    for task in tasks:
+    for task, task_category in zip(tasks, task_categories):
         task_name = task.get("name")
-        task_category = clean_and_map_task_type(task_name)
         children = task.get("children", [])
         if not isinstance(children, list):
             print(f"⚠ Task {task_name} has malformed children: {children}")
@@ -92,20 +133,7 @@ def extract_task_info(filepath):
         input_files = task.get("inputFiles", [])
         output_files = task.get("outputFiles", [])
 
-        seen_input = set()
-        input_size = sum(
-            get_file_size(f, file_sizes)
-            for f in input_files
-            if f and f.lower() != "none" and os.path.basename(f) not in seen_input and not seen_input.add(os.path.basename(f))
-        )
-
-        seen_output = set()
-        output_size = sum(
-            get_file_size(f, file_sizes)
-            for f in output_files
-            if f and f.lower() != "none" and os.path.basename(f) not in seen_output and not seen_output.add(os.path.basename(f))
-        )
-
+        # Sizes are filled in below for the whole instance at once
         row = {
             "workflow_name": workflow_name,
             "task_name": task_name,
@@ -113,75 +141,232 @@ def extract_task_info(filepath):
             "instance_count": 1,
             "children_count": len(children),
             "input_file_count": len(input_files),
-            "total_input_file_sizes": input_size,
+            "total_input_file_sizes": 0,
             "output_file_count": len(output_files),
-            "total_output_file_sizes": output_size,
+            "total_output_file_sizes": 0,
+            **dict.fromkeys(EXECUTION_COLUMNS),
             "input_files": input_files,
-            "output_files": output_files
+            "output_files": output_files,
+            "children": children
         }
 
         rows.append(row)
 
+    input_sizes = sum_resolved_file_sizes([row["input_files"] for row in rows], file_sizes)
+    output_sizes = sum_resolved_file_sizes([row["output_files"] for row in rows], file_sizes)
+    for row, input_size, output_size in zip(rows, input_sizes, output_sizes):
+        row["total_input_file_sizes"] = input_size
+        row["total_output_file_sizes"] = output_size
+    add_execution_columns(rows, data, [task.get("id") for task in tasks])
+
     return rows
 
-# MAIN EXECUTION
-all_rows = []
-seen_workflows = set()
-
-for root, _, files in os.walk(BASE_DIR):
-    for file in files:
-        if file.endswith(".json"):
-            path = os.path.join(root, file)
-            try:
-                rows = extract_task_info(path)
-                if rows:
-                    wf_name = rows[0]["workflow_name"]
-                    if wf_name not in seen_workflows:
-                        all_rows.extend(rows)
-                        seen_workflows.add(wf_name)
-                        print(f"✔ Included workflow: {wf_name}")
-                    else:
-                        print(f"⏩ Skipped duplicate workflow: {wf_name}")
-            except Exception as e:
-                print(f"✖ Error processing {path}: {e}")
-
-# Task-level DataFrame
-task_level_df = pd.DataFrame(all_rows)
-
-if task_level_df.empty:
-    print("⚠ No tasks found — check input data or paths.")
-else:
-    task_level_df.to_csv("task_level_dataset_detailed.csv", index=False)
-    simplified_df = task_level_df.drop(columns=["input_files", "output_files"], errors='ignore')
-    simplified_df.to_csv("task_level_dataset.csv", index=False)
-
-    # Aggregation
-    grouped = []
-    for (workflow, category), group in task_level_df.groupby(['workflow_name', 'task_category']):
-        instance_count = len(group)
-        row = {
-            "workflow_name": workflow,
-            "task_category": category,
-            "task_name": group['task_name'].iloc[0],
-            "instance_count": instance_count,
-            "children_count": group['children_count'].sum(),
-            "input_file_count": group['input_file_count'].sum(),
-            "total_input_file_sizes": group['total_input_file_sizes'].sum(),
-            "output_file_count": group['output_file_count'].sum(),
-            "total_output_file_sizes": group['total_output_file_sizes'].sum()
-        }
-        grouped.append(row)
+def dedupe_key(path, dedupe):
+    # Cheap identity of an instance, read before parsing it: the top-level name
+    # (what task_rows uses as workflow_name) or a hash of the file's bytes
+    if dedupe == "content":
+        return ("content", file_digest(path))
+    try:
+        name = read_top_level_value(path, "name", os.path.basename(path))
+    except (StreamFallback, OSError, ValueError):
+        return ("path", path)
+    if not isinstance(name, (str, int, float, type(None))):
+        return ("path", path)
+    return ("name", name)
 
-    logical_tasks = pd.DataFrame(grouped)
-    logical_tasks.to_csv("logical_task_dataset.csv", index=False)
 
-    print("\n--- LOGICAL TASK SUMMARY (CSV-style) ---")
-    for _, row in logical_tasks.iterrows():
-        print(f"{row['workflow_name']},{row['task_category']},{row['task_name']},"
-              f"{row['instance_count']},{int(row['children_count'])},"
-              f"{row['input_file_count']},{int(row['total_input_file_sizes'])},"
-              f"{row['output_file_count']},{int(row['total_output_file_sizes'])}")
+def extract_unique(func, paths, dedupe="name", workers=1, cache=None):
+    # Returns {path: (rows, error)} for the parsed files, and the key of every file
+    keys = {path: dedupe_key(path, dedupe) for path in paths}
+    results = {path: (rows, error) for path, rows, error in iter_unique(func, paths, keys, workers, cache)}
+    return results, keys
+
 
-    print(f"✅ Saved task-level dataset with {len(task_level_df)} tasks to task_level_dataset.csv")
+def skipped_message(path, key):
+    kind, key = key
+    label = f"workflow: {key}" if kind == "name" else f"content: {path}"
+    return f"⏩ Skipped duplicate {label}"
+
+
+def iter_unique(func, paths, keys, workers=1, cache=None, live_paths=None):
+    # Parses only the first instance of each dedupe key; if it fails or has no tasks
+    # the next one with that key is tried, as the full scan would have included it.
+    # Yields (path, rows, error) in path order, except for those retried instances.
+    position = {path: i for i, path in enumerate(paths)}
+    queues = {}
+    for path in paths:
+        queues.setdefault(keys[path], []).append(path)
+    for queue in queues.values():
+        queue.reverse()
+
+    candidates = [queue.pop() for queue in queues.values()]
+    while candidates:
+        candidates.sort(key=position.get)
+        retry = []
+        for path, rows, error in map_instances_cached(
+            func, candidates, workers, cache, "prueba2.extract_task_info",
+            live_paths=paths if live_paths is None else live_paths,
+        ):
+            yield path, rows, error
+            queue = queues[keys[path]]
+            if (error is not None or not rows) and queue:
+                retry.append(queue.pop())
+        candidates = retry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task-level and logical task datasets")
+    parser.add_argument(
+        "--dedupe", choices=["name", "content"], default="name",
+        help="keep the first instance per workflow name (default) or per identical file content; "
+             "duplicates are detected from the file header or hash and never parsed",
+    )
+    parser.add_argument(
+        "--summary", action="store_true",
+        help="print every logical task as a CSV-style line after writing the datasets",
+    )
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_columnar_argument(parser)
+    add_cache_arguments(parser)
+    add_out_of_core_arguments(parser)
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
+    add_verbose_argument(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+    start_profiling(args)
+
+    print(f"Scanning in: {BASE_DIR}")
+
+    seen_workflows = set()
+    workflow_systems = {}
+    all_rows = out_of_core_dataset(
+        args, TASK_LEVEL_CSVS, "task_level_dataset_detailed.csv", LOGICAL_KEYS, LOGICAL_COLUMNS, workflow_systems
+    )
+
+    all_paths = paths = find_instance_files(BASE_DIR)
+    shard = open_shard(args, "prueba2", paths, (LOGICAL_KEYS, LOGICAL_COLUMNS), {"dedupe": args.dedupe})
+    if shard is not None:
+        # Duplicates across shards are resolved by merge_shards.py
+        paths = shard.paths
+    func = functools.partial(extract_task_info, streaming=args.streaming)
+    if args.out_of_core or shard is not None:
+        # Rows are added as instances are parsed rather than collected first
+        keys = {path: dedupe_key(path, args.dedupe) for path in paths}
+        parsed = iter_unique(func, paths, keys, args.workers, cache, live_paths=all_paths)
+    else:
+        with stage("dedupe"):
+            results, keys = extract_unique(func, paths, args.dedupe, args.workers, cache)
+        parsed = ((path, *results[path]) if path in results else (path, None, None) for path in paths)
+    seen_paths = set()
+    for path, rows, error in parsed:
+        if rows is None and error is None:
+            if args.verbose:
+                print(skipped_message(path, keys[path]))
+            continue
+        seen_paths.add(path)
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        if rows and shard is not None:
+            shard.add(path, rows=rows, key=keys[path])
+        elif rows:
+            wf_name = rows[0]["workflow_name"]
+            if args.dedupe == "content":
+                all_rows.extend(rows)
+                workflow_systems.setdefault(wf_name, detect_workflow_system(path))
+                if args.verbose:
+                    print(f"✔ Included workflow: {wf_name}")
+            elif add_workflow_rows(rows, all_rows, seen_workflows):
+                workflow_systems[wf_name] = detect_workflow_system(path)
+                if args.verbose:
+                    print(f"✔ Included workflow: {wf_name}")
+            elif args.verbose:
+                print(f"⏩ Skipped duplicate workflow: {wf_name}")
+
+    skipped = len(paths) - len(seen_paths)
+    if args.out_of_core and args.verbose:
+        for path in paths:
+            if path not in seen_paths:
+                print(skipped_message(path, keys[path]))
+    close_cache(cache)
+    print(f"Parsed {len(seen_paths)} of {len(paths)} instance files, {skipped} skipped as duplicates before parsing")
+    if shard is not None:
+        shard.close()
+    else:
+        write_datasets(all_rows, args.columnar, workflow_systems, args.summary)
+    finish_profiling(args)
+
+
+def add_workflow_rows(rows, all_rows, seen_workflows):
+    # Only the first instance of each workflow name makes it into the dataset
+    wf_name = rows[0]["workflow_name"]
+    if wf_name in seen_workflows:
+        return False
+    all_rows.extend(rows)
+    seen_workflows.add(wf_name)
+    return True
+
+
+def write_datasets(all_rows, columnar=None, workflow_systems=None, summary=False):
+    systems = workflow_systems or {}
+    if isinstance(all_rows, OutOfCoreDataset):
+        # The task-level rows were written while parsing
+        task_count = all_rows.close()
+        logical_tasks = all_rows.logical_tasks() if task_count else None
+    else:
+        # Task-level DataFrame
+        with stage("dataframe"):
+            task_level_df = pd.DataFrame(all_rows)
+        task_count = len(task_level_df)
+        if task_count:
+            with stage("csv_write"):
+                for path, dropped in TASK_LEVEL_CSVS:
+                    task_level_df.drop(columns=dropped, errors='ignore').to_csv(path, index=False)
+
+            # Aggregation
+            with stage("groupby"):
+                logical_tasks = logical_aggregation(task_level_df)
+
+            if columnar:
+                with stage("columnar_write"):
+                    task_level_df.insert(0, "workflow_system", task_level_df["workflow_name"].map(systems).fillna("unknown"))
+                    write_columnar(task_level_df, "task_level_dataset_detailed.csv", columnar)
+
+    if not task_count:
+        print("⚠ No tasks found — check input data or paths.")
+        return
+
+    with stage("csv_write"):
+        logical_tasks.to_csv("logical_task_dataset.csv", index=False)
+    if columnar:
+        with stage("columnar_write"):
+            logical_tasks.insert(0, "workflow_system", logical_tasks["workflow_name"].map(systems).fillna("unknown"))
+            write_columnar(logical_tasks, "logical_task_dataset.csv", columnar)
+
+    if summary:
+        print_summary(logical_tasks)
+
+    print(f"✅ Saved task-level dataset with {task_count} tasks to task_level_dataset.csv")
     print(f"✅ Saved detailed task-level dataset to task_level_dataset_detailed.csv")
     print(f"✅ Saved logical task aggregation with {len(logical_tasks)} entries to logical_task_dataset.csv")
+
+
+def logical_aggregation(task_level_df):
+    return logical_dataset(task_level_df, LOGICAL_KEYS, LOGICAL_COLUMNS)
+
+
+def print_summary(logical_tasks):
+    print("\n--- LOGICAL TASK SUMMARY (CSV-style) ---")
+    columns = [logical_tasks[column].astype(str) for column in SUMMARY_COLUMNS]
+    for column in SUMMARY_INT_COLUMNS:
+        columns[SUMMARY_COLUMNS.index(column)] = logical_tasks[column].astype("int64").astype(str)
+    lines = columns[0]
+    for column in columns[1:]:
+        lines = lines + "," + column
+    print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
 import os
-import json
+import argparse
+import functools
 import pandas as pd
-import re
 from collections import defaultdict
 
-BASE_DIR = "./WfInstances"
+from classifier import TaskClassifier, strip_task_suffix
+from file_sizes import sum_basename_file_sizes
+from execution import add_execution_columns, logical_dataset
+from columnar import add_columnar_argument, write_columnar
+from outofcore import OutOfCoreDataset, add_out_of_core_arguments, out_of_core_dataset
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from sharding import add_shard_arguments, open_shard
+from profiling import add_profile_arguments, finish_profiling, stage, start_profiling, timed
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_verbose_argument, add_workers_argument, detect_workflow_system,
+    find_instance_files, load_instance,
+)
 
 main_task_mapping = {
     'fastp': 'preprocessing', 'cutadapt': 'trimming', 'trimmomatic': 'trimming', 'awk': 'filtering',
@@ -18,19 +29,34 @@ main_task_mapping = {
     'preseq': 'complexity_estimation'
 }
 
-def clean_and_map_task_type(task_name):
-    cleaned = re.sub(r'(_\d+)$', '', task_name)
-    cleaned = re.sub(r'_ID\d+$', '', cleaned)
+TASK_LEVEL_CSV = "task_level_dataset_prueba3.csv"
+LOGICAL_KEYS = ['workflow_name', 'task_category']
+# (output column, aggregation, source column) of logical_aggregation, see aggregation.py
+LOGICAL_COLUMNS = [
+    ("task_name", "first", "task_name"),
+    ("instance_count", "max", "instance_count"),
+    ("children_count", "mean", "children_count"),
+    ("input_file_count", "sum", "input_file_count"),
+    ("total_input_file_sizes", "sum", "total_input_file_sizes"),
+    ("output_file_count", "sum", "output_file_count"),
+    ("total_output_file_sizes", "sum", "total_output_file_sizes"),
+]
+
+def normalize_task_name(task_name, workflow_system=None):
+    cleaned = strip_task_suffix(task_name)
     if '.' in cleaned:
         parts = cleaned.split('.')
         cleaned = parts[-2] if len(parts) > 1 else parts[-1]
     else:
         cleaned = cleaned.split('_')[0]
-    for key in main_task_mapping:
-        if key in cleaned.lower():
-            return main_task_mapping[key]
     return cleaned.lower()
 
+task_classifier = TaskClassifier(main_task_mapping, normalize_task_name)
+
+def clean_and_map_task_type(task_name):
+    return task_classifier.classify(task_name)
+
+@timed("size_lookup")
 def build_file_size_lookup(data):
     file_size_lookup = {}
     if isinstance(data, dict) and "workflow" in data:
@@ -44,10 +70,13 @@ def build_file_size_lookup(data):
                         file_size_lookup[filename] = file_entry["sizeInBytes"]
     return file_size_lookup
 
-def extract_task_info(filepath):
-    with open(filepath, 'r') as f:
-        data = json.load(f)
+def extract_task_info(filepath, streaming=False):
+    data = load_instance(filepath, streaming)
+
+    return task_rows(data, filepath)
+
 
+def task_rows(data, filepath):
     workflow_name = data.get('workflowName') or data.get('name') or os.path.basename(filepath).split('-')[0]
     if 'workflow' in data:
         workflow_name = data['workflow'].get('name', workflow_name)
@@ -62,36 +91,27 @@ def extract_task_info(filepath):
         if 'tasks' in spec:
             nodes = spec['tasks']
 
+    nodes = [node for node in nodes if isinstance(node, dict)]
+    task_names = [node.get('type') or node.get('name') or node.get('id') or 'unknown_task' for node in nodes]
+    task_categories = task_classifier.classify_many(task_names)
+
     task_type_counts = defaultdict(int)
     rows = []
 
-    for node in nodes:
-        if not isinstance(node, dict):
-            continue
-        task_name = node.get('type') or node.get('name') or node.get('id') or 'unknown_task'
-        task_category = clean_and_map_task_type(task_name)
+    for task_category in task_categories:
         task_type_counts[task_category] += 1
 
-    for node in nodes:
-        if not isinstance(node, dict):
-            continue
-        task_name = node.get('type') or node.get('name') or node.get('id') or 'unknown_task'
-        task_category = clean_and_map_task_type(task_name)
+    all_input_files = [node.get('inputFiles', []) for node in nodes]
+    all_output_files = [node.get('outputFiles', []) for node in nodes]
+    input_sizes = sum_basename_file_sizes(all_input_files, file_size_lookup)
+    output_sizes = sum_basename_file_sizes(all_output_files, file_size_lookup)
 
-        input_files = node.get('inputFiles', [])
-        output_files = node.get('outputFiles', [])
+    for i, (node, task_name, task_category) in enumerate(zip(nodes, task_names, task_categories)):
+        input_files = all_input_files[i]
+        output_files = all_output_files[i]
         children = node.get('children', []) if 'children' in node else []
-
-        def compute_size(files):
-            size = 0
-            for f in files:
-                if isinstance(f, str):
-                    fname = os.path.basename(f)
-                    size += file_size_lookup.get(fname, 0)
-            return size
-
-        input_size = compute_size(input_files)
-        output_size = compute_size(output_files)
+        input_size = input_sizes[i]
+        output_size = output_sizes[i]
 
         row = {
             "workflow_name": workflow_name,
@@ -106,46 +126,96 @@ def extract_task_info(filepath):
         }
         rows.append(row)
 
+    add_execution_columns(rows, data, [node.get('id') for node in nodes])
     return rows
 
-# MAIN SCRIPT
-all_rows = []
-for root, _, files in os.walk(BASE_DIR):
-    for file in files:
-        if file.endswith(".json"):
-            path = os.path.join(root, file)
+def main():
+    parser = argparse.ArgumentParser(description="Task-level dataset with per-category instance counts")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_columnar_argument(parser)
+    add_cache_arguments(parser)
+    add_out_of_core_arguments(parser)
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
+    add_verbose_argument(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+    start_profiling(args)
+
+    workflow_systems = {}
+    all_rows = out_of_core_dataset(
+        args, [(TASK_LEVEL_CSV, [])], TASK_LEVEL_CSV, LOGICAL_KEYS, LOGICAL_COLUMNS, workflow_systems
+    )
+    paths = find_instance_files(BASE_DIR)
+    shard = open_shard(args, "prueba3", paths, (LOGICAL_KEYS, LOGICAL_COLUMNS))
+    for path, rows, error in map_instances_cached(
+        functools.partial(extract_task_info, streaming=args.streaming), shard.paths if shard else paths, args.workers,
+        cache, "prueba3.extract_task_info", live_paths=paths,
+    ):
+        if args.verbose:
             print(f"Processing: {path}")
-            try:
-                rows = extract_task_info(path)
-                print(f"  → Extracted {len(rows)} tasks")
-                all_rows.extend(rows)
-            except Exception as e:
-                print(f"  ✖ Failed to process {path}: {e}")
-
-task_level_df = pd.DataFrame(all_rows)
-
-if task_level_df.empty:
-    print("⚠ No tasks found.")
-else:
-    task_level_df.to_csv("task_level_dataset_prueba3.csv", index=False)
-
-    # ✅ Fixed aggregation using accurate file sizes
-    logical_tasks = task_level_df.groupby(['workflow_name', 'task_category']).agg({
-        'task_name': 'first',
-        'instance_count': 'max',
-        'children_count': 'mean',
-        'input_file_count': 'sum',
-        'total_input_file_sizes': 'sum',
-        'output_file_count': 'sum',
-        'total_output_file_sizes': 'sum'
-    }).reset_index()
-
-    logical_tasks.rename(columns={
-        "total_input_file_sizes": "total_input_file_sizes",
-        "total_output_file_sizes": "total_output_file_sizes"
-    }, inplace=True)
-
-    logical_tasks.to_csv("logical_task_dataset_prueba3.csv", index=False)
-
-    print(f"✅ Saved task-level dataset with {len(task_level_df)} tasks to task_level_dataset.csv")
+        if error is not None:
+            print(f"  ✖ Failed to process {path}: {error}")
+            continue
+        if args.verbose:
+            print(f"  → Extracted {len(rows)} tasks")
+        if shard is not None:
+            if rows:
+                shard.add(path, rows=rows)
+            continue
+        all_rows.extend(rows)
+        if rows:
+            workflow_systems.setdefault(rows[0]["workflow_name"], detect_workflow_system(path))
+
+    close_cache(cache)
+    if shard is not None:
+        shard.close()
+    else:
+        write_datasets(all_rows, args.columnar, workflow_systems)
+    finish_profiling(args)
+
+
+def write_datasets(all_rows, columnar=None, workflow_systems=None):
+    systems = workflow_systems or {}
+    if isinstance(all_rows, OutOfCoreDataset):
+        # The task-level rows were written while parsing
+        task_count = all_rows.close()
+        logical_tasks = all_rows.logical_tasks() if task_count else None
+    else:
+        with stage("dataframe"):
+            task_level_df = pd.DataFrame(all_rows)
+        task_count = len(task_level_df)
+        if task_count:
+            with stage("csv_write"):
+                task_level_df.to_csv(TASK_LEVEL_CSV, index=False)
+
+            with stage("groupby"):
+                logical_tasks = logical_aggregation(task_level_df)
+
+            if columnar:
+                with stage("columnar_write"):
+                    task_level_df.insert(0, "workflow_system", task_level_df["workflow_name"].map(systems).fillna("unknown"))
+                    write_columnar(task_level_df, TASK_LEVEL_CSV, columnar)
+
+    if not task_count:
+        print("⚠ No tasks found.")
+        return
+
+    with stage("csv_write"):
+        logical_tasks.to_csv("logical_task_dataset_prueba3.csv", index=False)
+    if columnar:
+        with stage("columnar_write"):
+            logical_tasks.insert(0, "workflow_system", logical_tasks["workflow_name"].map(systems).fillna("unknown"))
+            write_columnar(logical_tasks, "logical_task_dataset_prueba3.csv", columnar)
+
+    print(f"✅ Saved task-level dataset with {task_count} tasks to task_level_dataset.csv")
     print(f"✅ Saved logical task aggregation with {len(logical_tasks)} logical tasks to logical_task_dataset.csv")
+
+
+def logical_aggregation(task_level_df):
+    return logical_dataset(task_level_df, LOGICAL_KEYS, LOGICAL_COLUMNS)
+
+
+if __name__ == "__main__":
+    main()
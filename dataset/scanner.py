@@ -0,0 +1,170 @@
+import argparse
+import functools
+
+import extractor
+import prueba
+import prueba2
+import prueba3
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from columnar import add_columnar_argument
+from profiling import add_profile_arguments, finish_profiling, start_profiling
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance,
+)
+
+
+# An emitter turns one decoded instance into a partial result (in whichever process
+# decoded it) and folds the partials into its datasets (in the main process).
+# The partials reuse the per-instance functions of the original scripts, so every
+# output is the same as running that script on its own.
+
+class TaskTypesEmitter:
+    name = "task_types"
+    outputs = [extractor.OUTPUT_CSV]
+
+    def __init__(self):
+        self.rows = []
+
+    @staticmethod
+    def extract(path, data):
+        return extractor.instance_row(path, data)
+
+    def add(self, path, row):
+        self.rows.append(row)
+
+    def write(self, columnar=None):
+        extractor.write_dataset(self.rows, columnar)
+
+
+class TaskGroupsEmitter:
+    name = "task_groups"
+    outputs = [prueba.OUTPUT_CSV]
+
+    def __init__(self):
+        self.rows = []
+
+    @staticmethod
+    def extract(path, data):
+        return prueba.instance_row(path, data)
+
+    def add(self, path, row):
+        self.rows.append(row)
+
+    def write(self, columnar=None):
+        prueba.write_dataset(self.rows, columnar)
+
+
+class LogicalTasksEmitter:
+    name = "logical_tasks"
+    outputs = ["task_level_dataset.csv", "task_level_dataset_detailed.csv", "logical_task_dataset.csv"]
+
+    def __init__(self):
+        self.all_rows = []
+        self.seen_workflows = set()
+        self.workflow_systems = {}
+
+    @staticmethod
+    def extract(path, data):
+        return prueba2.task_rows(data, path)
+
+    def add(self, path, rows):
+        if rows and prueba2.add_workflow_rows(rows, self.all_rows, self.seen_workflows):
+            self.workflow_systems[rows[0]["workflow_name"]] = detect_workflow_system(path)
+
+    def write(self, columnar=None):
+        prueba2.write_datasets(self.all_rows, columnar, self.workflow_systems)
+
+
+class CategoryCountsEmitter:
+    name = "category_counts"
+    outputs = ["task_level_dataset_prueba3.csv", "logical_task_dataset_prueba3.csv"]
+
+    def __init__(self):
+        self.all_rows = []
+        self.workflow_systems = {}
+
+    @staticmethod
+    def extract(path, data):
+        return prueba3.task_rows(data, path)
+
+    def add(self, path, rows):
+        self.all_rows.extend(rows)
+        if rows:
+            self.workflow_systems.setdefault(rows[0]["workflow_name"], detect_workflow_system(path))
+
+    def write(self, columnar=None):
+        prueba3.write_datasets(self.all_rows, columnar, self.workflow_systems)
+
+
+EMITTERS = {
+    emitter.name: emitter
+    for emitter in (TaskTypesEmitter, TaskGroupsEmitter, LogicalTasksEmitter, CategoryCountsEmitter)
+}
+
+
+def scan_instance(path, names, streaming=False):
+    data = load_instance(path, streaming)
+
+    # One emitter failing on a file must not drop it from the others, same as the separate scripts
+    partials = {}
+    for name in names:
+        try:
+            partials[name] = (EMITTERS[name].extract(path, data), None)
+        except Exception as e:
+            partials[name] = (None, str(e))
+    return partials
+
+
+def scan(names, paths, workers=1, cache=None, streaming=False):
+    emitters = [EMITTERS[name]() for name in names]
+    func = functools.partial(scan_instance, names=tuple(names), streaming=streaming)
+    stage = "scanner:" + ",".join(names)
+
+    for path, partials, error in map_instances_cached(func, paths, workers, cache, stage):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        for emitter in emitters:
+            result, emitter_error = partials[emitter.name]
+            if emitter_error is not None:
+                print(f"✖ {emitter.name}: error processing {path}: {emitter_error}")
+                continue
+            emitter.add(path, result)
+
+    return emitters
+
+
+def parse_outputs(value):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EMITTERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown output(s): {', '.join(unknown)}")
+    return names
+
+
+def main():
+    outputs_help = "; ".join(f"{name}: {', '.join(emitter.outputs)}" for name, emitter in EMITTERS.items())
+    parser = argparse.ArgumentParser(description="Build every dataset from a single pass over the instances")
+    parser.add_argument(
+        "--outputs", type=parse_outputs, default=list(EMITTERS),
+        help=f"comma-separated datasets to build (default: all). {outputs_help}",
+    )
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_columnar_argument(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+    start_profiling(args)
+
+    emitters = scan(args.outputs, find_instance_files(BASE_DIR), args.workers, cache, args.streaming)
+    close_cache(cache)
+    for emitter in emitters:
+        emitter.write(args.columnar)
+    finish_profiling(args)
+
+
+if __name__ == "__main__":
+    main()
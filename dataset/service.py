@@ -0,0 +1,417 @@
+import os
+import re
+import json
+import stat
+import time
+import socket
+import argparse
+import functools
+import threading
+import http.client
+import socketserver
+from urllib.parse import parse_qs, urlencode, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from archives import stat_instance
+from corpus import COUNT_COLUMNS, CorpusBuilder, extract_instance_columns
+from ingest import BASE_DIR, add_streaming_argument, add_workers_argument, find_instance_files, map_instances
+
+# Query service over the task corpus (corpus.WorkflowCorpus), loaded once and kept in
+# memory with inverted indexes from task category to tasks and from workflow system and
+# workflow name to instances. Filters and aggregates are answered from the indexes and
+# the task columns, without touching WfInstances; POST /reload re-extracts only the
+# instance files that were added or changed since the last load.
+#
+#   python dataset/service.py serve --port 8765 &
+#   python dataset/service.py query instances category=alignment min_input_bytes=1GB
+#   python dataset/service.py query aggregate by=task_category workflow_prefix=1000genome
+#   python dataset/service.py query reload
+#
+# Endpoints (GET, filters as query parameters, JSON responses): /stats, /instances,
+# /tasks (up to limit=N rows) and /aggregate (by=, sort=, top=); POST /reload.
+
+DEFAULT_PORT = 8765
+
+# Filters on what a task belongs to; repeating one (category=qc&category=alignment) matches any of the values
+INDEX_FILTERS = ("category", "system", "workflow", "workflow_prefix", "instance")
+# Filters on the file bytes of each task; None is input plus output
+BYTE_FILTERS = {
+    "min_input_bytes": ("total_input_file_sizes", np.greater_equal),
+    "max_input_bytes": ("total_input_file_sizes", np.less_equal),
+    "min_output_bytes": ("total_output_file_sizes", np.greater_equal),
+    "max_output_bytes": ("total_output_file_sizes", np.less_equal),
+    "min_bytes": (None, np.greater_equal),
+    "max_bytes": (None, np.less_equal),
+}
+GROUP_KEYS = ("task_category", "task_name", "workflow_name", "workflow_system", "instance_file")
+AGGREGATES = ("tasks", "instances", "input_bytes", "output_bytes", "bytes")
+UNITS = {"": 1, "K": 10 ** 3, "M": 10 ** 6, "G": 10 ** 9, "T": 10 ** 12}
+
+
+def parse_bytes(value):
+    # 1500, 1e9, 2.5GB, 100M
+    match = re.fullmatch(r"\s*([0-9.eE+-]+)\s*([KMGT]?)B?\s*", value, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"not a byte count: {value!r}")
+    return float(match.group(1)) * UNITS[match.group(2).upper()]
+
+
+def _inverted(codes, n):
+    # Positions of each code in ascending order: those of code c are
+    # positions[offsets[c]:offsets[c + 1]]
+    positions = np.argsort(codes, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=n), out=offsets[1:])
+    return offsets, positions
+
+
+def _ranges(starts, lengths):
+    # Concatenation of range(start, start + length) for each pair
+    total = int(lengths.sum())
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+
+class CorpusIndex:
+    def __init__(self, corpus, paths):
+        self.corpus = corpus
+        self.paths = paths
+        columns, instances, tables = corpus.columns, corpus.instances, corpus.tables
+        # Tasks of an instance are contiguous: those of instance i are instance_offsets[i]:instance_offsets[i + 1]
+        self.instance_offsets = np.zeros(corpus.n_instances + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns["instance"], minlength=corpus.n_instances), out=self.instance_offsets[1:])
+        self.category_tasks = _inverted(columns["task_category"], len(tables["task_category"]))
+        self.system_instances = _inverted(instances["workflow_system"], len(tables["workflow_system"]))
+        self.workflow_instances = _inverted(instances["workflow_name"], len(tables["workflow_name"]))
+        self.codes = {name: {value: code for code, value in enumerate(table)} for name, table in tables.items()}
+        self.task_bytes = columns["total_input_file_sizes"] + columns["total_output_file_sizes"]
+
+    def _lookup(self, inverted, codes):
+        offsets, positions = inverted
+        codes = np.array(sorted(codes), dtype=np.int64)
+        return np.sort(positions[_ranges(offsets[codes], offsets[codes + 1] - offsets[codes])])
+
+    def instance_tasks(self, instances):
+        instances = np.asarray(instances, dtype=np.int64)
+        starts = self.instance_offsets[instances]
+        return _ranges(starts, self.instance_offsets[instances + 1] - starts)
+
+    def select(self, filters):
+        # Sorted positions of the tasks that pass all filters ({name: [values]})
+        tables = self.corpus.tables
+        tasks = None
+        instances = None
+
+        def narrow(current, found):
+            return found if current is None else np.intersect1d(current, found, assume_unique=True)
+
+        for name, values in filters.items():
+            if name == "category":
+                codes = [self.codes["task_category"][v] for v in values if v in self.codes["task_category"]]
+                tasks = narrow(tasks, self._lookup(self.category_tasks, codes))
+            elif name == "system":
+                codes = [self.codes["workflow_system"][v] for v in values if v in self.codes["workflow_system"]]
+                instances = narrow(instances, self._lookup(self.system_instances, codes))
+            elif name in ("workflow", "workflow_prefix"):
+                if name == "workflow":
+                    codes = [self.codes["workflow_name"][v] for v in values if v in self.codes["workflow_name"]]
+                else:
+                    prefixes = tuple(v.lower() for v in values)
+                    codes = [code for code, value in enumerate(tables["workflow_name"])
+                             if str(value).lower().startswith(prefixes)]
+                instances = narrow(instances, self._lookup(self.workflow_instances, codes))
+            elif name == "instance":
+                files = self.corpus.instances["instance_file"]
+                instances = narrow(instances, np.flatnonzero(np.isin(files, values)))
+            elif name not in BYTE_FILTERS:
+                raise ValueError(f"unknown filter {name!r}")
+
+        if instances is not None:
+            tasks = narrow(tasks, self.instance_tasks(instances))
+        if tasks is None:
+            tasks = np.arange(self.corpus.n_tasks)
+        for name, values in filters.items():
+            if name in BYTE_FILTERS:
+                column, compare = BYTE_FILTERS[name]
+                task_values = self.task_bytes if column is None else self.corpus.columns[column]
+                for value in values:
+                    tasks = tasks[compare(task_values[tasks], parse_bytes(value))]
+        return tasks
+
+    def group_codes(self, key, tasks):
+        # Group code of each task and the values the codes stand for
+        columns, instances, tables = self.corpus.columns, self.corpus.instances, self.corpus.tables
+        if key in ("task_category", "task_name"):
+            return columns[key][tasks].astype(np.int64), tables[key]
+        instance = columns["instance"][tasks].astype(np.int64)
+        if key == "instance_file":
+            return instance, instances["instance_file"]
+        return instances[key][instance].astype(np.int64), tables[key]
+
+    def aggregate(self, tasks, by="task_category"):
+        if by not in GROUP_KEYS:
+            raise ValueError(f"cannot group by {by!r} (choose from {', '.join(GROUP_KEYS)})")
+        codes, values = self.group_codes(by, tasks)
+        n = len(values)
+        columns = self.corpus.columns
+        input_bytes = columns["total_input_file_sizes"][tasks]
+        output_bytes = columns["total_output_file_sizes"][tasks]
+        instance = columns["instance"][tasks].astype(np.int64)
+        pairs = np.unique(codes * max(self.corpus.n_instances, 1) + instance)
+        frame = pd.DataFrame({
+            by: pd.Series(values, dtype=object),
+            "tasks": np.bincount(codes, minlength=n),
+            "instances": np.bincount(pairs // max(self.corpus.n_instances, 1), minlength=n),
+            "input_bytes": np.bincount(codes, weights=input_bytes, minlength=n).astype(np.int64),
+            "output_bytes": np.bincount(codes, weights=output_bytes, minlength=n).astype(np.int64),
+        })
+        frame["bytes"] = frame["input_bytes"] + frame["output_bytes"]
+        return frame[frame["tasks"] > 0]
+
+    def instance_rows(self, tasks):
+        frame = self.aggregate(tasks, "instance_file").drop(columns="instances")
+        positions = frame.index.to_numpy()
+        instances, tables = self.corpus.instances, self.corpus.tables
+        frame.insert(0, "workflow_system", [tables["workflow_system"][c] for c in instances["workflow_system"][positions]])
+        frame.insert(1, "workflow_name", [tables["workflow_name"][c] for c in instances["workflow_name"][positions]])
+        frame["path"] = [self.paths[i] for i in positions]
+        return frame.rename(columns={"tasks": "matching_tasks", "bytes": "matching_bytes"})
+
+    def task_rows(self, tasks):
+        # The rows of to_frame() at these positions, built from those tasks only
+        columns, instances, tables = self.corpus.columns, self.corpus.instances, self.corpus.tables
+        instance = columns["instance"][tasks].astype(np.int64)
+        frame = {
+            "workflow_system": [tables["workflow_system"][c] for c in instances["workflow_system"][instance]],
+            "workflow_name": [tables["workflow_name"][c] for c in instances["workflow_name"][instance]],
+            "instance_file": [instances["instance_file"][i] for i in instance],
+            "task_name": [tables["task_name"][c] for c in columns["task_name"][tasks]],
+            "task_category": [tables["task_category"][c] for c in columns["task_category"][tasks]],
+        }
+        for column in COUNT_COLUMNS:
+            frame[column] = columns[column][tasks]
+        return pd.DataFrame(frame, index=tasks).astype({column: object for column in list(frame)[:5]})
+
+
+class CorpusService:
+    # The corpus of one WfInstances tree; reload() swaps in a new index, so queries
+    # running meanwhile finish on the one they started with
+    def __init__(self, base_dir=BASE_DIR, workers=1, streaming=False):
+        self.base_dir = base_dir
+        self.workers = workers
+        self.extract = functools.partial(extract_instance_columns, streaming=streaming)
+        self.parts = {}
+        self.index = None
+        self.lock = threading.Lock()
+
+    def reload(self):
+        with self.lock:
+            started = time.perf_counter()
+            paths = find_instance_files(self.base_dir)
+            stats = {}
+            for path in paths:
+                st = stat_instance(path)
+                stats[path] = (st.st_size, st.st_mtime_ns)
+            changed = [path for path in paths if path not in self.parts or self.parts[path][0] != stats[path]]
+            removed = set(self.parts) - set(paths)
+            added = sum(path not in self.parts for path in changed)
+
+            parts = {path: part for path, part in self.parts.items() if path not in removed}
+            errors = []
+            for path, part, error in map_instances(self.extract, changed, self.workers):
+                if error is not None:
+                    print(f"✖ Error processing {path}: {error}")
+                    errors.append(path)
+                    parts.pop(path, None)
+                    continue
+                parts[path] = (stats[path], part)
+
+            builder = CorpusBuilder()
+            loaded = [path for path in paths if path in parts]
+            for path in loaded:
+                builder.add(parts[path][1])
+            self.parts = parts
+            self.index = CorpusIndex(builder.build(), loaded)
+            return {
+                "instances": len(loaded), "added": added, "changed": len(changed) - added,
+                "removed": len(removed), "errors": errors, "seconds": time.perf_counter() - started,
+            }
+
+    def stats(self, index, params):
+        corpus = index.corpus
+        return {
+            "instances": corpus.n_instances, "tasks": corpus.n_tasks,
+            "categories": len(corpus.tables["task_category"]), "workflows": len(corpus.tables["workflow_name"]),
+            "systems": list(corpus.tables["workflow_system"]),
+        }
+
+    def instances(self, index, params):
+        rows = index.instance_rows(index.select(params))
+        return {"count": len(rows), "rows": rows.to_dict("records")}
+
+    def tasks(self, index, params):
+        limit = int(params.pop("limit", ["100"])[-1])
+        tasks = index.select(params)
+        return {"count": len(tasks), "rows": index.task_rows(tasks[:limit]).to_dict("records")}
+
+    def aggregate(self, index, params):
+        by = params.pop("by", ["task_category"])[-1]
+        sort = params.pop("sort", ["bytes"])[-1]
+        top = int(params.pop("top", ["20"])[-1])
+        if sort not in AGGREGATES:
+            raise ValueError(f"cannot sort by {sort!r} (choose from {', '.join(AGGREGATES)})")
+        frame = index.aggregate(index.select(params), by)
+        frame = frame.sort_values([sort, by], ascending=[False, True], kind="stable").head(top)
+        return {"count": len(frame), "rows": frame.to_dict("records")}
+
+    def handle(self, method, target):
+        # (status, response body) of one request
+        url = urlsplit(target)
+        endpoint = url.path.strip("/")
+        params = parse_qs(url.query)
+        started = time.perf_counter()
+        try:
+            if method == "POST" and endpoint == "reload":
+                body = self.reload()
+            elif method == "GET" and endpoint in ("stats", "instances", "tasks", "aggregate"):
+                body = getattr(self, endpoint)(self.index, params)
+            else:
+                return 404, {"error": f"no endpoint {method} /{endpoint}"}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        body["milliseconds"] = (time.perf_counter() - started) * 1000
+        return 200, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _respond(self, method):
+        status, body = self.service.handle(method, self.path)
+        payload = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    handler = type("Handler", (_Handler,), {"service": service})
+    if socket_path:
+        # A socket file left behind by a previous run would make bind() fail
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def request(endpoint, params=None, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    # Client side: the decoded response of one endpoint (reload is POSTed)
+    if socket_path:
+        conn = _UnixConnection(socket_path)
+    else:
+        conn = http.client.HTTPConnection(host, port)
+    method = "POST" if endpoint == "reload" else "GET"
+    target = f"/{endpoint}" + (f"?{urlencode(params, doseq=True)}" if params else "")
+    try:
+        conn.request(method, target)
+        response = conn.getresponse()
+        body = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise RuntimeError(f"{response.status}: {body.get('error')}")
+    return body
+
+
+def parse_params(items):
+    params = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"expected name=value, got {item!r}")
+        params.setdefault(name, []).append(value)
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory query service over the WfInstances task corpus")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="load the corpus and answer queries until interrupted")
+    query = commands.add_parser("query", help="send one query to a running service and print the answer")
+    query.add_argument("endpoint", choices=["stats", "instances", "tasks", "aggregate", "reload"])
+    query.add_argument("params", nargs="*", metavar="NAME=VALUE",
+                       help=f"filters ({', '.join(INDEX_FILTERS + tuple(BYTE_FILTERS))}) and options (by, sort, top, limit)")
+    query.add_argument("--json", action="store_true", help="print the raw JSON response")
+    for command in (serve, query):
+        command.add_argument("--host", default="127.0.0.1", help="address to listen on or connect to")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+        command.add_argument("--socket", default=None, metavar="PATH", help="use a Unix socket instead of TCP")
+    add_workers_argument(serve)
+    add_streaming_argument(serve)
+    args = parser.parse_args()
+
+    if args.command == "query":
+        try:
+            body = request(args.endpoint, parse_params(args.params), args.host, args.port, args.socket)
+        except (OSError, RuntimeError, argparse.ArgumentTypeError) as e:
+            parser.error(str(e))
+        rows = body.pop("rows", None)
+        if args.json or rows is None:
+            print(json.dumps(body if rows is None else dict(body, rows=rows), indent=2))
+        else:
+            print(pd.DataFrame(rows).to_string(index=False) if rows else "(no rows)")
+            print(f"{body['count']} rows in {body['milliseconds']:.1f} ms")
+        return
+
+    service = CorpusService(BASE_DIR, args.workers, args.streaming)
+    loaded = service.reload()
+    print(f"✅ Loaded {loaded['instances']} instances ({service.index.corpus.n_tasks} tasks) "
+          f"in {loaded['seconds']:.1f} s")
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"Serving on {args.socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import glob
+import pickle
+import hashlib
+import argparse
+
+import pandas as pd
+
+from outofcore import LogicalPartial
+from ingest import BASE_DIR, detect_workflow_system
+
+# Multi-node extraction: `--shard i/N` makes a script parse only the instance files
+# whose relative path under WfInstances hashes to shard i (1 <= i <= N), and write its
+# per-instance results to SHARD_DIR instead of the datasets. merge_shards.py combines
+# the N shards into exactly the outputs of a single run:
+#
+#   for i in 1 2 3; do python dataset/prueba2.py --shard $i/3 & done; wait
+#   python dataset/merge_shards.py prueba2
+#
+# Every shard records the position of each instance in the full walk, so the merge
+# can put rows back in single-run order; the shards must see the same tree.
+
+SHARD_DIR = "shards"
+# Bump when the layout of the shard files changes
+SHARD_FORMAT = 2
+
+
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def relative_path(path, base_dir=BASE_DIR):
+    return os.path.relpath(path, base_dir).replace(os.sep, "/")
+
+
+def shard_of(path, count, base_dir=BASE_DIR):
+    # 1-based shard of an instance file, stable across machines and Python runs
+    digest = hashlib.blake2b(relative_path(path, base_dir).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def corpus_digest(paths, base_dir=BASE_DIR):
+    digest = hashlib.blake2b()
+    for path in paths:
+        digest.update(relative_path(path, base_dir).encode() + b"\0")
+    return digest.hexdigest()
+
+
+def shard_path(directory, script, index, count, kind):
+    return os.path.join(directory, f"{script}-{index}-of-{count}.{kind}")
+
+
+class ShardWriter:
+    # Results of one shard: a manifest with a record per instance (its position in the
+    # walk, workflow system and either the workflow-level row or, for task-level
+    # scripts, the instance's logical partial without per-task values) and the task
+    # rows of each instance, pickled one instance after the other into a side file the
+    # records point into
+    def __init__(self, directory, script, shard, paths, logical=None, options=None):
+        self.directory = directory
+        self.script = script
+        self.index, self.count = shard
+        self.logical = logical
+        self.options = options or {}
+        self.all_paths = len(paths)
+        self.corpus = corpus_digest(paths)
+        self.position = {path: i for i, path in enumerate(paths)}
+        self.paths = [path for path in paths if shard_of(path, self.count) == self.index]
+        self.records = []
+        os.makedirs(directory, exist_ok=True)
+        self.rows_file = None
+        if logical is not None:
+            self.rows_file = open(shard_path(directory, script, self.index, self.count, "rows"), "wb")
+
+    def add(self, path, row=None, rows=None, **fields):
+        record = {"position": self.position[path], "path": relative_path(path),
+                  "system": detect_workflow_system(path), **fields}
+        if row is not None:
+            record["row"] = row
+        if rows is not None:
+            partial = LogicalPartial(*self.logical)
+            partial.add(pd.DataFrame(rows, columns=partial.source_columns()), record["position"])
+            record.update(workflow_name=rows[0]["workflow_name"], tasks=len(rows), partial=partial,
+                          offset=self.rows_file.tell())
+            pickle.dump(rows, self.rows_file, pickle.HIGHEST_PROTOCOL)
+        self.records.append(record)
+
+    def close(self):
+        if self.rows_file is not None:
+            self.rows_file.close()
+        manifest = {
+            "format": SHARD_FORMAT, "script": self.script, "shard": self.index, "count": self.count,
+            "corpus": self.corpus, "files": self.all_paths, "shard_files": len(self.paths),
+            "options": self.options, "records": self.records,
+        }
+        path = shard_path(self.directory, self.script, self.index, self.count, "manifest")
+        with open(path, "wb") as f:
+            pickle.dump(manifest, f, pickle.HIGHEST_PROTOCOL)
+        print(f"✅ Saved shard {self.index}/{self.count} of {self.script} "
+              f"({len(self.records)} of {len(self.paths)} instance files) to {path}")
+
+
+def open_shard(args, script, paths, logical=None, options=None):
+    if args.shard is None:
+        return None
+    return ShardWriter(args.shard_dir, script, args.shard, paths, logical, options)
+
+
+def load_shards(directory, script):
+    # The manifests of all N shards of `script`, checked to describe one complete run
+    manifests = []
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), f"{script}-*-of-*.manifest"))):
+        with open(path, "rb") as f:
+            manifests.append(pickle.load(f))
+    if not manifests:
+        raise ValueError(f"no {script} shards in {directory}")
+    first = manifests[0]
+    for manifest in manifests:
+        if manifest["format"] != SHARD_FORMAT:
+            raise ValueError(f"shard {manifest['shard']}/{manifest['count']} was written by another version")
+        for field in ("count", "corpus", "options"):
+            if manifest[field] != first[field]:
+                raise ValueError(f"shards of {script} in {directory} disagree on {field}; rerun them together")
+    missing = sorted(set(range(1, first["count"] + 1)) - {manifest["shard"] for manifest in manifests})
+    if missing:
+        raise ValueError(f"missing {script} shards {', '.join(map(str, missing))} of {first['count']}")
+    return sorted(manifests, key=lambda manifest: manifest["shard"])
+
+
+class ShardRows:
+    # Reads the task rows of any instance record of the shards of one script
+    def __init__(self, directory, script):
+        self.directory = directory
+        self.script = script
+        self.files = {}
+
+    def load(self, manifest, record):
+        f = self.files.get(manifest["shard"])
+        if f is None:
+            path = shard_path(self.directory, self.script, manifest["shard"], manifest["count"], "rows")
+            f = self.files[manifest["shard"]] = open(path, "rb")
+        f.seek(record["offset"])
+        return pickle.load(f)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def add_shard_arguments(parser):
+    parser.add_argument(
+        "--shard", type=parse_shard, default=None, metavar="i/N",
+        help="parse only shard i of N (by a hash of the path under WfInstances) and write the partial "
+             "results for merge_shards.py instead of the datasets",
+    )
+    parser.add_argument(
+        "--shard-dir", default=SHARD_DIR, metavar="DIR",
+        help=f"where --shard writes its partial results (default: {SHARD_DIR})",
+    )
@@ -0,0 +1,254 @@
+import os
+import argparse
+import functools
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import prueba
+import prueba2
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from corpus import StringTable
+from dag import TaskGraph, instance_tasks
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance, map_instances,
+)
+
+# Nearest-neighbor index of workflow instances. Every instance is a row of one NumPy
+# matrix: a few DAG shape features (log-scaled task, edge, level and width counts and
+# the speedup bound), then the share of its tasks in each task category. Rows are
+# normalized on their own, so inserting instances never touches the rows already in
+# the index, and k-nearest-neighbor queries (cosine or L1 distance) run for a whole
+# batch of instances at once as matrix operations instead of pairwise comparisons.
+#
+#   python dataset/similarity.py -k 3                     # neighbors of every instance
+#   python dataset/similarity.py new-run.json -k 3        # best matches for new traces
+
+OUTPUT_CSV = "workflow_similarity.csv"
+
+DAG_FEATURES = ["num_tasks", "dag_edges", "dag_depth", "dag_max_width", "speedup_bound"]
+# log10(1 + x) / LOG_SCALE puts a million tasks (or edges, levels...) at 1, the scale
+# of the category shares
+LOG_SCALE = 6.0
+DAG_WEIGHT = 1.0
+METRICS = ("cosine", "l1")
+# groups: the task groups of prueba.py (the group_* columns); categories: the task
+# categories of prueba2.py
+TAXONOMIES = ("groups", "categories")
+# Queries answered per matrix product
+QUERY_BLOCK = 1024
+
+
+def task_histogram(path, data, taxonomy="groups"):
+    if taxonomy == "groups":
+        _, _, counts, _ = prueba.parse_workflow_data(data, path, detect_workflow_system(path))
+        return counts
+    names = [task.get("name") for task in instance_tasks(data) if isinstance(task, dict)]
+    return dict(Counter(prueba2.task_classifier.classify_many(names)))
+
+
+def shape_features(data):
+    graph = TaskGraph.from_instance(data)
+    metrics = graph.metrics()
+    metrics["num_tasks"] = graph.n_tasks
+    return [metrics[name] or 0 for name in DAG_FEATURES]
+
+
+def instance_features(path, streaming=False, taxonomy="groups"):
+    # (identity, category histogram, DAG shape) of one instance file
+    data = load_instance(path, streaming)
+    ident = {
+        "workflow_system": detect_workflow_system(path),
+        "workflow_name": data.get("name", os.path.basename(path)),
+        "instance_file": os.path.basename(path),
+    }
+    return ident, task_histogram(path, data, taxonomy), shape_features(data)
+
+
+class SimilarityIndex:
+    def __init__(self, dag_weight=DAG_WEIGHT):
+        self.dag_weight = dag_weight
+        self.categories = StringTable()
+        self.keys = []
+        self.instances = []
+        self.positions = {}
+        # Rows [0, n) are in use; the arrays grow by doubling
+        self.vectors = np.zeros((0, len(DAG_FEATURES)))
+        self.units = np.zeros((0, len(DAG_FEATURES)))
+        self.n = 0
+
+    @property
+    def width(self):
+        return len(DAG_FEATURES) + len(self.categories)
+
+    def matrix(self, items):
+        # Feature rows of (histogram, shape) pairs; unseen categories get new columns
+        items = list(items)
+        rows = [([self.categories.intern(category) for category in histogram], list(histogram.values()), shape)
+                for histogram, shape in items]
+        matrix = np.zeros((len(items), self.width))
+        for i, (codes, counts, shape) in enumerate(rows):
+            total = sum(counts)
+            if total:
+                matrix[i, len(DAG_FEATURES) + np.array(codes, dtype=np.int64)] = np.array(counts) / total
+            matrix[i, :len(DAG_FEATURES)] = shape
+        features = matrix[:, :len(DAG_FEATURES)]
+        features[:] = self.dag_weight * np.log10(1 + np.clip(features, 0, None)) / LOG_SCALE
+        return matrix
+
+    def _reserve(self, rows):
+        capacity = len(self.vectors)
+        if self.n + rows <= capacity and self.vectors.shape[1] == self.width:
+            return
+        while capacity < self.n + rows:
+            capacity = max(2 * capacity, 16)
+        for name in ("vectors", "units"):
+            old = getattr(self, name)
+            grown = np.zeros((capacity, self.width))
+            grown[:self.n, :old.shape[1]] = old[:self.n]
+            setattr(self, name, grown)
+
+    def insert(self, items):
+        # Adds (key, identity, histogram, shape) tuples; a key already in the index (as a
+        # path_key) is replaced
+        items = list(items)
+        matrix = self.matrix((histogram, shape) for _, _, histogram, shape in items)
+        self._reserve(len(items))
+        for (key, ident, _, _), vector in zip(items, matrix):
+            position = self.positions.get(path_key(key))
+            if position is None:
+                position = self.positions[path_key(key)] = self.n
+                self.keys.append(key)
+                self.instances.append(ident)
+                self.n += 1
+            else:
+                self.instances[position] = ident
+            self.vectors[position] = vector
+            self.units[position] = unit_rows(vector[None, :])[0]
+
+    def position(self, key):
+        # Row of an indexed key, -1 if it is not in the index
+        return self.positions.get(path_key(key), -1)
+
+    def distances(self, queries, metric="cosine"):
+        # (queries, rows) matrix of distances to the indexed instances
+        if metric == "cosine":
+            return 1.0 - unit_rows(queries) @ self.units[:self.n].T
+        result = np.zeros((len(queries), self.n))
+        # One column at a time, so memory stays at one queries x rows matrix
+        for j in range(queries.shape[1]):
+            result += np.abs(queries[:, j, None] - self.vectors[None, :self.n, j])
+        return result
+
+    def query(self, queries, k=5, metric="cosine", exclude=None):
+        # Positions and distances of the k nearest rows for each query row, nearest
+        # first (ties by position). exclude[i] is a position left out of the answers
+        # of query i, -1 for none.
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric!r} (choose from {', '.join(METRICS)})")
+        self._reserve(0)
+        queries = np.asarray(queries, dtype=np.float64)
+        if queries.shape[1] < self.width:
+            queries = np.pad(queries, ((0, 0), (0, self.width - queries.shape[1])))
+        k = min(k, self.n - (exclude is not None))
+        positions = np.zeros((len(queries), max(k, 0)), dtype=np.int64)
+        distances = np.zeros((len(queries), max(k, 0)))
+        if k <= 0:
+            return positions, distances
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = self.distances(queries[start:start + QUERY_BLOCK], metric)
+            if exclude is not None:
+                skip = np.asarray(exclude[start:start + QUERY_BLOCK], dtype=np.int64)
+                rows = np.flatnonzero(skip >= 0)
+                block[rows, skip[rows]] = np.inf
+            nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(block, nearest, axis=1)
+            order = np.lexsort((nearest, nearest_distances), axis=1)
+            positions[start:start + len(block)] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + len(block)] = np.take_along_axis(nearest_distances, order, axis=1)
+        return positions, distances
+
+    def neighbors(self, k=5, metric="cosine"):
+        # k nearest other instances of every indexed instance
+        return self.query(self.vectors[:self.n], k, metric, exclude=np.arange(self.n))
+
+
+def path_key(path):
+    # One key per instance file, whether named ./WfInstances/a.json, WfInstances/a.json,
+    # by its absolute path or through a symlink
+    return os.path.realpath(path)
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def neighbor_rows(index, instances, positions, distances):
+    rows = []
+    for ident, nearest, nearest_distances in zip(instances, positions, distances):
+        for rank, (position, distance) in enumerate(zip(nearest, nearest_distances), start=1):
+            neighbor = index.instances[position]
+            rows.append(dict(ident, rank=rank, neighbor_system=neighbor["workflow_system"],
+                             neighbor_name=neighbor["workflow_name"], neighbor_file=neighbor["instance_file"],
+                             distance=float(distance)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest workflow instances by task categories and DAG shape")
+    parser.add_argument("queries", nargs="*", metavar="INSTANCE",
+                        help="instance files to match against the corpus (default: every corpus instance)")
+    parser.add_argument("-k", type=int, default=5, help="neighbors per instance (default: 5)")
+    parser.add_argument("--metric", choices=METRICS, default="cosine", help="distance (default: cosine)")
+    parser.add_argument("--taxonomy", choices=TAXONOMIES, default="groups",
+                        help="task groups of prueba.py or task categories of prueba2.py (default: groups)")
+    parser.add_argument("--dag-weight", type=float, default=DAG_WEIGHT,
+                        help=f"weight of the DAG shape features against the category shares (default: {DAG_WEIGHT})")
+    parser.add_argument("--output", default=OUTPUT_CSV, help=f"output CSV (default: {OUTPUT_CSV})")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+
+    func = functools.partial(instance_features, streaming=args.streaming, taxonomy=args.taxonomy)
+    index = SimilarityIndex(args.dag_weight)
+    batch = []
+    for path, result, error in map_instances_cached(
+        func, find_instance_files(BASE_DIR), args.workers, cache, f"similarity.instance_features.{args.taxonomy}",
+    ):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        batch.append((path, *result))
+        if len(batch) == QUERY_BLOCK:
+            index.insert(batch)
+            batch = []
+    index.insert(batch)
+    close_cache(cache)
+
+    if args.queries:
+        queries = []
+        for path, result, error in map_instances(func, args.queries, args.workers):
+            if error is not None:
+                print(f"✖ Error processing {path}: {error}")
+                continue
+            queries.append((path, *result))
+        matrix = index.matrix((histogram, shape) for _, _, histogram, shape in queries)
+        exclude = [index.position(path) for path, _, _, _ in queries]
+        positions, distances = index.query(matrix, args.k, args.metric, exclude)
+        rows = neighbor_rows(index, [ident for _, ident, _, _ in queries], positions, distances)
+    else:
+        positions, distances = index.neighbors(args.k, args.metric)
+        rows = neighbor_rows(index, index.instances, positions, distances)
+
+    pd.DataFrame(rows).to_csv(args.output, index=False)
+    print(f"✅ Saved the {args.k} nearest instances ({args.metric}) of "
+          f"{len(args.queries) or index.n} instances to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
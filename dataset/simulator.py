@@ -0,0 +1,192 @@
+import os
+import heapq
+import argparse
+import functools
+
+import numpy as np
+import pandas as pd
+
+from dag import TaskGraph
+from ingest import (
+    BASE_DIR, add_streaming_argument, add_workers_argument, detect_workflow_system, find_instance_files,
+    load_instance, map_instances,
+)
+
+# Replays the task graph of an instance on a pool of identical machines, one task
+# per machine at a time, with the recorded task runtimes. Whenever machines are
+# free, the policy picks which ready task goes next:
+#   fifo - tasks in the order they became ready (list scheduling)
+#   heft - highest upward rank first (runtime plus the longest path to an exit task)
+#   cpf  - critical-path-first: longest path through the task first, ties by upward rank
+# Completion events live in a heap, so a run costs O((V + E) log V).
+
+POLICIES = ("fifo", "heft", "cpf")
+OUTPUT_CSV = "makespan_predictions.csv"
+
+
+def level_frontiers(level, order):
+    # Tasks grouped by level, in topological order
+    counts = np.bincount(level[order]) if len(order) else np.zeros(0, dtype=np.int64)
+    return np.split(order, np.cumsum(counts)[:-1])
+
+
+def upward_rank(graph, frontiers):
+    rank = graph.runtime.copy()
+    longest_tail = np.zeros(graph.n_tasks, dtype=np.float64)
+    for nodes in reversed(frontiers):
+        sources, children = graph.gather_children(nodes)
+        np.maximum.at(longest_tail, sources, rank[children])
+        rank[nodes] = graph.runtime[nodes] + longest_tail[nodes]
+    return rank
+
+
+def task_priorities(graph, policy):
+    # Heap key per task (smaller runs first), or None for fifo
+    level, order, finish = graph.levels()
+    if len(order) < graph.n_tasks:
+        raise ValueError("task graph has a cycle")
+    if policy == "fifo":
+        return None
+    rank = upward_rank(graph, level_frontiers(level, order))
+    if policy == "heft":
+        return -rank
+    # finish - runtime is the earliest start, so this is the longest path through the task
+    through = finish - graph.runtime + rank
+    keys = np.empty(graph.n_tasks, dtype=np.int64)
+    keys[np.lexsort((-rank, -through))] = np.arange(graph.n_tasks)
+    return keys
+
+
+def simulate(graph, machines, policy="heft"):
+    # Returns the makespan and, per task, its start time and machine
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy {policy!r}")
+    n = graph.n_tasks
+    priority = task_priorities(graph, policy)
+    priority = priority.tolist() if priority is not None else None
+
+    runtime = graph.runtime.tolist()
+    offsets = graph.offsets.tolist()
+    targets = graph.targets.tolist()
+    indegree = graph.in_degree().tolist()
+    start = [0.0] * n
+    machine_of = [-1] * n
+
+    ready = []
+    sequence = 0
+
+    def make_ready(task):
+        nonlocal sequence
+        key = sequence if priority is None else priority[task]
+        heapq.heappush(ready, (key, task))
+        sequence += 1
+
+    for task in range(n):
+        if indegree[task] == 0:
+            make_ready(task)
+
+    free = list(range(max(1, machines)))
+    events = []
+    now = 0.0
+    done = 0
+    while done < n:
+        while ready and free:
+            _, task = heapq.heappop(ready)
+            machine = heapq.heappop(free)
+            start[task] = now
+            machine_of[task] = machine
+            heapq.heappush(events, (now + runtime[task], task, machine))
+        if not events:
+            break
+
+        now, task, machine = heapq.heappop(events)
+        finished = [(task, machine)]
+        while events and events[0][0] == now:
+            _, task, machine = heapq.heappop(events)
+            finished.append((task, machine))
+        for task, machine in finished:
+            done += 1
+            heapq.heappush(free, machine)
+            for child in targets[offsets[task]:offsets[task + 1]]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    make_ready(child)
+
+    return now, np.array(start), np.array(machine_of, dtype=np.int64)
+
+
+def recorded_slots(data):
+    # Task slots of the recorded run: total cores over execution.machines
+    machines = data.get("workflow", {}).get("execution", {}).get("machines", [])
+    cores = 0
+    for machine in machines:
+        if isinstance(machine, dict):
+            cores += (machine.get("cpu") or {}).get("coreCount") or 1
+    return cores or 1
+
+
+def simulate_instance(path, machines=None, policies=POLICIES, streaming=False):
+    data = load_instance(path, streaming)
+    graph = TaskGraph.from_instance(data)
+    slots = machines or recorded_slots(data)
+    recorded = data.get("workflow", {}).get("execution", {}).get("makespanInSeconds")
+
+    rows = []
+    for policy in policies:
+        makespan, _, _ = simulate(graph, slots, policy)
+        rows.append({
+            "workflow_system": detect_workflow_system(path),
+            "workflow_name": data.get("name", os.path.basename(path)),
+            "instance_file": os.path.basename(path),
+            "num_tasks": graph.n_tasks,
+            "machines": slots,
+            "policy": policy,
+            "recorded_makespan_seconds": recorded,
+            "predicted_makespan_seconds": makespan,
+            "predicted_to_recorded": makespan / recorded if recorded else None,
+        })
+    return rows
+
+
+def parse_policies(value):
+    policies = [policy.strip() for policy in value.split(",") if policy.strip()]
+    unknown = [policy for policy in policies if policy not in POLICIES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown policy: {', '.join(unknown)}")
+    return policies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict instance makespans on a simulated machine pool")
+    parser.add_argument(
+        "--machines", type=int, default=None,
+        help="number of identical machines (default: total cores of the recorded execution.machines)",
+    )
+    parser.add_argument(
+        "--policy", type=parse_policies, default=list(POLICIES),
+        help=f"comma-separated scheduling policies to compare (default: {','.join(POLICIES)})",
+    )
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    args = parser.parse_args()
+
+    func = functools.partial(simulate_instance, machines=args.machines, policies=args.policy, streaming=args.streaming)
+    rows = []
+    for path, instance_rows, error in map_instances(func, find_instance_files(BASE_DIR), args.workers):
+        if error is not None:
+            print(f"✖ Error processing {path}: {error}")
+            continue
+        rows.extend(instance_rows)
+
+    df = pd.DataFrame(rows)
+    df = df.sort_values(by=["workflow_system", "workflow_name", "instance_file", "policy"])
+    df.to_csv(OUTPUT_CSV, index=False)
+
+    print(f"✅ Saved {len(df)} makespan predictions to {OUTPUT_CSV}")
+    summary = df.groupby("policy")["predicted_to_recorded"].median()
+    for policy, ratio in summary.items():
+        print(f"  {policy}: median predicted/recorded makespan {ratio:.3f}")
+
+
+if __name__ == "__main__":
+    main()
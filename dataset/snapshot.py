@@ -0,0 +1,212 @@
+import os
+import json
+import mmap
+import time
+import struct
+import argparse
+import hashlib
+from collections.abc import Sequence
+
+import numpy as np
+
+from archives import stat_instance
+from cache import source_version
+from corpus import WorkflowCorpus
+from ingest import BASE_DIR, add_streaming_argument, add_workers_argument, find_instance_files
+
+# Binary snapshot of a WorkflowCorpus that opens in milliseconds: every column, code
+# array and CSR offset array is stored fixed-width and 64-byte aligned, and comes back
+# as a read-only NumPy view over a shared mmap of the file, so nothing is copied and
+# every process that opens the snapshot shares the same pages. String tables are one
+# UTF-8 blob plus an offsets array each, decoded value by value on access.
+#
+# Layout: MAGIC, format (uint32), padding, header length (uint64), JSON header, then
+# the arrays from the first aligned offset after the header. The header records the
+# format, the extraction code (cache.source_version) and the size and mtime of every
+# instance file, so a snapshot of an older tree or older code is detected as stale.
+
+DEFAULT_SNAPSHOT_PATH = "corpus.snapshot"
+MAGIC = b"WFCORPUS"
+# Bump when the layout of the snapshot changes
+SNAPSHOT_FORMAT = 1
+ALIGN = 64
+_PREAMBLE = struct.Struct("<8sII Q")
+
+
+class StaleSnapshot(ValueError):
+    pass
+
+
+class StringTableView(Sequence):
+    # Values of a string table, decoded from the snapshot as they are read
+    def __init__(self, data, offsets, encoding="utf8"):
+        self.data = data
+        self.offsets = offsets
+        self.encoding = encoding
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        raw = self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+        return raw.decode() if self.encoding == "utf8" else json.loads(raw)
+
+
+def _encode_table(values):
+    # (blob, offsets, encoding); values that are not all strings are stored as JSON
+    # so they come back with their type
+    if all(isinstance(value, str) for value in values):
+        encoding, encoded = "utf8", [value.encode() for value in values]
+    else:
+        encoding, encoded = "json", [json.dumps(value).encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, encoding
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def corpus_fingerprint(paths, base_dir=BASE_DIR):
+    # Changes when an instance file is added, removed or rewritten
+    digest = hashlib.blake2b()
+    for path in paths:
+        st = stat_instance(path)
+        digest.update(f"{os.path.relpath(path, base_dir)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def write_snapshot(corpus, path, fingerprint=None):
+    arrays = {}
+    for name, array in corpus.columns.items():
+        arrays[f"columns/{name}"] = np.ascontiguousarray(array)
+    tables = {name: values for name, values in corpus.tables.items()}
+    tables["instance_file"] = list(corpus.instances["instance_file"])
+    for name in ("workflow_name", "workflow_system"):
+        arrays[f"instances/{name}"] = np.ascontiguousarray(corpus.instances[name])
+    encodings = {}
+    for name, values in tables.items():
+        data, offsets, encodings[name] = _encode_table(values)
+        arrays[f"tables/{name}/data"] = data
+        arrays[f"tables/{name}/offsets"] = offsets
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({
+        "format": SNAPSHOT_FORMAT, "source": source_version(), "corpus": fingerprint,
+        "arrays": layout, "encodings": encodings,
+    }).encode()
+    start = _aligned(_PREAMBLE.size + len(header))
+
+    # Written next to the target and renamed over it: readers of the old snapshot
+    # keep their mapping of the old file
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, SNAPSHOT_FORMAT, 0, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name][1])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, path)
+
+
+def read_header(path):
+    # (header, offset of the arrays); StaleSnapshot for files of another format
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise StaleSnapshot(f"{path} is not a corpus snapshot")
+        magic, version, _, length = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise StaleSnapshot(f"{path} is not a corpus snapshot")
+        if version != SNAPSHOT_FORMAT:
+            raise StaleSnapshot(f"{path} has snapshot format {version}, this code reads {SNAPSHOT_FORMAT}")
+        header = json.loads(f.read(length))
+    return header, _aligned(_PREAMBLE.size + length)
+
+
+def open_snapshot(path):
+    # The corpus of a snapshot, its arrays read-only views over one mmap of the file
+    header, start = read_header(path)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, (dtype, offset, count) in header["arrays"].items():
+        if count:
+            arrays[name] = np.frombuffer(mapped, dtype=np.dtype(dtype), count=count, offset=start + offset)
+        else:
+            arrays[name] = np.zeros(0, dtype=np.dtype(dtype))
+    tables = {
+        name: StringTableView(arrays[f"tables/{name}/data"], arrays[f"tables/{name}/offsets"], encoding)
+        for name, encoding in header["encodings"].items()
+    }
+    columns = {name[len("columns/"):]: array for name, array in arrays.items() if name.startswith("columns/")}
+    instances = {
+        "instance_file": np.array(list(tables.pop("instance_file")), dtype=object),
+        "workflow_name": arrays["instances/workflow_name"],
+        "workflow_system": arrays["instances/workflow_system"],
+    }
+    return WorkflowCorpus(columns, instances, tables)
+
+
+def stale_reason(path, fingerprint):
+    # Why the snapshot at path does not describe the instance files with this
+    # fingerprint and the current code, None if it does
+    if not os.path.exists(path):
+        return "no snapshot"
+    try:
+        header, _ = read_header(path)
+    except (StaleSnapshot, ValueError) as e:
+        return str(e)
+    if header["source"] != source_version():
+        return "the extraction code changed"
+    if header["corpus"] != fingerprint:
+        return "instance files were added, removed or changed"
+    return None
+
+
+def load_corpus(path=DEFAULT_SNAPSHOT_PATH, base_dir=BASE_DIR, workers=1, streaming=False):
+    # The corpus of base_dir, from its snapshot; a missing or stale snapshot is
+    # rebuilt from the instance files first
+    paths = find_instance_files(base_dir)
+    # Taken before extracting, so files changed meanwhile make the snapshot stale
+    fingerprint = corpus_fingerprint(paths, base_dir)
+    reason = stale_reason(path, fingerprint)
+    if reason is not None:
+        print(f"Rebuilding {path} ({reason})")
+        write_snapshot(WorkflowCorpus.from_paths(paths, workers, streaming), path, fingerprint)
+    return open_snapshot(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write or refresh the memory-mapped corpus snapshot")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_PATH, metavar="PATH",
+                        help=f"snapshot file (default: {DEFAULT_SNAPSHOT_PATH})")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild even if the snapshot is current")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.snapshot):
+        os.remove(args.snapshot)
+    load_corpus(args.snapshot, BASE_DIR, args.workers, args.streaming)
+    started = time.perf_counter()
+    corpus = open_snapshot(args.snapshot)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {args.snapshot}: {corpus.n_instances} instances, {corpus.n_tasks} tasks, "
+          f"{os.path.getsize(args.snapshot) / 1e6:.1f} MB, opened in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import re
+import json
+
+from archives import open_instance_text
+
+# Incremental reader for WfCommons instances. Only the parts of the document the
+# dataset scripts use are kept: scalar metadata, workflow.specification.tasks and
+# files (trimmed to the keys below) and workflow.execution.tasks (trimmed, with just
+# the `--out` size hints of their command arguments). Everything else, including
+# the command programs and runtimeSystem, is skipped without being decoded, and the
+# task arrays are decoded one element at a time, so memory follows the size of the
+# compact records rather than the size of the file.
+
+CHUNK_SIZE = 1 << 16
+
+TASK_KEYS = ("name", "id", "type", "children", "parents", "inputFiles", "outputFiles")
+FILE_KEYS = ("id", "name", "sizeInBytes", "size")
+EXECUTION_TASK_KEYS = (
+    "id", "runtimeInSeconds", "avgCPU", "priority", "machines", "coreCount",
+    "memoryInBytes", "readBytes", "writtenBytes",
+)
+EXECUTION_KEEP = ("machines",)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+SCALAR = re.compile(r'[^,\]}\s]+')
+PLAIN = re.compile(r'[^"\[\]{}]+')
+NUMBER_TAIL = re.compile(r'[0-9.eE+\-]*')
+
+
+class StreamFallback(Exception):
+    # The document doesn't have the layout the stream reader expects; decode it whole
+    pass
+
+
+class JsonStream:
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # Drop the consumed prefix and read more; the read size grows with the value
+        # being decoded so retrying a large value stays linear overall
+        if self.eof:
+            return False
+        data = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise StreamFallback(f"expected {char!r}")
+        self.pos += 1
+
+    def _match_string(self):
+        if self.peek() != '"':
+            raise StreamFallback("expected a string")
+        while True:
+            match = STRING.match(self.buf, self.pos)
+            if match:
+                self.pos = match.end()
+                return match
+            if not self._fill():
+                raise StreamFallback("unterminated string")
+
+    def read_string(self):
+        return json.loads(self._match_string().group())
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise StreamFallback("invalid value")
+            # A number running into the end of the buffer may continue in the next chunk
+            if (isinstance(value, (int, float)) and NUMBER_TAIL.match(self.buf, end).end() >= len(self.buf)
+                    and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        char = self.peek()
+        if char == '"':
+            self._match_string()
+            return
+        if char not in "{[":
+            while True:
+                match = SCALAR.match(self.buf, self.pos)
+                if match and match.end() < len(self.buf):
+                    self.pos = match.end()
+                    return
+                if not self._fill():
+                    if not match:
+                        raise StreamFallback("truncated document")
+                    self.pos = match.end()
+                    return
+
+        depth = 0
+        while True:
+            if self.pos >= len(self.buf) and not self._fill():
+                raise StreamFallback("truncated document")
+            char = self.buf[self.pos]
+            if char == '"':
+                self._match_string()
+            elif char in "{[":
+                depth += 1
+                self.pos += 1
+            elif char in "}]":
+                depth -= 1
+                self.pos += 1
+                if depth == 0:
+                    return
+            else:
+                self.pos = PLAIN.match(self.buf, self.pos).end()
+
+    def iter_object(self):
+        # Yields each key; the caller must read or skip the value before resuming
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise StreamFallback("expected ',' or '}'")
+
+    def iter_array(self):
+        # Yields once per element; the caller must read or skip it before resuming
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise StreamFallback("expected ',' or ']'")
+
+
+def _pick(record, keys):
+    return {key: record[key] for key in keys if key in record}
+
+
+def compact_task(task):
+    return _pick(task, TASK_KEYS)
+
+
+def compact_file(file_entry):
+    return _pick(file_entry, FILE_KEYS)
+
+
+def compact_execution_task(task):
+    compact = _pick(task, EXECUTION_TASK_KEYS)
+    command = task.get("command")
+    if isinstance(command, dict) and isinstance(command.get("arguments"), list):
+        # prueba2.build_file_size_lookup reads output sizes from `--out {...}` arguments
+        compact["command"] = {
+            "arguments": [arg for arg in command["arguments"] if isinstance(arg, str) and arg.startswith("--out")]
+        }
+    return compact
+
+
+def _iter_records(stream, compact):
+    if stream.peek() != "[":
+        raise StreamFallback("expected an array")
+    for _ in stream.iter_array():
+        record = stream.read_value()
+        yield compact(record) if isinstance(record, dict) else record
+
+
+def _keep_scalar(stream, target, key):
+    if stream.peek() in "{[":
+        stream.skip_value()
+    else:
+        target[key] = stream.read_value()
+
+
+def _read_section(stream, arrays, keep=()):
+    if stream.peek() != "{":
+        raise StreamFallback("expected an object")
+    section = {}
+    for key in stream.iter_object():
+        if key in arrays:
+            section[key] = list(_iter_records(stream, arrays[key]))
+        elif key in keep:
+            section[key] = stream.read_value()
+        else:
+            _keep_scalar(stream, section, key)
+    return section
+
+
+def _read_workflow(stream):
+    if stream.peek() != "{":
+        raise StreamFallback("expected an object")
+    workflow = {}
+    for key in stream.iter_object():
+        if key == "specification":
+            workflow[key] = _read_section(stream, {"tasks": compact_task, "files": compact_file})
+        elif key == "execution":
+            workflow[key] = _read_section(stream, {"tasks": compact_execution_task}, EXECUTION_KEEP)
+        else:
+            _keep_scalar(stream, workflow, key)
+    return workflow
+
+
+def read_compact_instance(f):
+    stream = JsonStream(f)
+    doc = {}
+    for key in stream.iter_object():
+        if key == "dag":
+            # Legacy layout, the scripts read dag.nodes from the full document
+            raise StreamFallback("top-level dag")
+        if key == "workflow":
+            doc[key] = _read_workflow(stream)
+        else:
+            _keep_scalar(stream, doc, key)
+    return doc
+
+
+def load_compact_instance(path):
+    try:
+        with open_instance_text(path) as f:
+            return read_compact_instance(f)
+    except StreamFallback:
+        with open_instance_text(path) as f:
+            return json.load(f)
+
+
+def read_top_level_value(path, key, default=None):
+    # One top-level value, read from the start of the file; the values before it are
+    # skipped without being decoded and nothing after it is read
+    with open_instance_text(path) as f:
+        stream = JsonStream(f)
+        for name in stream.iter_object():
+            if name == key:
+                return stream.read_value()
+            stream.skip_value()
+    return default
+
+
+def iter_tasks(path):
+    # Compact specification tasks, yielded as they are read; the rest of the file
+    # after the task array is never read
+    with open_instance_text(path) as f:
+        stream = JsonStream(f)
+        for key in stream.iter_object():
+            if key != "workflow":
+                stream.skip_value()
+                continue
+            for section in stream.iter_object():
+                if section != "specification":
+                    stream.skip_value()
+                    continue
+                for name in stream.iter_object():
+                    if name != "tasks":
+                        stream.skip_value()
+                        continue
+                    yield from _iter_records(stream, compact_task)
+                    return
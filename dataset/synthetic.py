@@ -0,0 +1,169 @@
+import os
+import json
+import random
+import argparse
+
+# Generator of synthetic WfCommons schema-1.5 instances, laid out like the real
+# ones (<out>/<system>/<workflow>/<file>.json) so every script can read them with
+# BASE_DIR pointed at <out>. Tasks are generated in topological order: task i draws
+# up to `fan_out` children from the next `window` tasks and reads one output file of
+# each parent; tasks without parents read staged-in files.
+#
+#   pegasus:  name == id == "mProject_ID0000001"
+#   nextflow: name "NFCORE_RNASEQ.RNASEQ.ALIGN.BWA_MEM", id "<name>_17", file ids
+#             under hashed work directories ("/3f/<hash>/<file>")
+
+PEGASUS_TYPES = [
+    "mProject", "mDiffFit", "mConcatFit", "mBackground", "mAdd", "individuals", "individuals_merge",
+    "sifting", "frequency", "mutation_overlap", "bwa", "fastqc", "samtools_sort", "picard_markdup",
+]
+NEXTFLOW_PROCESSES = [
+    ("PREPARE_GENOME", "GUNZIP_GTF"), ("PREPARE_GENOME", "SAMTOOLS_FAIDX"), ("FASTQ_QC", "FASTQC"),
+    ("FASTQ_QC", "TRIMGALORE"), ("ALIGN", "BWA_MEM"), ("ALIGN", "STAR_ALIGN"), ("ALIGN", "SAMTOOLS_INDEX"),
+    ("QUANTIFY", "SALMON_QUANT"), ("MARK_DUPLICATES", "PICARD_MARKDUPLICATES"), ("REPORT", "MULTIQC"),
+    ("CUSTOM", "DUMPSOFTWAREVERSIONS"),
+]
+STYLES = ("pegasus", "nextflow")
+
+
+def task_names(style, workflow, n_tasks, rng):
+    # (name, id) pairs; the task type changes every few tasks like real stage blocks
+    names = []
+    block = max(1, n_tasks // 20)
+    for i in range(n_tasks):
+        if style == "pegasus":
+            task_type = PEGASUS_TYPES[(i // block + rng.randrange(2)) % len(PEGASUS_TYPES)]
+            name = f"{task_type}_ID{i + 1:07d}"
+            names.append((name, name))
+        else:
+            subworkflow, process = NEXTFLOW_PROCESSES[(i // block + rng.randrange(2)) % len(NEXTFLOW_PROCESSES)]
+            name = f"NFCORE_{workflow.upper()}.{workflow.upper()}.{subworkflow}.{process}"
+            names.append((name, f"{name}_{i + 1}"))
+    return names
+
+
+def file_id(style, rng, stem, index):
+    if style == "pegasus":
+        return f"{stem}-{index:07d}.dat"
+    return f"/{rng.randrange(256):02x}/{rng.getrandbits(120):030x}/{stem}_{index}.dat"
+
+
+def generate_instance(n_tasks, style="pegasus", workflow="synthetic", fan_out=3, window=50,
+                      files_per_task=2, machines=4, cores=8, seed=0):
+    rng = random.Random(seed)
+    names = task_names(style, workflow, n_tasks, rng)
+    parents = [[] for _ in range(n_tasks)]
+    children = [[] for _ in range(n_tasks)]
+    for i in range(n_tasks):
+        candidates = range(i + 1, min(n_tasks, i + 1 + window))
+        for j in sorted(rng.sample(candidates, min(fan_out, len(candidates)))):
+            children[i].append(j)
+            parents[j].append(i)
+
+    files = {}
+    outputs = []
+    for i, (name, _) in enumerate(names):
+        stem = name.split(".")[-1].lower()
+        produced = [file_id(style, rng, stem, i * files_per_task + k) for k in range(files_per_task)]
+        for f in produced:
+            files[f] = rng.randrange(1_000, 50_000_000)
+        outputs.append(produced)
+
+    tasks = []
+    execution_tasks = []
+    runtime = [round(rng.uniform(1.0, 120.0), 3) for _ in range(n_tasks)]
+    finish = [0.0] * n_tasks
+    for i, (name, task_id) in enumerate(names):
+        # With files_per_task=0 the parents write nothing, every task reads a staged-in file
+        if parents[i] and files_per_task:
+            inputs = [outputs[p][rng.randrange(files_per_task)] for p in parents[i]]
+        else:
+            inputs = [file_id(style, rng, "input", i)]
+            files[inputs[0]] = rng.randrange(1_000, 50_000_000)
+        tasks.append({
+            "name": name,
+            "id": task_id,
+            "children": [names[j][1] for j in children[i]],
+            "inputFiles": inputs,
+            "outputFiles": outputs[i],
+            "parents": [names[p][1] for p in parents[i]],
+        })
+        start = max((finish[p] for p in parents[i]), default=0.0)
+        finish[i] = start + runtime[i]
+        program = name.split("_ID")[0] if style == "pegasus" else name.split(".")[-1].lower()
+        execution_tasks.append({
+            "id": task_id,
+            "runtimeInSeconds": runtime[i],
+            "command": {"program": program, "arguments": inputs + outputs[i]},
+            "avgCPU": round(rng.uniform(10.0, 100.0), 4),
+            "priority": rng.randrange(100),
+            "machines": [f"compute-{rng.randrange(machines)}"],
+        })
+
+    return {
+        "name": workflow,
+        "description": "Synthetic instance generated by dataset/synthetic.py",
+        "schemaVersion": "1.5",
+        "runtimeSystem": {"name": "Pegasus" if style == "pegasus" else "Nextflow", "version": "synthetic"},
+        "workflow": {
+            "specification": {
+                "tasks": tasks,
+                "files": [{"id": f, "sizeInBytes": size} for f, size in files.items()],
+            },
+            "execution": {
+                "makespanInSeconds": round(max(finish, default=0.0), 3),
+                "tasks": execution_tasks,
+                "machines": [
+                    {"nodeName": f"compute-{m}", "system": "linux", "cpu": {"coreCount": cores}}
+                    for m in range(machines)
+                ],
+            },
+        },
+    }
+
+
+def write_corpus(out_dir, n_instances, n_tasks, style="pegasus", duplicate_ratio=0.0, seed=0, **options):
+    # Writes n_instances files; a duplicate_ratio share of them reuse the workflow
+    # name of an earlier instance, which prueba2 deduplicates
+    rng = random.Random(seed)
+    directory = os.path.join(out_dir, style, "synthetic")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for k in range(n_instances):
+        workflow = f"synthetic{k}"
+        if k and rng.random() < duplicate_ratio:
+            workflow = f"synthetic{rng.randrange(k)}"
+        data = generate_instance(n_tasks, style, workflow, seed=seed + k, **options)
+        path = os.path.join(directory, f"{workflow}-{style}-{n_tasks}-{k:03d}.json")
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic WfCommons schema-1.5 instances")
+    parser.add_argument("out_dir", help="output directory, laid out like ./WfInstances")
+    parser.add_argument("--instances", type=int, default=1)
+    parser.add_argument("--tasks", type=int, default=1000, help="tasks per instance")
+    parser.add_argument("--style", choices=STYLES, default="pegasus")
+    parser.add_argument("--fan-out", type=int, default=3, help="children per task (at most)")
+    parser.add_argument("--window", type=int, default=50, help="children are drawn from the next WINDOW tasks")
+    parser.add_argument("--files-per-task", type=int, default=2, help="output files per task")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0,
+                        help="share of instances that repeat an earlier workflow name")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.files_per_task < 0:
+        parser.error(f"--files-per-task must be 0 or more, got {args.files_per_task}")
+
+    paths = write_corpus(
+        args.out_dir, args.instances, args.tasks, args.style, args.duplicate_ratio, args.seed,
+        fan_out=args.fan_out, window=args.window, files_per_task=args.files_per_task,
+    )
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"✅ Wrote {len(paths)} {args.style} instances ({size / 1e6:.1f} MB) under {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import time
+import argparse
+import functools
+from collections import Counter
+
+import pandas as pd
+
+import extractor
+import prueba
+import prueba2
+import prueba3
+from archives import stat_instance
+from cache import add_cache_arguments, close_cache, map_instances_cached, open_cache
+from outofcore import GroupValues, LogicalPartial
+from scanner import EMITTERS, parse_outputs, scan_instance
+from ingest import BASE_DIR, add_streaming_argument, add_workers_argument, find_instance_files
+
+# Watch mode: polls WfInstances and keeps the workflow-level datasets (extractor.py,
+# prueba.py) and the logical-task datasets (prueba2.py, prueba3.py) up to date as
+# instance files are added, changed or removed. Only those files are parsed again.
+# Each included instance keeps its per-group aggregates and task runtimes, not its
+# task rows: removing an instance takes its contribution out of its own groups and
+# adding one puts it into its groups. Counts and sums are updated in place; the
+# firsts, maxima and runtime percentiles of a touched group are recomputed from the
+# instances in it, which costs as much as the size of those groups. Every poll still
+# walks and stats the whole tree, and the CSVs of an updated dataset are rewritten
+# whole. The files written are the same as a full run's.
+#
+#   python dataset/watch.py --interval 5 --outputs task_types,logical_tasks
+
+INTERVAL = 2.0
+WORKFLOW_OUTPUTS = {"task_types": extractor.write_dataset, "task_groups": prueba.write_dataset}
+LOGICAL_OUTPUTS = {
+    "logical_tasks": (prueba2.LOGICAL_KEYS, prueba2.LOGICAL_COLUMNS, "logical_task_dataset.csv"),
+    "category_counts": (prueba3.LOGICAL_KEYS, prueba3.LOGICAL_COLUMNS, "logical_task_dataset_prueba3.csv"),
+}
+
+
+class IncrementalLogical:
+    # The logical dataset of a changing set of instances. Every included instance is
+    # kept as its own LogicalPartial (per-group aggregates and the runtime values of its
+    # tasks, not its task frame), and every group as running totals of the statistics
+    # that can be taken out again: rows, counts, sums, means as (sum, count), moved
+    # bytes and a count per machine. set() adds or subtracts an instance's groups and
+    # marks them touched; refresh() recomputes the rest of each touched group (firsts,
+    # maxima and the runtime profile) from the partials of the instances in it.
+    def __init__(self, keys, columns):
+        self.keys = list(keys)
+        self.columns = list(columns)
+        self.source_columns = LogicalPartial(keys, columns).source_columns()
+        self.partials = {}
+        self.members = {}
+        self.totals = {}
+        self.rows = {}
+        self.output_columns = None
+        self.touched = set()
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=self.source_columns)
+
+    def partial(self, rows):
+        # The partial of one instance's task rows, None without tasks. Positions are
+        # only known at refresh(), the walk order can change in between.
+        if not rows:
+            return None
+        partial = LogicalPartial(self.keys, self.columns, GroupValues())
+        partial.add(self.frame(rows), 0)
+        return partial if partial.groups else None
+
+    def set(self, path, partial=None):
+        old = self.partials.pop(path, None)
+        if old is not None:
+            for key, part in old.groups.items():
+                self.members[key].discard(path)
+                self._total(key, part, -1)
+                self.touched.add(key)
+        if partial is not None:
+            self.partials[path] = partial
+            for key, part in partial.groups.items():
+                self.members.setdefault(key, set()).add(path)
+                self._total(key, part, 1)
+                self.touched.add(key)
+
+    def _total(self, key, part, sign):
+        total = self.totals.setdefault(key, {"rows": 0, "moved": 0, "machines": Counter(), "agg": {}})
+        total["rows"] += sign * part["rows"]
+        total["moved"] += sign * part["moved"]
+        total["machines"].update({machine: sign for machine in part["machines"]})
+        agg = total["agg"]
+        for output, how, _ in self.columns:
+            value = part["agg"][output] if output in part["agg"] else None
+            if how == "mean":
+                sums, count = agg.get(output, (0, 0))
+                agg[output] = (sums + sign * value[0], count + sign * value[1])
+            elif how in ("count", "sum"):
+                agg[output] = agg.get(output, 0) + sign * value
+
+    def _group(self, key, paths, positions):
+        # A touched group's state as LogicalPartial keeps it, the firsts taking the
+        # current positions of the instances
+        total = self.totals[key]
+        agg = dict(total["agg"])
+        for path in paths:
+            part = self.partials[path].groups[key]["agg"]
+            for output, how, _ in self.columns:
+                if output not in part:
+                    continue
+                value = part[output]
+                if how in ("first_row", "first"):
+                    value = ((positions[path], value[0][1]), value[1])
+                    if output not in agg or value[0] < agg[output][0]:
+                        agg[output] = value
+                elif how == "max":
+                    agg[output] = max(agg[output], value) if output in agg else value
+        machines = {machine for machine, count in total["machines"].items() if count > 0}
+        return {"rows": total["rows"], "agg": agg, "machines": machines, "moved": total["moved"]}
+
+    def refresh(self, positions):
+        # Recomputes the touched groups from the cached partials of their instances, in
+        # walk order; returns whether anything was touched
+        if not self.touched:
+            return False
+        combined = LogicalPartial(self.keys, self.columns, GroupValues())
+        for key in self.touched:
+            paths = sorted(self.members.get(key, ()), key=positions.get)
+            if not paths:
+                self.members.pop(key, None)
+                self.totals.pop(key, None)
+                self.rows.pop(key, None)
+                continue
+            combined.groups[key] = self._group(key, paths, positions)
+            for path in paths:
+                combined.values.add(key, positions[path], *self.partials[path].values.load(key))
+        if combined.groups:
+            result = combined.result()
+            self.output_columns = list(result.columns)
+            for row in result.to_dict("records"):
+                self.rows[tuple(row[key] for key in self.keys)] = row
+        self.touched = set()
+        return True
+
+    def dataset(self):
+        if not self.rows:
+            return None
+        return pd.DataFrame([self.rows[key] for key in sorted(self.rows)], columns=self.output_columns)
+
+
+class NameDedupe:
+    # prueba2.py keeps the first instance (in walk order) of each workflow name that
+    # has tasks; a change to one of a name's instances can move that choice
+    def __init__(self, logical):
+        self.logical = logical
+        self.candidates = {}
+        self.names = {}
+        self.included = {}
+
+    def set(self, path, rows, positions):
+        touched = set()
+        name = self.names.pop(path, None)
+        if name is not None:
+            self.candidates[name].pop(path)
+            touched.add(name)
+        partial = self.logical.partial(rows)
+        if partial is not None:
+            name = rows[0]["workflow_name"]
+            self.names[path] = name
+            self.candidates.setdefault(name, {})[path] = partial
+            touched.add(name)
+        # All old choices go before any new one: a renamed instance can be both
+        for name in touched:
+            if name in self.included:
+                self.logical.set(self.included.pop(name))
+        for name in touched:
+            candidates = self.candidates[name]
+            if candidates:
+                first = min(candidates, key=positions.get)
+                self.included[name] = first
+                self.logical.set(first, candidates[first])
+            else:
+                del self.candidates[name]
+
+
+class Watcher:
+    def __init__(self, names, base_dir=BASE_DIR, workers=1, streaming=False, cache=None):
+        self.names = list(names)
+        self.base_dir = base_dir
+        self.workers = workers
+        self.cache = cache
+        self.func = functools.partial(scan_instance, names=tuple(self.names), streaming=streaming)
+        self.stage = "scanner:" + ",".join(self.names)
+        self.stats = {}
+        self.paths = []
+        self.positions = {}
+        self.workflow_rows = {name: {} for name in self.names if name in WORKFLOW_OUTPUTS}
+        self.logical = {name: IncrementalLogical(*LOGICAL_OUTPUTS[name][:2])
+                        for name in self.names if name in LOGICAL_OUTPUTS}
+        self.dedupe = NameDedupe(self.logical["logical_tasks"]) if "logical_tasks" in self.logical else None
+
+    def _set(self, name, path, result):
+        # Result of one emitter for a file, None to take the file out
+        if name in self.workflow_rows:
+            if result is None:
+                self.workflow_rows[name].pop(path, None)
+            else:
+                self.workflow_rows[name][path] = result
+        elif name == "logical_tasks":
+            self.dedupe.set(path, result, self.positions)
+        else:
+            logical = self.logical[name]
+            logical.set(path, logical.partial(result))
+
+    def poll(self):
+        # One pass: returns (added, changed, removed) counts, None when nothing changed
+        paths = find_instance_files(self.base_dir)
+        stats = {}
+        for path in paths:
+            try:
+                st = stat_instance(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_size, st.st_mtime_ns)
+        paths = [path for path in paths if path in stats]
+        changed = [path for path in paths if self.stats.get(path) != stats[path]]
+        removed = [path for path in self.stats if path not in stats]
+        if not changed and not removed:
+            return None
+
+        self.paths = paths
+        self.positions = {path: i for i, path in enumerate(paths)}
+        dirty = set()
+        for path in removed:
+            for name in self.names:
+                self._set(name, path, None)
+                dirty.add(name)
+        for path, partials, error in map_instances_cached(
+            self.func, changed, self.workers, self.cache, self.stage, live_paths=paths,
+        ):
+            if error is not None:
+                print(f"✖ Error processing {path}: {error}")
+                partials = {name: (None, None) for name in self.names}
+            for name in self.names:
+                result, emitter_error = partials[name]
+                if emitter_error is not None:
+                    print(f"✖ {name}: error processing {path}: {emitter_error}")
+                self._set(name, path, result)
+                dirty.add(name)
+        added = sum(path not in self.stats for path in changed)
+        self.stats = stats
+        self.write(dirty)
+        return added, len(changed) - added, len(removed)
+
+    def write(self, names):
+        for name in self.names:
+            if name not in names:
+                continue
+            if name in WORKFLOW_OUTPUTS:
+                rows = self.workflow_rows[name]
+                WORKFLOW_OUTPUTS[name]([rows[path] for path in self.paths if path in rows])
+                continue
+            logical = self.logical[name]
+            if not logical.refresh(self.positions):
+                continue
+            dataset = logical.dataset()
+            output = LOGICAL_OUTPUTS[name][2]
+            if dataset is None:
+                print(f"⚠ No tasks found, {output} not updated")
+                continue
+            dataset.to_csv(output, index=False)
+            print(f"✅ Updated {output} ({len(dataset)} logical tasks)")
+
+
+def main():
+    outputs = [name for name in EMITTERS if name in WORKFLOW_OUTPUTS or name in LOGICAL_OUTPUTS]
+    parser = argparse.ArgumentParser(description="Keep the datasets up to date as instance files change")
+    parser.add_argument(
+        "--outputs", type=parse_outputs, default=outputs,
+        help=f"comma-separated datasets to maintain (default: {','.join(outputs)})",
+    )
+    parser.add_argument("--interval", type=float, default=INTERVAL,
+                        help=f"seconds between polls of the instance tree (default: {INTERVAL})")
+    parser.add_argument("--once", action="store_true", help="build the datasets once and exit")
+    add_workers_argument(parser)
+    add_streaming_argument(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    cache = open_cache(args)
+
+    watcher = Watcher(args.outputs, BASE_DIR, args.workers, args.streaming, cache)
+    print(f"Watching {BASE_DIR} every {args.interval:g} s")
+    try:
+        while True:
+            started = time.perf_counter()
+            counts = watcher.poll()
+            if counts is not None:
+                print(f"↻ {counts[0]} added, {counts[1]} changed, {counts[2]} removed "
+                      f"in {time.perf_counter() - started:.2f} s")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_cache(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import json
+
+import pytest
+
+# A small WfInstances tree shared by the tests
+
+
+def write_instance(path, name, tasks):
+    # tasks: (task name, input bytes, output bytes)
+    files = []
+    specification = []
+    for i, (task, input_bytes, output_bytes) in enumerate(tasks):
+        files += [{"id": f"{task}.in", "sizeInBytes": input_bytes}, {"id": f"{task}.out", "sizeInBytes": output_bytes}]
+        specification.append({"name": task, "id": f"ID{i:07d}", "children": [],
+                              "inputFiles": [f"{task}.in"], "outputFiles": [f"{task}.out"]})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"name": name, "workflow": {"specification": {"tasks": specification, "files": files}}}, f)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    base = tmp_path / "WfInstances"
+    write_instance(str(base / "nextflow" / "rnaseq" / "rnaseq-1.json"), "rnaseq",
+                   [("fastqc_1", 1000, 10), ("fastqc_2", 3000, 30), ("bwa_1", 2_000_000_000, 500)])
+    write_instance(str(base / "pegasus" / "montage" / "montage-1.json"), "montage-1.0",
+                   [("mProject_1", 100, 200), ("mProject_2", 100, 200)])
+    return base
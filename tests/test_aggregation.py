@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset"))
+
+from aggregation import Grouping  # noqa: E402
+
+# Grouped reductions against the pandas groupby they replace
+
+
+@pytest.mark.parametrize("values", [
+    [np.nan, np.nan, 1.0, 2.0, 3.0, np.nan],
+    [1.0, 2.0, np.nan, np.nan, 3.0, np.nan],
+    [1.0, 2.0, 3.0, np.nan, np.nan, np.nan],
+    [np.nan] * 6,
+])
+def test_first_all_null_groups(values):
+    frame = pd.DataFrame({"k": ["a", "a", "b", "b", "c", "c"], "v": values})
+    grouping, _ = Grouping.from_keys(frame, ["k"])
+    expected = frame.groupby("k")["v"].first().to_numpy()
+    np.testing.assert_array_equal(grouping.first(frame["v"]), expected)
+
+
+def test_first_all_null_groups_objects():
+    frame = pd.DataFrame({"k": [2, 0, 1, 1, 0, 2], "v": [None, "x", None, None, "y", None]})
+    grouping, _ = Grouping.from_keys(frame, ["k"])
+    assert list(grouping.first(frame["v"])) == ["x", None, None]
+    assert list(frame.groupby("k")["v"].first().isna()) == [False, True, True]
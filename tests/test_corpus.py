@@ -0,0 +1,28 @@
+import os
+import sys
+
+from conftest import write_instance
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset"))
+
+from corpus import WorkflowCorpus  # noqa: E402
+from snapshot import open_snapshot, write_snapshot  # noqa: E402
+
+# The pandas view of the columnar corpus, built and reopened from a snapshot
+
+
+def test_to_frame_duplicate_instance_files(tmp_path):
+    first = str(tmp_path / "WfInstances" / "nextflow" / "rnaseq" / "run-1.json")
+    second = str(tmp_path / "WfInstances" / "pegasus" / "montage" / "run-1.json")
+    write_instance(first, "rnaseq", [("fastqc_1", 1000, 10)])
+    write_instance(second, "montage-1.0", [("mProject_1", 100, 200), ("mProject_2", 100, 200)])
+
+    corpus = WorkflowCorpus.from_paths([first, second, first])
+    frame = corpus.to_frame()
+    assert list(frame["instance_file"]) == ["run-1.json"] * 4
+    assert list(frame["workflow_name"]) == ["rnaseq", "montage-1.0", "montage-1.0", "rnaseq"]
+    assert list(frame["input_file_count"]) == [1, 1, 1, 1]
+
+    path = str(tmp_path / "corpus.snapshot")
+    write_snapshot(corpus, path)
+    assert open_snapshot(path).to_frame().equals(frame)
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from conftest import write_instance
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset"))
+
+from service import CorpusService, make_server, request  # noqa: E402
+
+# The query service over a small WfInstances tree, served on a temporary Unix socket
+
+
+@pytest.fixture
+def socket_path(tree, tmp_path):
+    service = CorpusService(str(tree))
+    service.reload()
+    path = str(tmp_path / "service.sock")
+    server = make_server(service, socket_path=path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def query(socket_path, endpoint, **params):
+    return request(endpoint, params, socket_path=socket_path)
+
+
+def test_stats(socket_path):
+    stats = query(socket_path, "stats")
+    assert stats["instances"] == 2
+    assert stats["tasks"] == 5
+    assert sorted(stats["systems"]) == ["nextflow", "pegasus"]
+
+
+def test_category_filter(socket_path):
+    body = query(socket_path, "instances", category="qc")
+    assert body["count"] == 1
+    row = body["rows"][0]
+    assert row["instance_file"] == "rnaseq-1.json"
+    assert row["matching_tasks"] == 2
+    assert row["input_bytes"] == 4000
+
+    tasks = query(socket_path, "tasks", category=["qc", "alignment"])
+    assert tasks["count"] == 3
+    assert {row["task_category"] for row in tasks["rows"]} == {"qc", "alignment"}
+
+
+def test_system_filter(socket_path):
+    body = query(socket_path, "tasks", system="pegasus")
+    assert body["count"] == 2
+    assert {row["workflow_name"] for row in body["rows"]} == {"montage-1.0"}
+    assert query(socket_path, "tasks", system="pegasus", category="qc")["count"] == 0
+
+
+def test_byte_filters(socket_path):
+    assert query(socket_path, "tasks", min_input_bytes="1GB")["count"] == 1
+    assert query(socket_path, "tasks", max_input_bytes="1000")["count"] == 3
+    assert query(socket_path, "tasks", min_bytes="2K", max_bytes="3.1K")["count"] == 1
+
+
+def test_tasks_limit(socket_path):
+    body = query(socket_path, "tasks", limit=2)
+    assert body["count"] == 5
+    assert [row["task_name"] for row in body["rows"]] == ["fastqc_1", "fastqc_2"]
+
+
+def test_aggregate_sort_top(socket_path):
+    body = query(socket_path, "aggregate", by="task_category", sort="tasks", top=2)
+    assert [(row["task_category"], row["tasks"]) for row in body["rows"]] == [("mproject", 2), ("qc", 2)]
+
+    body = query(socket_path, "aggregate", by="workflow_system", sort="bytes", top=1)
+    assert body["count"] == 1
+    assert body["rows"][0]["workflow_system"] == "nextflow"
+    assert body["rows"][0]["bytes"] == 2_000_004_540
+
+
+@pytest.mark.parametrize("endpoint,params", [
+    ("tasks", {"colour": "blue"}),
+    ("tasks", {"min_bytes": "lots"}),
+    ("aggregate", {"by": "machine"}),
+    ("aggregate", {"sort": "name"}),
+])
+def test_bad_requests(socket_path, endpoint, params):
+    with pytest.raises(RuntimeError, match="^400"):
+        query(socket_path, endpoint, **params)
+
+
+def test_reload(socket_path, tree):
+    write_instance(str(tree / "nextflow" / "sarek" / "sarek-1.json"), "sarek", [("multiqc_1", 10, 10)])
+    write_instance(str(tree / "nextflow" / "rnaseq" / "rnaseq-1.json"), "rnaseq", [("fastqc_1", 5000, 50)])
+    os.remove(tree / "pegasus" / "montage" / "montage-1.json")
+
+    body = query(socket_path, "reload")
+    assert (body["instances"], body["added"], body["changed"], body["removed"]) == (2, 1, 1, 1)
+    assert body["errors"] == []
+
+    stats = query(socket_path, "stats")
+    assert (stats["instances"], stats["tasks"]) == (2, 2)
+    assert query(socket_path, "tasks", system="pegasus")["count"] == 0
+    assert query(socket_path, "instances", category="qc")["rows"][0]["input_bytes"] == 5000
+    assert query(socket_path, "tasks", workflow="sarek")["rows"][0]["task_category"] == "reporting"
+
+    body = query(socket_path, "reload")
+    assert (body["added"], body["changed"], body["removed"]) == (0, 0, 0)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset"))
+
+from similarity import SimilarityIndex, instance_features  # noqa: E402
+
+# Self-exclusion of a query instance, however its path is spelled
+
+
+def test_position_of_path_spellings(tree, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = ["./WfInstances/nextflow/rnaseq/rnaseq-1.json", "./WfInstances/pegasus/montage/montage-1.json"]
+    index = SimilarityIndex()
+    index.insert((path, *instance_features(path)) for path in paths)
+
+    for query in ("WfInstances/pegasus/montage/montage-1.json", "./WfInstances/pegasus/../pegasus/montage/montage-1.json",
+                  str(tmp_path / "WfInstances" / "pegasus" / "montage" / "montage-1.json")):
+        assert index.position(query) == 1
+    assert index.position("WfInstances/pegasus/montage/montage-2.json") == -1
+
+    matrix = index.matrix([instance_features("WfInstances/pegasus/montage/montage-1.json")[1:]])
+    positions, _ = index.query(matrix, k=1, exclude=[index.position("WfInstances/pegasus/montage/montage-1.json")])
+    assert positions.tolist() == [[0]]
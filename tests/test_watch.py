@@ -0,0 +1,34 @@
+import os
+import sys
+
+from conftest import write_instance
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dataset"))
+
+from watch import LOGICAL_OUTPUTS, Watcher  # noqa: E402
+
+# Incremental updates of the logical datasets against a full build of the same tree
+
+
+def build(tree, directory, monkeypatch):
+    os.makedirs(directory)
+    monkeypatch.chdir(directory)
+    Watcher(list(LOGICAL_OUTPUTS), str(tree)).poll()
+    return {name: (directory / output).read_text() for name, (_, _, output) in LOGICAL_OUTPUTS.items()}
+
+
+def test_updates_match_full_build(tree, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    watcher = Watcher(list(LOGICAL_OUTPUTS), str(tree))
+    watcher.poll()
+    write_instance(str(tree / "nextflow" / "rnaseq" / "rnaseq-0.json"), "rnaseq",
+                   [("fastqc_1", 7, 70), ("multiqc_1", 8, 80)])
+    write_instance(str(tree / "nextflow" / "sarek" / "sarek-1.json"), "sarek", [("bwa_1", 5, 5)])
+    assert watcher.poll() == (2, 0, 0)
+    os.remove(tree / "nextflow" / "rnaseq" / "rnaseq-1.json")
+    write_instance(str(tree / "pegasus" / "montage" / "montage-1.json"), "montage-1.0", [("mProject_1", 1, 2)])
+    assert watcher.poll() == (0, 1, 1)
+
+    written = {name: (tmp_path / output).read_text() for name, (_, _, output) in LOGICAL_OUTPUTS.items()}
+    assert written == build(tree, tmp_path / "full", monkeypatch)
+    assert "multiqc" in written["logical_tasks"]